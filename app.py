@@ -1,15 +1,29 @@
 """
 Flask Application Entry Point
 Organized with MVC Architecture and OOP Principles
+
+`create_app()` builds the application. Module imports (models, blueprints,
+the chatbot's knowledge base, compiled templates) are read-only after
+startup, so a preforking server (gunicorn --preload, see gunicorn.conf.py)
+can build them once in the master and share them copy-on-write. Threads,
+executors and the scheduler are per process: services reset them in forked
+children and `start_worker_services()` starts them in each worker.
 """
+import gc
+import os
+
 from flask import Flask, render_template
 from flask_login import LoginManager
-from flask_bcrypt import Bcrypt
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect
 from dotenv import load_dotenv
-import os
+from jinja2 import TemplateError
+
+# Load environment variables
+load_dotenv()
+
+from config import Config
 
 # Import Models
 from models.user import User
@@ -23,108 +37,149 @@ from controllers.chat_controller import chat_bp
 from controllers.payment_controller import payment_bp
 from controllers.rating_controller import rating_bp
 from controllers.inspection_controller import inspection_bp
+from controllers.upload_controller import upload_bp
 
 # Import WebSocket
 from websockets import init_socketio
 
-# Load environment variables
-load_dotenv()
+# Import Services
+from services.ai_service import get_ai_service
+from services.image_service import image_service
+from services.scheduler import scheduler
+from services.maintenance_jobs import register_jobs
+from utils.assets import init_assets
 
-from config import Config
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Force Secure Session settings
-app.config.update(
-    SESSION_COOKIE_HTTPONLY=True,
-    SESSION_COOKIE_SAMESITE='Lax',
-    PERMANENT_SESSION_LIFETIME=1800 # 30 minutes session timeout
-)
-
-# Initialize extensions (CSRF initialized but disabled in config to avoid template errors)
-bcrypt = Bcrypt(app)
-csrf = CSRFProtect(app) 
+# Extensions (bound to the app in create_app)
+csrf = CSRFProtect()
 # Rate Limiting Configuration
 limiter = Limiter(
     key_func=get_remote_address,
-    app=app,
     default_limits=["2000 per day", "500 per hour"],
-    storage_uri="memory://"
+    storage_uri=Config.RATELIMIT_STORAGE_URL,
+    storage_options=Config.RATELIMIT_STORAGE_OPTIONS
 )
 
-# CSRF is enabled by default via CSRFProtect(app) above.
-# We removed the line that disabled it.
-
-# Initialize WebSocket
-socketio = init_socketio(app)
-
 # Flask-Login Setup
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 
 @login_manager.user_loader
 def load_user(username):
     return User.get(username)
 
-# Register Blueprints
-app.register_blueprint(web_bp)
-app.register_blueprint(auth_bp)
-app.register_blueprint(user_bp)
-app.register_blueprint(admin_bp)
-app.register_blueprint(chat_bp)
-app.register_blueprint(payment_bp)
-app.register_blueprint(rating_bp)
-app.register_blueprint(inspection_bp)
-
-# Error Handlers
-@app.errorhandler(404)
-def page_not_found(e):
-    return render_template('404.html'), 404
-
-@app.errorhandler(500)
-def internal_server_error(e):
-    return "<h1>500 Internal Server Error</h1><p>Please try again.</p>", 500
-
-# Security Headers Middleware
-@app.after_request
-def add_security_headers(response):
-    response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['X-Frame-Options'] = 'SAMEORIGIN'
-    response.headers['X-XSS-Protection'] = '1; mode=block'
-    response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-    response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-    return response
+
+def create_app(config_class=Config, start_services=False):
+    """
+    Build the application. Per-worker services (the job scheduler) are only
+    started by the server entry points: gunicorn.conf.py after each fork and
+    `python app.py`. Importing the app in a script, shell or test runs no jobs.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+
+    # Force Secure Session settings
+    app.config.update(
+        SESSION_COOKIE_HTTPONLY=True,
+        SESSION_COOKIE_SAMESITE='Lax',
+        PERMANENT_SESSION_LIFETIME=1800 # 30 minutes session timeout
+    )
+
+    # Initialize extensions
+    csrf.init_app(app)
+    limiter.init_app(app)
+    login_manager.init_app(app)
+
+    # Initialize WebSocket
+    init_socketio(app)
+
+    # Register Blueprints
+    app.register_blueprint(web_bp)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(user_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(chat_bp)
+    app.register_blueprint(payment_bp)
+    app.register_blueprint(rating_bp)
+    app.register_blueprint(inspection_bp)
+    app.register_blueprint(upload_bp)
+
+    # Per-endpoint limits (counted across all workers by the shared limiter storage).
+    # The limited wrapper replaces the registered view so the aliases below pick it up too.
+    for endpoint, limit, methods in [('chat.chat', Config.RATELIMIT_CHAT, None),
+                                     ('web.contact_api', Config.RATELIMIT_CONTACT, None),
+                                     ('auth.login', Config.RATELIMIT_LOGIN, ['POST'])]:
+        app.view_functions[endpoint] = limiter.limit(limit, methods=methods)(app.view_functions[endpoint])
+
+    register_legacy_aliases(app)
+    register_pwa_routes(app)
+    register_handlers(app)
+
+    # Fingerprinted static assets (run build_assets.py to generate static/dist)
+    init_assets(app)
+
+    # Background maintenance jobs (one leader across all worker processes)
+    register_jobs(scheduler)
+    if start_services:
+        start_worker_services(app)
+    return app
+
+
+def start_worker_services(app):
+    """Threads owned by one worker process; after a fork they must be started again"""
+    if app.config['SCHEDULER_ENABLED']:
+        scheduler.start()
+
+
+def preload_shared_state(app):
+    """
+    Build read-only state in the preforking master so workers share it
+    copy-on-write instead of each building its own: the chatbot's knowledge
+    base and every compiled template. The heap is then frozen so the
+    workers' garbage collector does not touch (and copy) those pages.
+    """
+    get_ai_service()
+    for name in app.jinja_env.list_templates(filter_func=lambda n: n.endswith('.html')):
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateError as e:
+            app.logger.warning(f"Template {name} not precompiled: {e}")
+    gc.collect()
+    gc.freeze()
+
+
+def register_handlers(app):
+    # Template Helpers
+    @app.context_processor
+    def inject_image_helpers():
+        """Expose image_variant(path, 'thumb') so templates serve processed images"""
+        return {'image_variant': image_service.variant_path}
+
+    # Error Handlers
+    @app.errorhandler(404)
+    def page_not_found(e):
+        return render_template('404.html'), 404
+
+    @app.errorhandler(500)
+    def internal_server_error(e):
+        return "<h1>500 Internal Server Error</h1><p>Please try again.</p>", 500
+
+    # Security Headers Middleware
+    @app.after_request
+    def add_security_headers(response):
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        response.headers['X-Frame-Options'] = 'SAMEORIGIN'
+        response.headers['X-XSS-Protection'] = '1; mode=block'
+        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
+        response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
+        return response
 
 # ============================================
 # Backward Compatibility - URL Aliases
 # Ensure old 'url_for' calls in templates still work by mapping old endpoint names to new blueprint endpoints.
+# The best way to support legacy templates without editing them all is to
+# manually add rules that map to the same view functions with the OLD endpoint names.
 # ============================================
-def add_alias(endpoint, alias):
-    """Add a rule to alias an endpoint"""
-    try:
-        # We can't easily alias endpoints directly without routes, 
-        # but we can use app.add_url_rule with the SAME view function.
-        # This effectively registers the route again under the old name (endpoint).
-        # However, blueprints prefix routes.
-        # So we need to fetch the view function from the app.view_functions 
-        
-        # Note: app.view_functions keys are fully qualified (e.g., 'admin.admin_dashboard')
-        if endpoint in app.view_functions:
-            # Get the rule from the map to duplicate it? No, just add the rule.
-            # But we don't know the rule path easily.
-            # Simpler hack: We can't change the ENDPOINT name of an existing route easily.
-            pass
-    except:
-        pass
-
-# The best way to support legacy templates without editing them all is to use a Context Processor
-# to override 'url_for' or simply add dummy routes?
-# Or clearer: Just manually add rules that map to the same view functions with the OLD endpoint names.
-
-with app.app_context():
+def register_legacy_aliases(app):
     # Admin Controller Aliases
     app.add_url_rule('/admin', endpoint='admin', view_func=app.view_functions['admin.admin_dashboard'])
     app.add_url_rule('/admin/add_user', endpoint='add_user', view_func=app.view_functions['admin.add_user'], methods=['POST'])
@@ -168,21 +223,36 @@ with app.app_context():
     
     # Payment
     app.add_url_rule('/payment', endpoint='payment', view_func=app.view_functions['payment.payment'], methods=['GET', 'POST'])
-    
+
+
+def register_pwa_routes(app):
     # Static Files PWA
-    # These are in app.py logic in old file, check where we put them. 
-    # They were in app_mvc.py lines 91-97. I should add them to web_controller or here.
-    # I'll add them here for simplicity or web_controller.
-    # Wait, I didn't add PWA routes to web_controller. I should.
+    @app.route('/manifest.json')
+    def manifest():
+        return app.send_static_file('manifest.json')
+
+    @app.route('/sw.js')
+    def service_worker():
+        response = app.send_static_file('sw.js')
+        # The worker and its precache list must always be revalidated so deploys roll out
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
 
-@app.route('/manifest.json')
-def manifest():
-    return app.send_static_file('manifest.json')
+    @app.route('/precache-manifest.js')
+    def precache_manifest():
+        if os.path.exists(os.path.join(app.static_folder, 'precache-manifest.js')):
+            response = app.send_static_file('precache-manifest.js')
+        else:
+            # Assets not built yet (development): empty list, network-only behaviour
+            response = app.response_class('self.__PRECACHE_MANIFEST = {"version": "dev", "entries": []};\n',
+                                          mimetype='application/javascript')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
 
-@app.route('/sw.js')
-def service_worker():
-    return app.send_static_file('sw.js')
+
+app = create_app()
+socketio = app.extensions['socketio']
 
 if __name__ == '__main__':
+    start_worker_services(app)
     socketio.run(app, host='0.0.0.0', port=5000, debug=False, allow_unsafe_werkzeug=True)
-
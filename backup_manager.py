@@ -1,57 +1,66 @@
-import shutil
-import os
-import datetime
+import argparse
 import logging
 
+from services.backup_service import backup_service
+from services.snapshot_store import snapshot_store
+
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def create_backup():
     """
-    Creates a zip backup of the database and uploads directory.
-    Saves it to the 'backups' directory.
+    Creates a consistent, compressed backup of the SQLite database
+    (online backup API + integrity check) in the 'backups' directory.
+    Fails if another backup is running (in the app or another CLI call).
     """
     try:
-        # Define paths
-        APP_ROOT = os.path.dirname(os.path.abspath(__file__))
-        BACKUP_DIR = os.path.join(APP_ROOT, 'backups')
-        
-        # Ensure backup directory exists
-        if not os.path.exists(BACKUP_DIR):
-            os.makedirs(BACKUP_DIR)
-            
-        # Timestamp for the filename
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"backup_{timestamp}"
-        
-        # Create a temporary folder to collect files
-        temp_dir = os.path.join(BACKUP_DIR, f"temp_{timestamp}")
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-            
-        # 1. Backup Database
-        db_file = os.path.join(APP_ROOT, 'database.json')
-        if os.path.exists(db_file):
-            shutil.copy2(db_file, temp_dir)
-            
-        # 2. Backup Uploads (if exists)
-        uploads_dir = os.path.join(APP_ROOT, 'uploads')
-        if os.path.exists(uploads_dir):
-            shutil.copytree(uploads_dir, os.path.join(temp_dir, 'uploads'))
-            
-        # 3. Zip the temp directory
-        zip_path = os.path.join(BACKUP_DIR, backup_filename)
-        shutil.make_archive(zip_path, 'zip', temp_dir)
-        
-        # Cleanup temp directory
-        shutil.rmtree(temp_dir)
-        
-        logging.info(f"Backup created successfully: {zip_path}.zip")
-        return f"Backup created successfully: {backup_filename}.zip"
+        path = backup_service.run_exclusive('manual', snapshot=False)
+        logging.info(f"Backup created successfully: {path}")
+        return f"Backup created successfully: {path}"
     
     except Exception as e:
         logging.error(f"Backup failed: {e}")
         return f"Backup failed: {str(e)}"
 
+def create_snapshot():
+    """Adds an incremental, deduplicated snapshot (database pages + upload files)."""
+    manifest = backup_service.run_exclusive('manual', snapshot=True)
+    logging.info(f"Snapshot {manifest['id']} created ({manifest['added_bytes']} new bytes)")
+    return manifest
+
+def list_snapshots():
+    for snap in snapshot_store.list_snapshots():
+        print(f"{snap['id']:<28} {snap['created_at']}  {snap['logical_bytes'] / 1048576:8.2f} MB"
+              f"  (+{snap['added_bytes'] / 1048576:.2f} MB new)")
+    stats = snapshot_store.get_stats()
+    print(f"{stats['snapshots']} snapshots, {stats['stored_bytes'] / 1048576:.2f} MB stored, "
+          f"{stats['saved_percent']}% saved")
+
+def restore_snapshot(snapshot_id, db_path, files_root=None):
+    """Rebuilds the database (and optionally the upload files) of a snapshot."""
+    snapshot_store.restore(snapshot_id, db_path, files_root)
+    logging.info(f"Snapshot {snapshot_id} restored to {db_path}" + (f" and {files_root}" if files_root else ""))
+
 if __name__ == "__main__":
-    create_backup()
+    parser = argparse.ArgumentParser(description='Database backups and snapshots.')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('backup', help='full compressed backup file (default)')
+    sub.add_parser('snapshot', help='incremental snapshot')
+    sub.add_parser('list', help='list snapshots')
+    sub.add_parser('prune', help='apply the retention policy')
+    restore = sub.add_parser('restore', help='rebuild a snapshot')
+    restore.add_argument('snapshot_id')
+    restore.add_argument('--db', default='restored.db', help='output database path (default: restored.db)')
+    restore.add_argument('--files', default=None, help='directory to restore upload files into')
+    args = parser.parse_args()
+
+    if args.command == 'snapshot':
+        create_snapshot()
+    elif args.command == 'list':
+        list_snapshots()
+    elif args.command == 'prune':
+        snapshot_store.prune()
+    elif args.command == 'restore':
+        restore_snapshot(args.snapshot_id, args.db, args.files)
+    else:
+        create_backup()
@@ -0,0 +1,281 @@
+"""
+Chat Engine Benchmark
+Latency, memory and answer accuracy of AIService against a synthetic,
+labelled corpus: knowledge-base keywords in plain, dialect, spelling-variant,
+typo and English forms, learned questions (exact and with typos) and
+unknown questions, with learned-answer tables of increasing size.
+
+Runs against a throwaway SQLite database, never the real one.
+
+    python -m benchmarks.chat_benchmark
+    python -m benchmarks.chat_benchmark --sizes 100,1000,10000,100000 --budget 600 --output run.json
+
+Misses scan every learned answer, so large tables are slow; each size stops
+after --budget seconds (the corpus is shuffled, so every category is still
+sampled) and is marked "truncated" in the report.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+from models import Database, LearnedAnswersModel
+from services.ai_service import AIService, DIALECT_MAP, normalize_text
+from services.knowledge_base import SHORT_KEYWORD
+
+NOT_FOUND = "__NOT_FOUND__"
+DIALECT_FILLERS = ['يا باشا', 'لو سمحت', 'حضرتك', 'ممكن', 'عايز اعرف'] + [w for w, v in DIALECT_MAP.items() if v][:5]
+SUFFIXES = ['', '؟', '!', ' بالظبط', ' ضروري']
+SPELLING_VARIANTS = {'ا': 'أ', 'ه': 'ة', 'ي': 'ى', 'و': 'ؤ'}
+HARAKAT = 'َُِّْ'
+ARABIC_LETTERS = 'بتثجحخدذرزسشصضطظعغفقكلمنهوي'
+GIBBERISH_LETTERS = 'bcdfgjklmnpqrstvwxz'
+
+
+# Corpus ------------------------------------------------------------------------
+
+def typo(text, rng):
+    """One random deletion, duplication or swap of adjacent letters"""
+    positions = [i for i, ch in enumerate(text) if not ch.isspace()]
+    if len(positions) < 2:
+        return text
+    i = rng.choice(positions[:-1])
+    operation = rng.choice(('delete', 'duplicate', 'swap'))
+    if operation == 'delete':
+        return text[:i] + text[i + 1:]
+    if operation == 'duplicate':
+        return text[:i] + text[i] + text[i:]
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def spelling_variant(text, rng):
+    """Hamza/Ta-Marbuta/Ya spellings and harakat: the normalizer must see through these"""
+    out = []
+    for ch in text:
+        out.append(SPELLING_VARIANTS.get(ch, ch) if rng.random() < 0.5 else ch)
+        if ch in ARABIC_LETTERS and rng.random() < 0.2:
+            out.append(rng.choice(HARAKAT))
+    return ''.join(out)
+
+
+def reference_match(message, entries):
+    """
+    Entry a plain first-match-wins scan picks for a message, or None. Deliberately
+    naive (no compiled patterns) so the labels do not come from the matcher under test.
+    """
+    msg_norm = normalize_text(message)
+    norm_words = set(msg_norm.split())
+    msg_lower = message.lower()
+    lower_words = set(msg_lower.split())
+    for entry in entries:
+        for kw in entry['keywords_ar']:
+            kw = normalize_text(kw)
+            if kw and (kw in norm_words if len(kw) < SHORT_KEYWORD else kw in msg_norm):
+                return entry
+        for kw in entry['keywords_en']:
+            kw = kw.lower()
+            if kw and (kw in lower_words if len(kw) < SHORT_KEYWORD else kw in msg_lower):
+                return entry
+    return None
+
+
+def knowledge_corpus(entries, rng, per_entry):
+    """
+    [(category, message, expected)] built from the knowledge base's own keywords.
+    A keyword shared with (or containing a keyword of) an earlier entry is answered
+    by that entry, so each item is labelled with the entry the unperturbed message
+    should reach, not the one it was generated from.
+    """
+    corpus = []
+
+    def add(category, message, clean, field):
+        entry = reference_match(clean, entries)
+        if entry is not None:
+            corpus.append((category, message, entry[field]))
+
+    for entry in entries:
+        ar_keywords = [kw for kw in entry['keywords_ar'] if any(ch in ARABIC_LETTERS for ch in kw)]
+        en_keywords = list(entry['keywords_en'])
+        for _ in range(per_entry):
+            if ar_keywords:
+                kw = rng.choice(ar_keywords)
+                message = kw + rng.choice(SUFFIXES)
+                add('kb_ar', message, message, 'response_ar')
+                message = f"{rng.choice(DIALECT_FILLERS)} {kw}{rng.choice(SUFFIXES)}"
+                add('kb_dialect', message, message, 'response_ar')
+                add('kb_spelling', spelling_variant(kw, rng), kw, 'response_ar')
+                add('kb_typo', typo(kw, rng), kw, 'response_ar')
+            if en_keywords:
+                kw = rng.choice(en_keywords)
+                message = rng.choice([kw, kw.capitalize(), kw.upper(), f"{kw}?", f"please {kw}"])
+                add('kb_en', message, message, 'response_en')
+    return corpus
+
+
+def learned_pairs(count, rng):
+    """Synthetic learned questions made of pseudo-words, so the knowledge base rarely claims them"""
+    pairs, seen = [], set()
+    while len(pairs) < count:
+        words = [''.join(rng.choice(ARABIC_LETTERS) for _ in range(rng.randint(4, 7))) for _ in range(rng.randint(3, 6))]
+        question = ' '.join(words)
+        if question not in seen:
+            seen.add(question)
+            pairs.append((question, f"إجابة رقم {len(pairs)}"))
+    return pairs
+
+
+def learned_corpus(pairs, rng, queries):
+    corpus = []
+    for question, answer in rng.sample(pairs, min(queries, len(pairs))):
+        corpus.append(('learned_exact', question, answer))
+        corpus.append(('learned_typo', typo(question, rng), answer))
+    for _ in range(queries):
+        gibberish = ' '.join(''.join(rng.choice(GIBBERISH_LETTERS) for _ in range(rng.randint(4, 8))) for _ in range(3))
+        corpus.append(('unknown', gibberish, NOT_FOUND))
+    return corpus
+
+
+# Measurement ---------------------------------------------------------------------
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def latency_summary(samples_ms):
+    return {
+        'count': len(samples_ms),
+        'p50_ms': round(percentile(samples_ms, 0.50), 3) if samples_ms else None,
+        'p99_ms': round(percentile(samples_ms, 0.99), 3) if samples_ms else None,
+        'max_ms': round(max(samples_ms), 3) if samples_ms else None,
+    }
+
+
+def load_learned(ai, pairs):
+    conn = Database().get_connection()
+    try:
+        conn.execute("DELETE FROM learned_answers")
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.executemany("INSERT INTO learned_answers (question, answer, learned_at) VALUES (?, ?, ?)",
+                         [(q.lower().strip(), a, now) for q, a in pairs])
+        conn.commit()
+    finally:
+        conn.close()
+    LearnedAnswersModel.generation += 1
+    started = time.perf_counter()
+    ai._refresh_cache()
+    return (time.perf_counter() - started) * 1000
+
+
+def run_size(ai, size, kb_corpus, rng, queries, budget):
+    pairs = learned_pairs(size, rng)
+    # Memory is traced while the engine loads the learned answers only; tracing slows every call down
+    tracemalloc.start()
+    load_ms = load_learned(ai, pairs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    corpus = kb_corpus + learned_corpus(pairs, rng, queries)
+    rng.shuffle(corpus)
+
+    uncached, cached, process = defaultdict(list), [], []
+    correct, totals = defaultdict(int), defaultdict(int)
+    deadline = time.monotonic() + budget
+    for category, message, expected in corpus:
+        if time.monotonic() >= deadline:
+            break
+        ai.response_cache.clear()
+        started = time.perf_counter()
+        response = ai.get_response('anonymous', message)
+        uncached[category].append((time.perf_counter() - started) * 1000)
+        totals[category] += 1
+        correct[category] += response == expected
+
+        started = time.perf_counter()
+        ai.get_response('anonymous', message)
+        cached.append((time.perf_counter() - started) * 1000)
+
+    # process_message adds validation, personalization and the chat-log / unanswered writes
+    deadline = time.monotonic() + budget / 4
+    for category, message, expected in rng.sample(corpus, min(len(corpus), queries)):
+        if time.monotonic() >= deadline:
+            break
+        ai.response_cache.clear()
+        started = time.perf_counter()
+        ai.process_message('anonymous', 'Benchmark', message)
+        process.append((time.perf_counter() - started) * 1000)
+
+    all_uncached = [ms for samples in uncached.values() for ms in samples]
+    return {
+        'learned_answers': size,
+        'learned_load_ms': round(load_ms, 1),
+        'truncated': sum(totals.values()) < len(corpus),
+        'get_response': latency_summary(all_uncached),
+        'get_response_cached': latency_summary(cached),
+        'process_message': latency_summary(process),
+        'by_category': {category: dict(latency_summary(samples),
+                                       accuracy=round(correct[category] / totals[category], 3))
+                        for category, samples in sorted(uncached.items())},
+        'accuracy': round(sum(correct.values()) / sum(totals.values()), 3),
+        'learned_load_peak_mb': round(peak / 1048576, 2),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def print_report(report):
+    for run in report['runs']:
+        truncated = ' [truncated by --budget]' if run['truncated'] else ''
+        print(f"\nlearned answers: {run['learned_answers']}{truncated}  (loaded in {run['learned_load_ms']} ms, "
+              f"peak {run['learned_load_peak_mb']} MB, max RSS {run['max_rss_mb']} MB)", file=sys.stderr)
+        for name in ('get_response', 'get_response_cached', 'process_message'):
+            stats = run[name]
+            print(f"  {name:22s} p50 {stats['p50_ms']:9.3f} ms   p99 {stats['p99_ms']:9.3f} ms   n={stats['count']}",
+                  file=sys.stderr)
+        print(f"  accuracy {run['accuracy']:.1%}", file=sys.stderr)
+        for category, stats in run['by_category'].items():
+            print(f"    {category:15s} {stats['accuracy']:7.1%}   p50 {stats['p50_ms']:9.3f} ms   n={stats['count']}",
+                  file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AIService latency / accuracy benchmark')
+    parser.add_argument('--sizes', default='100,1000,10000', help='learned-answer table sizes, comma separated')
+    parser.add_argument('--queries', type=int, default=50, help='learned and unknown questions per size')
+    parser.add_argument('--budget', type=float, default=60, help='seconds of get_response calls per size')
+    parser.add_argument('--per-entry', type=int, default=5, help='messages per knowledge-base entry and form')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='chat-benchmark-')
+    Database.DB_NAME = os.path.join(workdir, 'benchmark.db')
+    rng = random.Random(args.seed)
+    ai = AIService()
+    kb_corpus = knowledge_corpus(ai.knowledge_base, rng, args.per_entry)
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'seed': args.seed,
+        'knowledge_base_version': ai.knowledge.snapshot.version,
+        'runs': [run_size(ai, int(size), kb_corpus, rng, args.queries, args.budget) for size in args.sizes.split(',')],
+    }
+    print_report(report)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Seeded Database Fixtures
+Fills a fresh SQLite database with synthetic users, workers, chat logs,
+payments, security audit logs and inspection requests in volumes large
+enough to show how pages that read whole tables scale.
+
+Every seeded account shares FIXTURE_PASSWORD, hashed once at the
+configured bcrypt cost, so logging in costs what it costs in production.
+
+    python -m benchmarks.fixtures --output /tmp/seeded.db --users 5000 --chats 100000
+"""
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from models import Database, UserModel, WorkerLocationModel
+
+FIXTURE_PASSWORD = 'loadtest-password'
+ADMIN_USERNAME = 'loadtest_admin'
+DEFAULT_VOLUMES = {'users': 1000, 'workers': 100, 'chats': 20000, 'payments': 5000, 'logs': 20000, 'inspections': 2000}
+
+GOVERNORATES = {
+    'القاهرة': (30.0444, 31.2357, ['مدينة نصر', 'المعادي', 'مصر الجديدة', 'التجمع الخامس']),
+    'الجيزة': (30.0131, 31.2089, ['الدقي', 'المهندسين', 'الشيخ زايد', '6 أكتوبر']),
+    'الإسكندرية': (31.2001, 29.9187, ['سموحة', 'سيدي جابر', 'العجمي', 'المنتزه']),
+    'الدقهلية': (31.0409, 31.3785, ['المنصورة', 'طلخا', 'ميت غمر']),
+}
+SPECIALIZATIONS = ['دهانات', 'جبس بورد', 'كهرباء', 'سباكة', 'نجارة', 'عزل']
+SERVICE_TYPES = ['دهانات', 'جبس بورد', 'تشطيب كامل', 'عزل رطوبة', 'كهرباء']
+INSPECTION_STATUSES = ['new_request', 'assigned_to_worker', 'inspection_done', 'approved_for_user', 'completed', 'cancelled']
+PAYMENT_METHODS = ['vodafone_cash', 'instapay', 'card', 'cash']
+PAGES = ['/', '/about', '/services', '/projects', '/contact']
+CHAT_MESSAGES = [
+    ('بكام متر الدهان؟', 'سعر المتر يبدأ من 80 جنيه حسب نوع الدهان'),
+    ('عندي مشكلة رطوبة في الحمام', 'نوفر عزل رطوبة بضمان 5 سنوات'),
+    ('فين مكانكم؟', 'مقرنا في القاهرة ونغطي كل المحافظات'),
+    ('What are your working hours?', 'We work from 9 AM to 9 PM, Saturday to Thursday'),
+    ('ممكن صور من شغلكم', 'تقدر تشوف أعمالنا في صفحة المشاريع'),
+]
+
+
+def _timestamp(rng, now, days):
+    return (now - timedelta(seconds=rng.randint(0, days * 86400))).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def user_rows(rng, count, workers, password_hash, now, days):
+    """users rows: one admin, `workers` located workers and plain users"""
+    rows = [(ADMIN_USERNAME, password_hash, 'Load Test Admin', 'admin@example.com', '01000000000', 'admin',
+             None, None, None, 'القاهرة', 'مدينة نصر', 'active', now.strftime("%Y-%m-%d %H:%M:%S"), 0, 1, 50)]
+    governorates = list(GOVERNORATES.items())
+    for i in range(count):
+        is_worker = i < workers
+        governorate, (lat, lon, cities) = rng.choice(governorates)
+        rows.append((
+            f"loadtest_{'worker' if is_worker else 'user'}_{i}", password_hash, f"مستخدم تجريبي {i}",
+            f"loadtest{i}@example.com", f"010{i:08d}", 'worker' if is_worker else 'user',
+            rng.choice(SPECIALIZATIONS) if is_worker else None,
+            lat + rng.uniform(-0.3, 0.3) if is_worker else None,
+            lon + rng.uniform(-0.3, 0.3) if is_worker else None,
+            governorate, rng.choice(cities), 'active', _timestamp(rng, now, days),
+            int(is_worker and rng.random() < 0.7), 1, rng.choice([10, 25, 50, 100]),
+        ))
+    return rows
+
+
+def seed_database(path, volumes=None, seed=1, days=90):
+    """Create the schema at `path` and fill it; returns the row counts written"""
+    volumes = dict(DEFAULT_VOLUMES, **(volumes or {}))
+    rng = random.Random(seed)
+    now = datetime.now()
+    Database.DB_NAME = path
+    db = Database()
+    db._init_db()  # Idempotent; the singleton may already exist for another file
+    conn = db.get_connection()
+    # Imported here: it opens the database at import, which must already point at `path`
+    from services.password_service import password_service
+    try:
+        users = user_rows(rng, volumes['users'], min(volumes['workers'], volumes['users']),
+                          password_service.hash(FIXTURE_PASSWORD), now, days)
+        conn.executemany("""
+            INSERT INTO users (username, password, full_name, email, phone, role, specialization,
+                               latitude, longitude, governorate, city, status, created_at,
+                               gps_active, available_for_inspection, max_inspection_distance)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, users)
+        customers = [row for row in users if row[5] == 'user'] or users
+        workers = [row for row in users if row[5] == 'worker']
+
+        chats = []
+        for _ in range(volumes['chats']):
+            user = rng.choice(customers)
+            message, response = rng.choice(CHAT_MESSAGES)
+            chats.append((user[0], user[2], message, response, _timestamp(rng, now, days)))
+        conn.executemany("INSERT INTO chat_logs (user_id, user_name, message, response, timestamp) VALUES (?, ?, ?, ?, ?)",
+                         chats)
+
+        payments = []
+        for _ in range(volumes['payments']):
+            user = rng.choice(customers)
+            payments.append((user[0], user[2], round(rng.uniform(500, 50000), 2), rng.choice(PAYMENT_METHODS),
+                             _timestamp(rng, now, days), rng.choice(['Pending', 'Completed', 'Completed', 'Failed'])))
+        conn.executemany("INSERT INTO payments (username, full_name, amount, method, timestamp, status) VALUES (?, ?, ?, ?, ?, ?)",
+                         payments)
+
+        logs = []
+        for _ in range(volumes['logs']):
+            user = rng.choice(users)[0]
+            event, details, severity = rng.choice([
+                ('Login Success', f"User {user} logged in", 'low'),
+                ('Failed Login', f"Attempt for username: {user}", 'medium'),
+                ('Page View', f"Visited page: {rng.choice(PAGES)}", 'low'),
+                ('Service View', f"User viewed service: {rng.choice(SERVICE_TYPES)}", 'low'),
+            ])
+            logs.append((event, details, severity, _timestamp(rng, now, days)))
+        conn.executemany("INSERT INTO security_audit_logs (event, details, severity, timestamp) VALUES (?, ?, ?, ?)", logs)
+
+        inspections = []
+        for _ in range(volumes['inspections']):
+            user = rng.choice(customers)
+            status = rng.choice(INSPECTION_STATUSES)
+            worker = rng.choice(workers)[0] if workers and status != 'new_request' else None
+            lat, lon, _ = GOVERNORATES[user[9]]
+            created_at = _timestamp(rng, now, days)
+            inspections.append((user[0], user[0], f"{user[9]} - {user[10]}", created_at.split(' ')[0], status,
+                                worker, worker, created_at, lat + rng.uniform(-0.2, 0.2), lon + rng.uniform(-0.2, 0.2),
+                                user[9], user[10], rng.choice(SERVICE_TYPES), 'طلب معاينة تجريبي', json.dumps([])))
+        conn.executemany("""
+            INSERT INTO inspection_requests (username, user_id, location, date, status, worker_id, assigned_worker,
+                                             created_at, user_latitude, user_longitude, governorate, city,
+                                             service_type, description, images)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, inspections)
+        conn.commit()
+        located = WorkerLocationModel.rebuild(conn)
+    finally:
+        conn.close()
+    UserModel.invalidate()
+    return {'users': len(users), 'located_workers': located, 'chats': len(chats), 'payments': len(payments),
+            'logs': len(logs), 'inspections': len(inspections)}
+
+
+def add_volume_arguments(parser):
+    for table, default in DEFAULT_VOLUMES.items():
+        parser.add_argument(f'--{table}', type=int, default=default, help=f'{table} to seed (default {default})')
+    parser.add_argument('--days', type=int, default=90, help='spread seeded timestamps over this many days')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def volumes_from(args):
+    return {table: getattr(args, table) for table in DEFAULT_VOLUMES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a SQLite database with synthetic load-test data')
+    parser.add_argument('--output', required=True, help='database file to create (must not exist)')
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+    if os.path.exists(args.output):
+        parser.error(f"{args.output} already exists")
+    counts = seed_database(args.output, volumes_from(args), seed=args.seed, days=args.days)
+    print(json.dumps(counts), file=sys.stderr)
+    print(f"Log in as {ADMIN_USERNAME} / {FIXTURE_PASSWORD}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
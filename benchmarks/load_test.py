@@ -0,0 +1,397 @@
+"""
+HTTP Load Test
+End-to-end throughput and latency of the web app under a weighted traffic
+mix (chat, login, public pages, admin dashboard / users / analytics /
+inspections, location search, chunked uploads) against a database seeded
+by benchmarks.fixtures. Runs in a throwaway working directory, never
+against the real database or upload folders.
+
+Two drivers:
+  --server client    threads driving Flask test clients in this process
+                     (cost of the application code, no HTTP server)
+  --server gunicorn  a local gunicorn (gthread workers) driven over HTTP
+
+    python -m benchmarks.load_test --duration 30 --concurrency 8
+    python -m benchmarks.load_test --mix chat=5,admin_dashboard=1 --chats 200000 --output run.json
+    python -m benchmarks.load_test --server gunicorn --gunicorn-workers 4 --concurrency 16
+
+Each virtual user logs in once as the admin and once as a customer before
+the clock starts; the login scenario measures fresh logins on top of that.
+"""
+import os
+import sys
+
+# Read by config.py at import: no background jobs, per-process rate-limit counters
+os.environ.setdefault('SCHEDULER_ENABLED', '0')
+os.environ.setdefault('RATELIMIT_STORAGE_URL', 'memory://')
+
+import json
+import time
+import random
+import shutil
+import socket
+import hashlib
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+
+from config import Config
+from models import Database
+from benchmarks.chat_benchmark import percentile
+from benchmarks.fixtures import (ADMIN_USERNAME, FIXTURE_PASSWORD, add_volume_arguments, seed_database,
+                                 volumes_from)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = {'chat': 30, 'home': 20, 'location_search': 15, 'login': 5, 'upload': 5,
+               'admin_dashboard': 2, 'admin_users': 2, 'analytics': 2, 'admin_inspections': 2}
+LOCATION_QUERIES = ['القا', 'الجيزة', 'اسك', 'المن', 'مدينة', 'cai', 'alex', 'giz']
+UNKNOWN_MESSAGES = ['هل تعملون يوم الجمعة؟', 'عايز اكلم المهندس', 'do you ship outside egypt?', 'ازاي ادفع']
+
+
+class LoadTestConfig(Config):
+    """Forms and JSON posts without CSRF tokens, no per-IP limits (every request comes from one address)"""
+    WTF_CSRF_ENABLED = False
+    RATELIMIT_ENABLED = False
+    SCHEDULER_ENABLED = False
+
+
+def load_app():
+    """App factory for both drivers (gunicorn: 'benchmarks.load_test:load_app()')"""
+    # Before importing app: models open the database at import
+    Database.DB_NAME = os.environ['LOADTEST_DB']
+    from app import create_app
+    return create_app(LoadTestConfig, start_services=False)
+
+
+def prepare_workdir(workdir):
+    """Relative paths (uploads, knowledge base) resolve inside workdir"""
+    os.makedirs(os.path.join(workdir, 'static'), exist_ok=True)
+    os.symlink(os.path.join(REPO_ROOT, 'data'), os.path.join(workdir, 'data'))
+    return os.path.join(workdir, 'loadtest.db')
+
+
+# Drivers ---------------------------------------------------------------------------
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, json_body=None, data=None, headers=None):
+        response = self.client.open(path, method=method, json=json_body, data=data, headers=headers)
+        return response.status_code, response.get_data()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report 3xx as they are, like the test client does"""
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPSession:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, json_body=None, data=None, headers=None):
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif isinstance(data, dict):
+            data = urllib.parse.urlencode(data).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def start_gunicorn(workdir, db_path, workers, threads):
+    """Launch gunicorn on a free local port; returns (process, base_url)"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, LOADTEST_DB=db_path, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--worker-class', 'gthread', '--threads', str(threads), '--log-level', 'warning',
+         'benchmarks.load_test:load_app()'],
+        cwd=workdir, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + '/', timeout=5):
+                return process, base_url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 60 seconds")
+
+
+# Scenarios ---------------------------------------------------------------------------
+
+class VirtualUser:
+    """One client thread: an admin and a customer session plus per-endpoint samples"""
+
+    def __init__(self, new_session, rng, customers, chat_messages, upload_bytes, measure_from):
+        self.new_session = new_session
+        self.rng = rng
+        self.customers = customers
+        self.chat_messages = chat_messages
+        self.upload_bytes = upload_bytes
+        self.measure_from = measure_from
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.admin = self.logged_in(ADMIN_USERNAME)
+        self.customer = self.logged_in(rng.choice(customers))
+
+    def logged_in(self, username):
+        session = self.new_session()
+        status, _ = session.request('POST', '/login', data={'username': username, 'password': FIXTURE_PASSWORD})
+        if status != 302:
+            raise RuntimeError(f"Could not log in as {username} (HTTP {status})")
+        return session
+
+    def call(self, endpoint, session, method, path, expect=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            status, body = session.request(method, path, **kwargs)
+        except OSError:  # Connection refused / reset by the server
+            status, body = None, b''
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if time.monotonic() >= self.measure_from:
+            self.samples[endpoint].append(elapsed_ms)
+            if status not in expect:
+                self.errors[endpoint] += 1
+        return status, body
+
+    def chat(self):
+        self.call('chat', self.customer, 'POST', '/api/chat', json_body={'message': self.rng.choice(self.chat_messages)})
+
+    def home(self):
+        self.call('home', self.customer, 'GET', '/')
+
+    def location_search(self):
+        query = urllib.parse.quote(self.rng.choice(LOCATION_QUERIES))
+        self.call('location_search', self.customer, 'GET', f'/api/locations/search?q={query}')
+
+    def login(self):
+        self.call('login', self.new_session(), 'POST', '/login', expect=(302,),
+                  data={'username': self.rng.choice(self.customers), 'password': FIXTURE_PASSWORD})
+
+    def admin_dashboard(self):
+        self.call('admin_dashboard', self.admin, 'GET', '/admin')
+
+    def admin_users(self):
+        self.call('admin_users', self.admin, 'GET', '/admin/users')
+
+    def analytics(self):
+        self.call('analytics', self.admin, 'GET', '/admin/analytics')
+
+    def admin_inspections(self):
+        self.call('admin_inspections', self.admin, 'GET', '/admin/inspections')
+
+    def upload(self):
+        """Chunked voice-note upload: start, every chunk, complete"""
+        payload = self.rng.randbytes(self.upload_bytes)
+        status, body = self.call('upload_start', self.customer, 'POST', '/api/uploads', json_body={
+            'filename': 'note.webm', 'size': len(payload), 'kind': 'voice',
+            'sha256': hashlib.sha256(payload).hexdigest()})
+        if status != 200:
+            return
+        started = json.loads(body)
+        upload_id, chunk_size = started['upload_id'], started['chunk_size']
+        for index, offset in enumerate(range(0, len(payload), chunk_size)):
+            chunk = payload[offset:offset + chunk_size]
+            self.call('upload_chunk', self.customer, 'PUT', f'/api/uploads/{upload_id}/chunks/{index}', data=chunk,
+                      headers={'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest(),
+                               'Content-Type': 'application/octet-stream'})
+        self.call('upload_complete', self.customer, 'POST', f'/api/uploads/{upload_id}/complete')
+
+
+def parse_mix(text):
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown scenario '{name}' (choose from {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def chat_messages():
+    """Knowledge-base keywords (answered from the file) and questions nothing answers"""
+    with open(os.path.join(REPO_ROOT, Config.KNOWLEDGE_BASE_PATH), encoding='utf-8') as f:
+        entries = json.load(f)['entries']
+    keywords = [kw for entry in entries for kw in entry['keywords_ar'] + entry['keywords_en'] if len(kw) > 2]
+    return keywords + UNKNOWN_MESSAGES
+
+
+# Run ---------------------------------------------------------------------------------
+
+def run_load(new_session, mix, customers, concurrency, duration, requests, warmup, upload_bytes, seed):
+    scenarios, weights = list(mix), list(mix.values())
+    messages = chat_messages()
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+    remaining = [requests]
+    lock = threading.Lock()
+    users, failures = [], []
+
+    def take():
+        """False once --requests scenarios have been run (measured ones only)"""
+        if requests is None or time.monotonic() < measure_from:
+            return True
+        with lock:
+            remaining[0] -= 1
+            return remaining[0] >= 0
+
+    def worker(index):
+        try:
+            rng = random.Random(seed * 1000 + index)
+            user = VirtualUser(new_session, rng, customers, messages, upload_bytes, measure_from)
+            users.append(user)
+            while time.monotonic() < stop_at and take():
+                getattr(user, rng.choices(scenarios, weights)[0])()
+        except Exception as e:
+            failures.append(repr(e))
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = max(time.monotonic() - measure_from, 1e-9)
+    if failures:
+        raise RuntimeError(f"{len(failures)} virtual users failed: {failures[0]}")
+
+    samples, errors = defaultdict(list), defaultdict(int)
+    for user in users:
+        for endpoint, values in user.samples.items():
+            samples[endpoint].extend(values)
+        for endpoint, count in user.errors.items():
+            errors[endpoint] += count
+    return elapsed, samples, errors
+
+
+def endpoint_summary(samples_ms, errors, elapsed):
+    return {
+        'count': len(samples_ms),
+        'errors': errors,
+        'rps': round(len(samples_ms) / elapsed, 2),
+        'p50_ms': round(percentile(samples_ms, 0.50), 2),
+        'p90_ms': round(percentile(samples_ms, 0.90), 2),
+        'p99_ms': round(percentile(samples_ms, 0.99), 2),
+        'max_ms': round(max(samples_ms), 2),
+    }
+
+
+def print_report(report):
+    print(f"\n{report['server']} driver, {report['concurrency']} virtual users, {report['elapsed_seconds']} s measured "
+          f"(seeded in {report['seed_seconds']} s: {report['seeded']})", file=sys.stderr)
+    print(f"  {'endpoint':18s} {'count':>7s} {'errors':>6s} {'req/s':>8s} {'p50 ms':>9s} {'p90 ms':>9s} "
+          f"{'p99 ms':>9s} {'max ms':>9s}", file=sys.stderr)
+    for endpoint, stats in sorted(report['endpoints'].items()) + [('TOTAL', report['total'])]:
+        print(f"  {endpoint:18s} {stats['count']:7d} {stats['errors']:6d} {stats['rps']:8.1f} {stats['p50_ms']:9.2f} "
+              f"{stats['p90_ms']:9.2f} {stats['p99_ms']:9.2f} {stats['max_ms']:9.2f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end HTTP load test against a seeded database')
+    parser.add_argument('--server', choices=('client', 'gunicorn'), default='client')
+    parser.add_argument('--concurrency', type=int, default=8, help='virtual users (client threads)')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--requests', type=int, help='stop after this many scenarios instead of --duration')
+    parser.add_argument('--warmup', type=float, default=2, help='unmeasured seconds before the clock starts')
+    parser.add_argument('--mix', help=f"scenario weights, e.g. chat=5,login=1 (default {DEFAULT_MIX})")
+    parser.add_argument('--upload-kb', type=int, default=256, help='size of each uploaded file')
+    parser.add_argument('--gunicorn-workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--gunicorn-threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--keep', action='store_true', help='keep the working directory and seeded database')
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.requests is not None:
+        args.duration = float('inf')
+
+    workdir = tempfile.mkdtemp(prefix='load-test-')
+    previous_cwd = os.getcwd()
+    server = None
+    try:
+        db_path = prepare_workdir(workdir)
+        os.chdir(workdir)
+        started = time.perf_counter()
+        seeded = seed_database(db_path, volumes_from(args), seed=args.seed, days=args.days)
+        seed_seconds = round(time.perf_counter() - started, 1)
+        customers = [f'loadtest_user_{i}' for i in range(min(args.workers, args.users), args.users)] or [ADMIN_USERNAME]
+
+        if args.server == 'gunicorn':
+            server, base_url = start_gunicorn(workdir, db_path, args.gunicorn_workers, args.gunicorn_threads)
+            new_session = lambda: HTTPSession(base_url)
+        else:
+            os.environ['LOADTEST_DB'] = db_path
+            app = load_app()
+            new_session = lambda: TestClientSession(app)
+
+        elapsed, samples, errors = run_load(new_session, mix, customers, args.concurrency, args.duration,
+                                            args.requests, args.warmup, args.upload_kb * 1024, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        os.chdir(previous_cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    all_samples = [ms for values in samples.values() for ms in values]
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'server': args.server,
+        'concurrency': args.concurrency,
+        'gunicorn': {'workers': args.gunicorn_workers, 'threads': args.gunicorn_threads} if args.server == 'gunicorn' else None,
+        'mix': mix,
+        'seed': args.seed,
+        'seeded': seeded,
+        'seed_seconds': seed_seconds,
+        'elapsed_seconds': round(elapsed, 1),
+        'endpoints': {endpoint: endpoint_summary(values, errors[endpoint], elapsed)
+                      for endpoint, values in sorted(samples.items())},
+        'total': endpoint_summary(all_samples, sum(errors.values()), elapsed) if all_samples else None,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'workdir': workdir if args.keep else None,
+    }
+    if report['total'] is None:
+        sys.exit("No requests were measured (is --duration shorter than a single request?)")
+    print_report(report)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(os.path.join(previous_cwd, args.output), 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Normalizer Microbenchmark
+Per-call cost of the chatbot's text normalization: the previous
+implementation (seven re.sub calls and a dialect dict rebuilt per call)
+against the translate-table normalizer, uncached and memoized.
+
+    python -m benchmarks.normalizer_benchmark [--number 20000]
+"""
+import re
+import argparse
+import timeit
+
+from services.ai_service import DIALECT_MAP, normalize_text
+from utils.text import fold_arabic
+
+SAMPLES = [
+    "السلام عليكم، عايز اعرف سعر دهان الشقة؟",
+    "بكام متر الجبس بورد يا باشا",
+    "عندي مشكلة رطوبة في الحمام، ايه الحل؟",
+    "فين مكانكم بالظبط لو سمحت",
+    "ممكن صور من شغلكم في الإسكندرية!",
+    "Hello, how much does painting a 120m apartment cost?",
+    "What are your working hours?",
+    "مَرْحَبًا، هل توجد ضمانات على الدهانات؟",
+]
+
+
+def legacy_normalize(text):
+    """The pre-translate normalizer, kept here as the baseline"""
+    if not text: return ""
+    text = text.lower().strip()
+    text = re.sub(r'[?؟!.،,]', '', text)
+    text = re.sub(r"[أإآ]", "ا", text)
+    text = re.sub(r"ة", "ه", text)
+    text = re.sub(r"ى", "ي", text)
+    text = re.sub(r"ؤ", "و", text)
+    text = re.sub(r"ئ", "ي", text)
+    text = re.sub(r"[\u064B-\u0652]", "", text)
+    dialect_map = {
+        "عايز": "اريد", "عاوز": "اريد", "محتاج": "اريد",
+        "عايزين": "نريد", "عاوزين": "نريد",
+        "بكام": "سعر", "كام": "سعر", "تكلفه": "سعر",
+        "فين": "اين", "فينكم": "مكانكم",
+        "شغلكم": "اعمالكم", "شغل": "عمل", "صور": "اعمال", "مشاريع": "اعمال",
+        "مين": "من", "بلدي": "مصر",
+        "حضرتك": "", "باشا": "", "يا": "", "ممكن": "", "لو": "", "سمحت": "",
+        "مشكله": "مشكلة", "عندي": "لدي", "توجد": "موجود",
+        "حلول": "حل", "علاج": "حل", "ايه": "ما",
+    }
+    words = text.split()
+    normalized_words = [dialect_map.get(w, w) for w in words]
+    return " ".join([w for w in normalized_words if w]).strip()
+
+
+def uncached_normalize(text):
+    """The current normalizer with both LRU layers bypassed"""
+    words = (DIALECT_MAP.get(w, w) for w in fold_arabic.__wrapped__(text).split())
+    return " ".join(w for w in words if w)
+
+
+def per_call_us(func, number):
+    seconds = min(timeit.repeat(lambda: [func(s) for s in SAMPLES], number=number, repeat=3))
+    return seconds / (number * len(SAMPLES)) * 1e6
+
+
+def main(number):
+    for sample in SAMPLES:
+        assert normalize_text(sample) == legacy_normalize(sample), sample
+
+    normalize_text.cache_clear()
+    fold_arabic.cache_clear()
+    results = {
+        'legacy (re.sub x7)': per_call_us(legacy_normalize, number),
+        'translate, uncached': per_call_us(uncached_normalize, number),
+        'translate, memoized': per_call_us(normalize_text, number),
+    }
+    baseline = results['legacy (re.sub x7)']
+    for name, us in results.items():
+        print(f"{name:22s} {us:8.2f} us/call  {baseline / us:6.1f}x")
+    print(f"cache: {normalize_text.cache_info()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--number', type=int, default=20000, help='passes over the sample messages per timing')
+    main(parser.parse_args().number)
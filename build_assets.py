@@ -0,0 +1,10 @@
+from utils.assets import build, build_precache_manifest
+
+if __name__ == '__main__':
+    # Fingerprint + precompress static assets into static/dist
+    manifest = build()
+    print(f"Built {len(manifest)} fingerprinted assets into static/dist.")
+
+    # Service worker precache list (page hashes are added by freeze.py)
+    version = build_precache_manifest(manifest)
+    print(f"Precache manifest written (version {version}).")
@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 
+from utils.ratelimit_storage import SQLiteStorage
+
 load_dotenv()
 
 class Config:
@@ -15,12 +17,74 @@ class Config:
     
     # Rate Limiting
     RATELIMIT_DEFAULT = "200 per day"
-    RATELIMIT_STORAGE_URL = "memory://"
+    # Counters shared by all worker processes (importing SQLiteStorage registers its sqlite:// scheme)
+    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', f'{SQLiteStorage.STORAGE_SCHEME[0]}:///ratelimit.db')
+    RATELIMIT_STORAGE_OPTIONS = {'sweep_interval': 300}  # Seconds between expired-counter sweeps
+    RATELIMIT_CHAT = "20 per minute;300 per day"
+    RATELIMIT_CONTACT = "5 per minute;30 per day"
+    RATELIMIT_LOGIN = "10 per minute;50 per hour"  # Applied to POST (attempts) only
+
+    # Password hashing (see services/password_service.py; `python -m services.password_service` times each cost)
+    PASSWORD_BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', 12))  # Existing hashes are upgraded on login
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # Concurrent hashes per process
+    PASSWORD_VERIFY_TIMEOUT = 10  # Seconds a login waits for a free hashing slot plus the check
     
     # Database
     DATABASE_PATH = 'ramadan_company.db'
     BACKUP_DIR = 'backups'
+
+    # Online backups (sqlite3 backup API, copied in small steps off the request path)
+    BACKUP_COMPRESSION = os.getenv('BACKUP_COMPRESSION', 'zstd')  # 'zstd' (falls back to gzip if not installed) or 'gzip'
+    BACKUP_PAGES_PER_STEP = 256
+    BACKUP_STEP_SLEEP = 0.005  # Seconds between steps so writers are not starved
+
+    # Incremental snapshots (deduplicated page groups + upload manifest)
+    BACKUP_CHUNK_PAGES = 16  # Pages per stored object (64KB with 4KB pages)
+    BACKUP_FILE_ROOTS = [os.path.join('static', 'uploads'), os.path.join('static', 'user_images')]
+    BACKUP_RETENTION = {'latest': 6, 'hourly': 24, 'daily': 7, 'weekly': 4, 'monthly': 12}
+    BACKUP_LOCK_SECONDS = 3600  # Leases on the running backup job and the snapshot store; expire if the holder dies
+    BACKUP_LOCK_WAIT_SECONDS = 600  # How long create/prune wait for another one to finish
+    BACKUP_OBJECT_GRACE_SECONDS = 3600  # Unreferenced objects younger than this survive a prune
     
     # File Uploads
     UPLOAD_FOLDER = os.path.join('static', 'user_images')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB Max
+
+    # Image Processing (thumbnails / WebP variants generated off the request path)
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+    IMAGE_VARIANTS = {
+        'thumb': (320, 320),
+        'medium': (1280, 1280),
+    }
+    IMAGE_WEBP_QUALITY = 80
+    IMAGE_VARIANT_FOLDER = os.path.join('static', 'variants')
+
+    # Content-addressed upload store
+    UPLOAD_BLOB_FOLDER = os.path.join('static', 'uploads', 'blobs')
+    UPLOAD_GC_GRACE_SECONDS = 24 * 3600  # Unreferenced blobs younger than this are kept
+
+    # Chunked (resumable) uploads - each chunk is its own small request
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+    UPLOAD_SESSION_TTL_SECONDS = 24 * 3600
+    UPLOAD_POLICIES = {
+        'photo': {'max_bytes': 16 * 1024 * 1024, 'extensions': {'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic'}},
+        'voice': {'max_bytes': 50 * 1024 * 1024, 'extensions': {'webm', 'ogg', 'mp3', 'm4a', 'wav', 'aac'}},
+        'video': {'max_bytes': 300 * 1024 * 1024, 'extensions': {'mp4', 'mov', 'webm', '3gp', 'mkv'}},
+    }
+
+    # Chatbot knowledge base (edited without a deploy; workers pick up changes within the check interval)
+    KNOWLEDGE_BASE_PATH = os.path.join('data', 'knowledge_base.json')
+    KNOWLEDGE_BASE_CHECK_SECONDS = 5
+
+    # Chatbot answer cache (per worker process; see services/response_cache.py)
+    CHAT_CACHE_SIZE = 2048
+    CHAT_CACHE_TTL_SECONDS = 60  # Also how long other workers may serve answers from before an admin's edit
+
+    # Background jobs (see services/scheduler.py for the schedule syntax)
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '1') == '1'
+    SCHEDULER_TICK_SECONDS = 30
+    SCHEDULER_LEASE_SECONDS = 90  # Another worker takes over if the leader stops renewing
+    SCHEDULER_JOB_TIMEOUT_SECONDS = 3600
+    SCHEDULED_JOBS = {}  # e.g. {'backup_snapshot': 'every 6h', 'cache_warmup': None}
+    SECURITY_LOG_RETENTION_DAYS = 180  # Older raw logs are deleted once rolled up into analytics_daily
+    JOB_HISTORY_DAYS = 30
@@ -1,18 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, jsonify
 from flask_login import login_required, current_user
 from datetime import datetime
 import os
-import shutil
-import io
-import base64
-import qrcode
-import pyotp
-from werkzeug.utils import secure_filename
-from flask_bcrypt import Bcrypt
-from models import UserModel, ChatModel, PaymentModel, SecurityLogModel, UnansweredQuestionsModel, LearnedAnswersModel, ContactModel, Database, RatingModel, ComplaintModel, InspectionRequestModel
+from models import UserModel, ChatModel, PaymentModel, SecurityLogModel, UnansweredQuestionsModel, LearnedAnswersModel, ContactModel, Database, RatingModel, ComplaintModel, InspectionRequestModel, AnalyticsRollupModel, JobRunModel
+from services.image_service import image_service
+from services.upload_store import upload_store
+from services.backup_service import backup_service
+from services.snapshot_store import snapshot_store
+from services.scheduler import scheduler
+from services.password_service import password_service
+from services.ai_service import get_ai_service
 
 admin_bp = Blueprint('admin', __name__)
-bcrypt = Bcrypt()
 
 # Initialize models
 user_model = UserModel()
@@ -25,6 +24,8 @@ contact_model = ContactModel()
 rating_model = RatingModel()
 complaint_model = ComplaintModel()
 inspection_model = InspectionRequestModel()
+rollup_model = AnalyticsRollupModel()
+job_run_model = JobRunModel()
 db = Database()
 
 @admin_bp.before_app_request
@@ -154,12 +155,12 @@ def admin_dashboard():
     total_revenue = sum(float(p.get('amount', 0)) for p in confirmed_payments)
     
     # Inspection Analytics
-    inspections_list = inspection_model.get_all()
+    total_inspections = inspection_model.count()
 
     analytics_summary = {
         'total_users': total_users_count,
         'total_requests': total_requests_count, # Messages
-        'total_inspections': len(inspections_list), # Actual Inspections
+        'total_inspections': total_inspections, # Actual Inspections
         'conversion_rate': conversion_rate,
         'total_revenue': total_revenue,
         'active_users': len([u for u in users if u.get('project_percentage', 0) > 0]),
@@ -195,11 +196,12 @@ def admin_users():
     payments = payment_model.get_all()
     
     # Filter unanswered questions from users (not workers)
+    users_by_name = {u['username']: u for u in all_users}
     user_unanswered = []
     for q in unanswered:
         user_id = q.get('user_id')
         # Check if this user_id belongs to a user (not worker)
-        user_obj = user_model.get_by_username(user_id)
+        user_obj = users_by_name.get(user_id)
         if user_obj and user_obj.get('role', 'user') == 'user':
             user_unanswered.append(q)
     
@@ -262,6 +264,9 @@ def analytics_dashboard():
         
         from collections import Counter
         from datetime import datetime
+
+        # Counters of days whose raw logs were removed by the log_retention job
+        archived = rollup_model.get_counters(before_day=security_log_model.get_oldest_day())
         
         # 1. Totals
         total_users_count = len(users)
@@ -292,7 +297,7 @@ def analytics_dashboard():
                     username = details.split('User ')[1].split(' ')[0]
                     all_visitors_list.append(username)
                 except: pass
-        top_all_visitors_data = Counter(all_visitors_list).most_common()
+        top_all_visitors_data = (Counter(all_visitors_list) + archived.get('login', Counter())).most_common()
         analy_all_visitors_labels = [x[0] for x in top_all_visitors_data]
         analy_all_visitors_values = [x[1] for x in top_all_visitors_data]
 
@@ -333,7 +338,7 @@ def analytics_dashboard():
                         svc_title = details.split('User viewed service: ')[1]
                         service_views.append(svc_title)
                     except: pass
-        top_services_view_data = Counter(service_views).most_common(5)
+        top_services_view_data = (Counter(service_views) + archived.get('service_view', Counter())).most_common(5)
         top_services_view_labels = [x[0] for x in top_services_view_data]
         top_services_view_values = [x[1] for x in top_services_view_data]
 
@@ -346,6 +351,7 @@ def analytics_dashboard():
                     hour = ts.split(' ')[1].split(':')[0]
                     hour_counts[hour] += 1
                 except: pass
+        hour_counts.update(archived.get('hour', Counter()))
         sorted_hours = sorted([ (str(h).zfill(2), hour_counts.get(str(h).zfill(2), 0)) for h in range(24) ])
         peak_hours_labels = [x[0] + ":00" for x in sorted_hours]
         peak_hours_values = [x[1] for x in sorted_hours]
@@ -374,7 +380,7 @@ def analytics_dashboard():
                     page_views.append('الخدمات')
 
         page_map = {'/':'الرئيسية','home':'الرئيسية','projects':'معرض الأعمال','about':'من نحن','contact':'اتصل بنا','services':'الخدمات','admin':'لوحة التحكم','login':'تسجيل الدخول'}
-        top_pages_data = Counter(page_views).most_common(5)
+        top_pages_data = (Counter(page_views) + archived.get('page_view', Counter())).most_common(5)
         page_pop_labels = [page_map.get(x[0], x[0]) for x in top_pages_data]
         page_pop_values = [x[1] for x in top_pages_data]
 
@@ -407,26 +413,16 @@ def add_user():
     project_location = request.form.get('project_location')
     project_description = request.form.get('project_description', 'لا يوجد وصف')
     
+    if user_model.get_by_username(username):
+        return "User already exists", 400
+
     profile_image_path = None
     if 'profile_image' in request.files:
-        file = request.files['profile_image']
-        if file and file.filename != '':
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'jpg'
-            unique_filename = f"{username}_{timestamp}.{file_extension}"
-            
-            upload_folder = os.path.join('static', 'user_images')
-            if not os.path.exists(upload_folder):
-                os.makedirs(upload_folder)
-            file_path = os.path.join(upload_folder, unique_filename)
-            file.save(file_path)
-            profile_image_path = f"user_images/{unique_filename}"
+        stored = upload_store.save(request.files['profile_image'], ref=('users', username))
+        if stored:
+            profile_image_path = stored.path
     
-    password = bcrypt.generate_password_hash(username).decode('utf-8') 
-
-    if user_model.get_by_username(username):
-        return "User already exists", 400
+    password = password_service.hash(username)
 
     user_model.create({
         'username': username,
@@ -440,6 +436,7 @@ def add_user():
         'project_percentage': 0,
         'role': 'user'
     })
+    image_service.enqueue(profile_image_path)
     
     flash(f"تم إضافة المستخدم {username} بنجاح.")
     return redirect(url_for('admin.admin_dashboard'))
@@ -514,6 +511,11 @@ def delete_all_unanswered_questions():
     flash("تم حذف جميع الأسئلة المعلقة بنجاح.")
     return redirect(url_for('admin.admin_unanswered_questions'))
 
+@admin_bp.route('/admin/chat/cache-stats')
+def chat_cache_stats():
+    """Hit rate of this worker's chatbot answer cache"""
+    return jsonify(get_ai_service().response_cache.get_stats())
+
 @admin_bp.route('/admin/learned_answers')
 def learned_answers():
     learned = learned_model.get_all()
@@ -587,22 +589,29 @@ def admin_message_status():
         
     return redirect(url_for('admin.admin_messages'))
 
-@admin_bp.route('/admin/backup')
+@admin_bp.route('/admin/backup', methods=['GET', 'POST'])
 def manual_backup():
-    try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-        if not os.path.exists('backups'): os.makedirs('backups')
-        backup_path = f'backups/manual_backup_{timestamp}.sqlite'
-        shutil.copy2('ramadan_company.db', backup_path)
-        security_log_model.create("Manual Backup", f"Admin {current_user.username} created a backup", severity="low")
-        flash("تم إنشاء النسخة الاحتياطية بنجاح.")
-        return send_file(backup_path, as_attachment=True)
-    except Exception as e:
-        flash(f"فشل إنشاء النسخة الاحتياطية: {str(e)}")
-        return redirect(url_for('admin.admin_dashboard'))
+    # Runs in the background; the file appears in the backups list when done
+    snapshot = request.values.get('mode') == 'snapshot'
+    job_id = backup_service.start_backup('manual', requested_by=current_user.username, snapshot=snapshot)
+    flash("جاري إنشاء النسخة الاحتياطية في الخلفية، ستظهر في القائمة خلال لحظات.")
+    return redirect(url_for('admin.security_audit', backup_job=job_id))
+
+@admin_bp.route('/admin/backup/status/<job_id>')
+def backup_status(job_id):
+    job = backup_service.get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'المهمة غير موجودة'}), 404
+    return jsonify({'success': True, **job})
 
 @admin_bp.route('/admin/setup_2fa')
 def setup_2fa():
+    # Only used here, so they are not loaded when a worker boots
+    import io
+    import base64
+    import pyotp
+    import qrcode
+
     if not current_user.two_factor_secret:
         secret = pyotp.random_base32()
         user_model.update(current_user.username, {'two_factor_secret': secret})
@@ -636,39 +645,9 @@ def clear_security_logs():
 @admin_bp.route('/admin/security/audit')
 def security_audit():
     
-    # Auto Backup Check and List Fetching
-    backup_dir = 'backups'
-    if not os.path.exists(backup_dir): os.makedirs(backup_dir)
-    
-    backup_files = []
-    for f in os.listdir(backup_dir):
-        if f.endswith('.sqlite'):
-            path = os.path.join(backup_dir, f)
-            stat = os.stat(path)
-            backup_files.append({
-                'name': f,
-                'size': f"{stat.st_size / (1024*1024):.2f} MB",
-                'date': datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
-            })
-    backup_files.sort(key=lambda x: x['date'], reverse=True)
-    
-    # Auto Backup Logic (Every 3 Months i.e., 90 days)
-    if not backup_files or (datetime.now() - datetime.strptime(backup_files[0]['date'], "%Y-%m-%d %H:%M:%S")).days >= 90:
-         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-            new_file = f'backups/auto_backup_{timestamp}.sqlite'
-            shutil.copy2('ramadan_company.db', new_file)
-            security_log_model.create("Auto Backup", "System performed scheduled 3-month backup", severity="info")
-            # Refresh list
-            path = new_file
-            stat = os.stat(path)
-            backup_files.insert(0, {
-                'name': os.path.basename(new_file),
-                'size': f"{stat.st_size / (1024*1024):.2f} MB",
-                'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
-         except Exception as e:
-            print(f"Auto backup error: {e}")
+    # Backups are taken by the scheduled backup_snapshot job (see /admin/jobs)
+    backup_files = backup_service.list_backups()
+    snapshot_stats = snapshot_store.get_stats()
 
     from flask import current_app
     
@@ -707,16 +686,16 @@ def security_audit():
     # 4. Database Backups
     checks.append({
         'name': 'النسخ الاحتياطي',
-        'status': 'موجود' if backup_files else 'غير موجود',
-        'desc': f"يوجد {len(backup_files)} نسخة احتياطية محفوظة (تلقائي كل 3 شهور).",
+        'status': 'موجود' if backup_files or snapshot_stats['snapshots'] else 'غير موجود',
+        'desc': f"يوجد {len(backup_files)} نسخة احتياطية و {snapshot_stats['snapshots']} لقطة تزايدية محفوظة (لقطة تلقائية يومياً).",
         'icon': 'fa-database',
-        'color': 'success' if backup_files else 'warning'
+        'color': 'success' if backup_files or snapshot_stats['snapshots'] else 'warning'
     })
     
     # 5. Admin Passwords
     admin_user = user_model.get_by_username('admin')
     weak_pwd = False
-    if admin_user and bcrypt.check_password_hash(admin_user['password'], 'admin'):
+    if admin_user and password_service.matches_known(admin_user['password'], 'admin'):
         weak_pwd = True
     
     checks.append({
@@ -727,6 +706,17 @@ def security_audit():
         'color': 'danger' if weak_pwd else 'success'
     })
 
+    hashing = password_service.get_stats()
+    checks.append({
+        'name': 'تشفير كلمات المرور',
+        'status': f"bcrypt (تكلفة {hashing['rounds']})",
+        'desc': (f"متوسط زمن التحقق {hashing['avg_ms']} ms (p95 {hashing['p95_ms']} ms)، "
+                 f"{hashing['verified']} دخول ناجح، {hashing['failed']} فاشل، {hashing['busy']} مرفوض لانشغال الخادم، {hashing['rehashed']} ترقية تشفير."
+                 if hashing['avg_ms'] is not None else 'لم تسجل أي عمليات تحقق منذ بدء التشغيل.'),
+        'icon': 'fa-lock',
+        'color': 'success'
+    })
+
     # 6. Rate Limiting
     checks.append({
         'name': 'تحديد معدل الطلبات',
@@ -740,7 +730,8 @@ def security_audit():
     logs.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
     recent_logs = logs[:10]
 
-    return render_template('admin_security.html', checks=checks, logs=recent_logs, backups=backup_files)
+    return render_template('admin_security.html', checks=checks, logs=recent_logs, backups=backup_files,
+                           backup_running=backup_service.is_running(), snapshot_stats=snapshot_stats)
 
 
 @admin_bp.route('/admin/complaints')
@@ -802,6 +793,19 @@ def admin_inspections():
     return render_template('admin_inspections.html', requests=all_requests, stats=stats)
 
 
+@admin_bp.route('/admin/inspections/dispatch-plan')
+def inspection_dispatch_plan():
+    """Nearest workers for every open request at once (optionally with a suggested assignment)"""
+    assignment = request.args.get('assign') or None
+    if assignment not in (None, 'greedy', 'hungarian'):
+        return jsonify({'error': 'Unknown assignment method'}), 400
+    limit = request.args.get('limit', 3, type=int)
+    if limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    plan = inspection_model.plan_dispatch(limit=limit, assignment=assignment)
+    return jsonify(plan)
+
+
 @admin_bp.route('/admin/inspection/<request_id>/assign', methods=['POST'])
 def assign_inspection(request_id):
     """Assign admin to inspection"""
@@ -820,10 +824,31 @@ def inspection_details(request_id):
     req = inspection_model.get_request_by_id(request_id)
     if not req:
         return jsonify({'error': 'Request not found'}), 404
+    
+    # Small previews for the modal; the metadata-free full-size copies are linked for full view
+    req['image_thumbs'] = [image_service.variant_path(p, 'thumb') for p in (req.get('images') or [])]
+    req['image_full'] = [image_service.variant_path(p, 'full') for p in (req.get('images') or [])]
+    report = req.get('inspection_report')
+    if isinstance(report, dict):
+        report['photo_thumbs'] = [image_service.variant_path(p, 'thumb') for p in (report.get('photos') or [])]
+        report['photo_full'] = [image_service.variant_path(p, 'full') for p in (report.get('photos') or [])]
+
+    nearby_workers = []
+    if req.get('user_latitude') is not None and req.get('user_longitude') is not None:
+        for match in inspection_model.find_nearest_workers(req['user_latitude'], req['user_longitude'],
+                                                           req.get('service_type'), limit=5):
+            worker = match['worker']
+            nearby_workers.append({
+                'username': worker['username'],
+                'full_name': worker.get('full_name'),
+                'phone': worker.get('phone'),
+                'specialization': worker.get('specialization'),
+                'distance': match['distance']
+            })
         
     return jsonify({
         'request': req,
-        'nearby_workers': []
+        'nearby_workers': nearby_workers
     })
 
 
@@ -920,14 +945,30 @@ def confirm_payment(doc_id):
     flash('تم تأكيد التحويل بنجاح', 'success')
     return redirect(url_for('admin.admin_transfers'))
 
+@admin_bp.route('/admin/jobs')
+def admin_jobs():
+    """Scheduled maintenance jobs and their recent runs"""
+    status = scheduler.get_status()
+    return render_template('admin_jobs.html', jobs=status['jobs'], leader=status['leader'],
+                           scheduler_running=status['enabled'], runs=job_run_model.get_recent(50))
+
+@admin_bp.route('/admin/jobs/<name>/run', methods=['POST'])
+def run_job_now(name):
+    if scheduler.trigger(name):
+        security_log_model.create("Job Triggered", f"Admin {current_user.username} ran job {name}", severity="low")
+        flash('تم تشغيل المهمة في الخلفية، حدّث الصفحة لمتابعة النتيجة.')
+    else:
+        flash('المهمة غير موجودة')
+    return redirect(url_for('admin.admin_jobs'))
+
 @admin_bp.route('/admin/backup/download/<filename>')
 def download_backup_file(filename):
-    return send_file(os.path.join('backups', filename), as_attachment=True)
+    return send_from_directory(os.path.abspath(backup_service.backup_dir), filename, as_attachment=True)
 
 @admin_bp.route('/admin/backup/delete/<filename>', methods=['POST'])
 def delete_backup_file(filename):
     try:
-        os.remove(os.path.join('backups', filename))
+        os.remove(os.path.join(backup_service.backup_dir, os.path.basename(filename)))
         flash('تم حذف النسخة الاحتياطية بنجاح')
     except Exception as e:
         flash(f'حدث خطأ أثناء الحذف: {e}')
@@ -1,15 +1,16 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_bcrypt import Bcrypt
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import random
 import string
 from models import UserModel, SecurityLogModel
 from models.user import User
+from services.upload_store import upload_store
+from services.chunked_upload_service import chunked_upload_service
+from services.password_service import password_service, PasswordServiceBusy
 
 auth_bp = Blueprint('auth', __name__)
-bcrypt = Bcrypt()
 user_model = UserModel()
 security_model = SecurityLogModel()
 
@@ -33,9 +34,15 @@ def login():
         password = request.form.get('password')
         
         user_data = user_model.get_by_username(username)
-        user = User.get(username) if user_data else None
+        user = User(user_data) if user_data else None
         
-        if user_data and bcrypt.check_password_hash(user_data.get('password', ''), password):
+        try:
+            verified = bool(user_data) and password_service.verify_user(user_data, password)
+        except PasswordServiceBusy:
+            flash('الخادم مشغول حالياً، يرجى المحاولة مرة أخرى بعد لحظات')
+            return render_template('login.html', captcha_q=None), 503
+
+        if verified:
             if user.two_factor_enabled:
                 otp = generate_otp()
                 session['2fa_user'] = username
@@ -105,7 +112,7 @@ def reset_new_password():
         
     if request.method == 'POST':
         password = request.form.get('password')
-        hashed = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed = password_service.hash(password)
         user_model.update(session['reset_user'], {'password': hashed})
         session.pop('reset_user', None)
         session.pop('otp_code', None)
@@ -123,17 +130,10 @@ def submit_verification():
         
     if request.method == 'POST':
         try:
-            import os
-            from werkzeug.utils import secure_filename
-            
-            # Helper to save file
+            # Helper to save file (deduplicated blob store, referenced by the worker)
             def save_file(file, subfolder):
-                if not file: return None
-                filename = secure_filename(f"{current_user.username}_{file.filename}")
-                path = os.path.join(f"static/uploads/{subfolder}", filename)
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                file.save(path)
-                return f"uploads/{subfolder}/{filename}"
+                stored = upload_store.save(file, ref=('users', current_user.username))
+                return stored.path if stored else None
 
             data = {
                 'id_card_front': save_file(request.files.get('id_front'), 'verification'),
@@ -149,7 +149,13 @@ def submit_verification():
                     if f.filename:
                         proof_files.append(save_file(f, 'work_proof'))
             
-            if 'work_video' in request.files:
+            # Work videos arrive through the chunked upload API; multipart is still accepted
+            video_path = chunked_upload_service.resolve(request.form.get('work_video_upload_id'),
+                                                        current_user.username, kinds={'video'})
+            if video_path:
+                upload_store.add_ref(video_path, 'users', current_user.username)
+                proof_files.append(video_path)
+            elif 'work_video' in request.files:
                 video = request.files.get('work_video')
                 if video and video.filename:
                     proof_files.append(save_file(video, 'work_proof'))
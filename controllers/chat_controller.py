@@ -2,11 +2,10 @@ from flask import Blueprint, request, jsonify
 from flask_login import current_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from services.ai_service import AIService
+from services.ai_service import get_ai_service
 from models import SecurityLogModel
 
 chat_bp = Blueprint('chat', __name__)
-ai_service = AIService()
 security_model = SecurityLogModel()
 
 @chat_bp.route('/api/chat', methods=['POST'])
@@ -30,7 +29,7 @@ def chat():
         if is_contact_req:
             security_model.create("Contact Info Requested", f"User {user_name} ({user_id}) requested contact details. Message: {message}", severity="low")
 
-        response_text = ai_service.process_message(user_id, user_name, message)
+        response_text = get_ai_service().process_message(user_id, user_name, message)
         
         return jsonify({'response': response_text})
         
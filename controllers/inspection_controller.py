@@ -5,7 +5,10 @@ Handles inspection requests and location operations
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from models import InspectionRequestModel, UserModel
-from utils.egypt_locations import get_all_governorates, get_cities_by_governorate
+from services.location_service import location_service
+from services.image_service import image_service
+from services.upload_store import upload_store
+from services.chunked_upload_service import chunked_upload_service
 import json
 
 inspection_bp = Blueprint('inspection', __name__)
@@ -44,21 +47,13 @@ def request_inspection():
         }
         
         # Handle images
-        uploaded_images = []
+        stored_images = []
         if 'images' in request.files:
-            files = request.files.getlist('images')
-            for file in files:
-                if file and file.filename:
-                    from werkzeug.utils import secure_filename
-                    from datetime import datetime
-                    import os
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"{timestamp}_{filename}"
-                    filepath = os.path.join('static/uploads/inspections', filename)
-                    os.makedirs('static/uploads/inspections', exist_ok=True)
-                    file.save(filepath)
-                    uploaded_images.append(f"uploads/inspections/{filename}")
+            for file in request.files.getlist('images'):
+                stored = upload_store.save(file)
+                if stored:
+                    stored_images.append(stored)
+        uploaded_images = [s.path for s in stored_images]
 
         # Create request
         result = inspection_model.create_request(
@@ -68,6 +63,9 @@ def request_inspection():
             description=description,
             images=uploaded_images
         )
+        for stored in stored_images:
+            upload_store.add_ref(stored, 'inspection_requests', result['request_id'])
+        image_service.enqueue_many(uploaded_images)
         
         flash('تم إرسال طلبك بنجاح. سنقوم بمراجعته وتعيين الصنايعي المناسب.', 'success')
             
@@ -143,31 +141,30 @@ def submit_report(request_id):
         
     if request.method == 'POST':
         try:
-            from werkzeug.utils import secure_filename
-            import os
+            report_ref = ('inspection_requests', request_id)
             
-            # 1. Save Photos
+            # 1. Save Photos (chunked upload ids or classic multipart files)
             photo_paths = []
+            for upload_id in request.form.getlist('photo_upload_ids'):
+                path = chunked_upload_service.resolve(upload_id, current_user.username, kinds={'photo'})
+                if path:
+                    upload_store.add_ref(path, *report_ref)
+                    photo_paths.append(path)
             if 'photos' in request.files:
-                files = request.files.getlist('photos')
-                for file in files:
-                    if file and file.filename:
-                        filename = secure_filename(f"{request_id}_{file.filename}")
-                        filepath = os.path.join('static/uploads/reports', filename)
-                        os.makedirs('static/uploads/reports', exist_ok=True)
-                        file.save(filepath)
-                        photo_paths.append(f"uploads/reports/{filename}")
+                for file in request.files.getlist('photos'):
+                    stored = upload_store.save(file, ref=report_ref)
+                    if stored:
+                        photo_paths.append(stored.path)
             
             # 2. Save Voice Note
-            voice_url = None
-            if 'voice_note' in request.files:
-                voice_file = request.files['voice_note']
-                if voice_file:
-                    filename = f"voice_{request_id}_{secure_filename(voice_file.filename)}"
-                    filepath = os.path.join('static/uploads/reports', filename)
-                    os.makedirs('static/uploads/reports', exist_ok=True)
-                    voice_file.save(filepath)
-                    voice_url = f"uploads/reports/{filename}"
+            voice_url = chunked_upload_service.resolve(request.form.get('voice_upload_id'),
+                                                       current_user.username, kinds={'voice'})
+            if voice_url:
+                upload_store.add_ref(voice_url, *report_ref)
+            elif 'voice_note' in request.files:
+                stored = upload_store.save(request.files['voice_note'], ref=report_ref)
+                if stored:
+                    voice_url = stored.path
 
             # 3. Data
             report_data = {
@@ -179,6 +176,7 @@ def submit_report(request_id):
             }
             
             inspection_model.submit_report(request_id, report_data)
+            image_service.enqueue_many(photo_paths)
             return jsonify({'success': True})
             
         except Exception as e:
@@ -190,12 +188,17 @@ def submit_report(request_id):
 @inspection_bp.route('/api/governorates')
 def get_governorates():
     """API: Get all governorates"""
-    return jsonify(get_all_governorates())
+    return location_service.governorates_response()
 
 @inspection_bp.route('/api/cities/<governorate>')
 def get_cities(governorate):
     """API: Get cities for governorate"""
-    return jsonify(get_cities_by_governorate(governorate))
+    return location_service.cities_response(governorate)
+
+@inspection_bp.route('/api/locations/search')
+def search_locations():
+    """API: Typeahead over governorates and cities (?q=prefix)"""
+    return location_service.search_response(request.args.get('q', ''))
 
 @inspection_bp.route('/worker/settings/location', methods=['POST'])
 @login_required
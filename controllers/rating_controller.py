@@ -5,9 +5,7 @@ Handles rating and complaint operations
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from models import RatingModel, ComplaintModel, UserModel
-from werkzeug.utils import secure_filename
-import os
-from datetime import datetime
+from services.upload_store import upload_store
 
 rating_bp = Blueprint('rating', __name__)
 
@@ -16,10 +14,12 @@ rating_model = RatingModel()
 complaint_model = ComplaintModel()
 user_model = UserModel()
 
-# Configure upload folder
-UPLOAD_FOLDER = 'static/uploads/complaints'
+# Allowed complaint attachments
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Ratings listed on a worker profile
+PROFILE_RATINGS_LIMIT = 20
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -36,8 +36,8 @@ def worker_profile(username):
     # Get rating statistics
     rating_stats = rating_model.get_worker_stats(username)
     
-    # Get all ratings
-    ratings = rating_model.get_worker_ratings(username)
+    # Get the latest ratings (totals come from the aggregate above)
+    ratings = rating_model.get_worker_ratings(username, limit=PROFILE_RATINGS_LIMIT)
     
     # Get complaint count
     complaint_count = complaint_model.get_worker_complaint_count(username)
@@ -101,22 +101,13 @@ def submit_complaint(worker_username):
         return redirect(url_for('rating.worker_profile', username=worker_username))
     
     # Handle image uploads
-    uploaded_images = []
+    stored_images = []
     if 'images' in request.files:
-        files = request.files.getlist('images')
-        
-        # Create upload directory if it doesn't exist
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        
-        for file in files:
+        for file in request.files.getlist('images'):
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # Add timestamp to filename to avoid conflicts
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{timestamp}_{filename}"
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(filepath)
-                uploaded_images.append(f"uploads/complaints/{filename}")
+                stored = upload_store.save(file)
+                if stored:
+                    stored_images.append(stored)
     
     # Add complaint
     result = complaint_model.add_complaint(
@@ -124,8 +115,10 @@ def submit_complaint(worker_username):
         worker_id=worker_username,
         reason=reason,
         description=description,
-        images=uploaded_images
+        images=[s.path for s in stored_images]
     )
+    for stored in stored_images:
+        upload_store.add_ref(stored, 'complaints', result.get('complaint_id'))
     
     flash(result['message'], 'success' if result['success'] else 'error')
     return redirect(url_for('rating.worker_profile', username=worker_username))
@@ -0,0 +1,56 @@
+"""
+Upload Controller
+Resumable chunked upload API used for large inspection media
+"""
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from services.chunked_upload_service import chunked_upload_service
+
+upload_bp = Blueprint('upload', __name__)
+
+
+def _respond(result, error_status=400):
+    return jsonify(result), (200 if result.get('success') else error_status)
+
+
+@upload_bp.route('/api/uploads', methods=['POST'])
+@login_required
+def start_upload():
+    """API: Open an upload session {filename, size, kind, sha256?}"""
+    data = request.json or {}
+    result = chunked_upload_service.start(
+        owner=current_user.username,
+        kind=data.get('kind'),
+        filename=data.get('filename'),
+        total_size=data.get('size'),
+        sha256=data.get('sha256')
+    )
+    return _respond(result)
+
+
+@upload_bp.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    """API: Received chunks, so an interrupted client can resume"""
+    return _respond(chunked_upload_service.status(upload_id, current_user.username), 404)
+
+
+@upload_bp.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id, index):
+    """API: Raw chunk body, checksum in the X-Chunk-SHA256 header"""
+    result = chunked_upload_service.write_chunk(
+        upload_id,
+        current_user.username,
+        index,
+        request.stream,
+        request.headers.get('X-Chunk-SHA256')
+    )
+    return _respond(result)
+
+
+@upload_bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """API: Assemble and store the upload; returns its static path"""
+    return _respond(chunked_upload_service.complete(upload_id, current_user.username), 409)
@@ -1,14 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import current_user, login_required
-from flask_bcrypt import Bcrypt
-from werkzeug.utils import secure_filename
 from datetime import datetime
-import os
 from models import UserModel, ContactModel, PaymentModel, ChatModel, UnansweredQuestionsModel, SubscriptionModel, ComplaintModel, RatingModel
 from websockets import notify_admins, broadcast_percentage_update
+from services.image_service import image_service
+from services.upload_store import upload_store
+from services.password_service import password_service
 
 user_bp = Blueprint('user', __name__)
-bcrypt = Bcrypt()
 user_model = UserModel()
 contact_model = ContactModel()
 payment_model = PaymentModel()
@@ -29,30 +28,19 @@ def register():
         email = request.form.get('email', '')
         project_description = request.form.get('project_description', 'لا يوجد وصف للمشروع')
         
-        # Handle profile image upload
-        profile_image_path = None
-        if 'profile_image' in request.files:
-            file = request.files['profile_image']
-            if file and file.filename != '':
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'jpg'
-                unique_filename = f"{username}_{timestamp}.{file_extension}"
-                
-                upload_folder = os.path.join('static', 'user_images')
-                if not os.path.exists(upload_folder):
-                    os.makedirs(upload_folder)
-                file_path = os.path.join(upload_folder, unique_filename)
-                file.save(file_path)
-                
-                profile_image_path = f"user_images/{unique_filename}"
-        
         # Check if user exists
         if user_model.get_by_username(username):
             flash('اسم المستخدم مسجل بالفعل')
             return redirect(url_for('user.register'))
+        
+        # Handle profile image upload (deduplicated blob store)
+        profile_image_path = None
+        if 'profile_image' in request.files:
+            stored = upload_store.save(request.files['profile_image'], ref=('users', username))
+            if stored:
+                profile_image_path = stored.path
             
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = password_service.hash(password)
         
         # First user is admin, otherwise use selected role
         all_users = user_model.get_all()
@@ -88,6 +76,9 @@ def register():
             
         user_model.create(user_data)
         
+        # Thumbnails / WebP variants are generated in the background
+        image_service.enqueue(profile_image_path)
+        
         # Notify admins
         notify_admins('new_user', {
             'username': username,
@@ -221,6 +212,7 @@ def delete(username):
         return redirect(url_for('index'))
 
     user_model.delete(username)
+    upload_store.release('users', username)
     flash(f"تم حذف المستخدم {username} بنجاح.")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -270,6 +262,7 @@ def submit_project_rating():
         flash("التقييم يجب أن يكون بين 1 و 5 نجوم.", 'error')
         return redirect(url_for('user.profile', username=current_user.username))
         
+    result = rating_model.add_project_rating(current_user.username, rating, comment or '')
     flash(result['message'], 'success' if result['success'] else 'error')
     return redirect(url_for('user.profile', username=current_user.username))
 
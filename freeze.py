@@ -1,6 +1,30 @@
-from flask_frozen import Freezer
-from app import app
+"""
+Static Site Freezer
+Incremental by default: each page's inputs (the templates it renders, including
+extends/includes, the view modules that build its context, and the shared app
+code and asset manifest) are hashed and unchanged pages are skipped. Changed
+pages are rendered in a process pool, static files are copied only when they
+differ, and per-page render times are reported.
+
+    python freeze.py              # incremental
+    python freeze.py --full       # ignore the cache and render everything
+    python freeze.py --workers 8
+"""
 import os
+from flask_frozen import Freezer, walk_directory
+from flask import request, template_rendered, url_for
+from jinja2 import meta
+from app import app
+from utils.assets import build_precache_manifest, load_manifest, PRECACHE_MANIFEST_NAME, DIST_DIR, MANIFEST_NAME
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote, urlsplit
+import multiprocessing
+import argparse
+import hashlib
+import inspect
+import shutil
+import json
+import time
 
 # Configure Freezer
 app.config['FREEZER_DESTINATION'] = 'dist_static'
@@ -8,13 +32,253 @@ app.config['FREEZER_RELATIVE_URLS'] = True
 
 freezer = Freezer(app)
 
+STATE_FILE = '.freeze-cache.json'
+EXTRA_FILES = ['_redirects', PRECACHE_MANIFEST_NAME]
+# Endpoints frozen by copying files from disk instead of rendering
+FILE_ENDPOINTS = {'static', 'assets.serve_asset'}
+# Nested private/dynamic routes only redirect to the login page in a static build,
+# and '/admin' as a file would collide with an 'admin/' directory
+EXCLUDED_PREFIXES = ('/admin/', '/worker/', '/inspection/', '/verify/', '/api/')
+# Code every page depends on (context processors, url_for, config)
+SHARED_INPUTS = ['app.py', 'config.py', 'utils/assets.py',
+                 os.path.join('static', DIST_DIR, MANIFEST_NAME)]
+
+
+def _file_digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _relative(path):
+    return os.path.relpath(path).replace(os.sep, '/')
+
+
+def _template_files(name, seen=None):
+    """Source files of a template and everything it extends/includes/imports."""
+    seen = set() if seen is None else seen
+    try:
+        source, filename, _ = app.jinja_env.loader.get_source(app.jinja_env, name)
+    except Exception:
+        return seen
+    if filename in seen:
+        return seen
+    seen.add(filename)
+    for child in meta.find_referenced_templates(app.jinja_env.parse(source)):
+        if child:  # None for dynamic names
+            _template_files(child, seen)
+    return seen
+
+
+def _render_page(url):
+    """Render one URL in a worker process. Returns what the parent needs for its cache."""
+    templates, endpoints = set(), set()
+
+    def record(sender, template, context, **extra):
+        templates.update(_template_files(template.name))
+        endpoints.add(request.endpoint)
+
+    freezer.url_for_logger.logged_calls.clear()
+    started = time.perf_counter()
+    with template_rendered.connected_to(record, app):
+        path = freezer._build_one(url)
+    seconds = time.perf_counter() - started
+
+    links = []
+    with app.test_request_context():
+        for endpoint, values in freezer.url_for_logger.logged_calls:
+            links.append((endpoint, urlsplit(unquote(url_for(endpoint, **values))).path))
+
+    sources = set()
+    for endpoint in endpoints:
+        view = app.view_functions.get(endpoint)
+        source = inspect.getsourcefile(view) if view else None
+        if source:
+            sources.add(_relative(source))
+
+    with open(path, 'rb') as f:
+        output_hash = hashlib.sha256(f.read()).hexdigest()
+    return {
+        'url': url,
+        'path': _relative(path),
+        'seconds': seconds,
+        'templates': sorted(_relative(t) for t in templates),
+        'sources': sorted(sources),
+        'links': links,
+        'output': output_hash,
+    }
+
+
+class IncrementalFreezer:
+    """Drives `freezer` page by page, reusing the previous build where inputs are unchanged."""
+
+    def __init__(self, workers=None, full=False):
+        self.workers = workers or os.cpu_count() or 1
+        self.full = full
+        self.root = str(freezer.root)
+        self.state = {} if full else self._load_state()
+        self._digests = {}
+        self.shared_hash = self._hash_files(SHARED_INPUTS) + json.dumps(
+            {k: v for k, v in app.config.items() if k.startswith('FREEZER_')}, sort_keys=True, default=str)
+
+    def _load_state(self):
+        try:
+            with open(STATE_FILE, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _hash_files(self, paths):
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(path.encode('utf-8'))
+            digest.update((self._digest(path) or 'missing').encode('utf-8'))
+        return digest.hexdigest()
+
+    def _digest(self, path):
+        if path not in self._digests:
+            self._digests[path] = _file_digest(path)
+        return self._digests[path]
+
+    def fingerprint(self, record):
+        return self._hash_files(record['templates'] + record['sources']) + self.shared_hash
+
+    def is_fresh(self, url):
+        record = self.state.get(url)
+        if not record or not os.path.isfile(record['path']):
+            return False
+        return record.get('fingerprint') == self.fingerprint(record)
+
+    def _copy_file(self, src, rel_dest):
+        """Copy a file into the build unless an identical copy is already there."""
+        dest = os.path.join(self.root, rel_dest)
+        src_stat = os.stat(src)
+        try:
+            dest_stat = os.stat(dest)
+            if dest_stat.st_size == src_stat.st_size and dest_stat.st_mtime_ns == src_stat.st_mtime_ns:
+                return dest, False
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copy2(src, dest)
+        return dest, True
+
+    def _initial_urls(self):
+        urls, files = [], set()
+        for url, endpoint, _ in freezer._generate_all_urls():
+            if endpoint in FILE_ENDPOINTS:
+                files.add((endpoint, url))
+            elif url not in urls and not url.startswith(EXCLUDED_PREFIXES):
+                urls.append(url)
+        return urls, files
+
+    def _file_source(self, endpoint, url):
+        static_url = app.static_url_path.rstrip('/') + '/'
+        if endpoint == 'static' and url.startswith(static_url):
+            return os.path.join(app.static_folder, url[len(static_url):])
+        if endpoint == 'assets.serve_asset' and url.startswith('/assets/'):
+            return os.path.join(app.static_folder, DIST_DIR, url[len('/assets/'):])
+        return None
+
+    def run(self):
+        started = time.perf_counter()
+        os.makedirs(self.root, exist_ok=True)
+        pending, file_urls = self._initial_urls()
+        seen = set(pending)
+        built, timings = set(), []
+        rendered = skipped = copied = 0
+
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            while pending:
+                wave, pending = pending, []
+                to_render = []
+                for url in wave:
+                    if self.is_fresh(url):
+                        record = self.state[url]
+                        built.add(os.path.abspath(record['path']))
+                        skipped += 1
+                        self._discover(record['links'], seen, pending, file_urls)
+                    else:
+                        to_render.append(url)
+
+                for result in pool.map(_render_page, to_render):
+                    result['fingerprint'] = self.fingerprint(result)
+                    self.state[result['url']] = result
+                    built.add(os.path.abspath(result['path']))
+                    timings.append((result['seconds'], result['url']))
+                    rendered += 1
+                    self._discover(result['links'], seen, pending, file_urls)
+
+        for endpoint, url in sorted(file_urls):
+            src = self._file_source(endpoint, url)
+            if not src or not os.path.isfile(src):
+                continue
+            dest, changed = self._copy_file(src, url.lstrip('/'))
+            built.add(os.path.abspath(dest))
+            copied += changed
+
+        # Pages that no longer exist are dropped from the cache
+        self.state = {url: rec for url, rec in self.state.items() if url in seen}
+        with open(STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+
+        self._write_extras(built)
+        self._remove_extra_files(built)
+
+        for seconds, url in sorted(timings, reverse=True):
+            print(f"  {seconds * 1000:8.1f} ms  {url}")
+        print(f"Rendered {rendered} pages, skipped {skipped} unchanged, "
+              f"copied {copied} of {len(file_urls)} static files "
+              f"in {time.perf_counter() - started:.2f}s ({self.workers} workers).")
+
+    def _discover(self, links, seen, pending, file_urls):
+        for endpoint, url in links:
+            if endpoint in FILE_ENDPOINTS:
+                file_urls.add((endpoint, url))
+            elif url not in seen and not url.startswith(EXCLUDED_PREFIXES):
+                seen.add(url)
+                pending.append(url)
+
+    def _write_extras(self, built):
+        # Netlify SPA fallback
+        redirects_path = os.path.join(self.root, '_redirects')
+        if _file_digest(redirects_path) != hashlib.sha256(b'/*    /index.html   200').hexdigest():
+            with open(redirects_path, 'w') as f:
+                f.write('/*    /index.html   200')
+
+        # Regenerate the service worker precache list with the frozen page hashes
+        build_precache_manifest(
+            load_manifest(app.static_folder),
+            pages_root=self.root,
+            outputs=[os.path.join(app.static_folder, PRECACHE_MANIFEST_NAME),
+                     os.path.join(self.root, PRECACHE_MANIFEST_NAME)]
+        )
+        built.update(os.path.abspath(os.path.join(self.root, name)) for name in EXTRA_FILES)
+
+    def _remove_extra_files(self, built):
+        """Remove files from a previous build that are not part of this one."""
+        if not app.config['FREEZER_REMOVE_EXTRA_FILES']:
+            return
+        ignore = app.config['FREEZER_DESTINATION_IGNORE']
+        for name in walk_directory(self.root, ignore=ignore):
+            path = os.path.abspath(os.path.join(self.root, name))
+            if path not in built:
+                os.remove(path)
+                try:
+                    os.rmdir(os.path.dirname(path))
+                except OSError:
+                    pass
+
+
 if __name__ == '__main__':
-    # Add _redirects to dist_static after building
-    freezer.freeze()
-    
-    # Manually create _redirects file for Netlify in the output folder
-    redirects_path = os.path.join(app.config['FREEZER_DESTINATION'], '_redirects')
-    with open(redirects_path, 'w') as f:
-        f.write('/*    /index.html   200')
-        
+    parser = argparse.ArgumentParser(description='Freeze the site into static files.')
+    parser.add_argument('--full', action='store_true', help='ignore the build cache and render every page')
+    parser.add_argument('--workers', type=int, default=None, help='render processes (default: CPU count)')
+    args = parser.parse_args()
+
+    IncrementalFreezer(workers=args.workers, full=args.full).run()
+
     print(f"Static site generated in {app.config['FREEZER_DESTINATION']} folder.")
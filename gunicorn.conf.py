@@ -0,0 +1,23 @@
+"""
+Gunicorn settings (picked up automatically from the working directory by
+`gunicorn app:app`, as in the Procfile and Dockerfile).
+
+The app is imported once in the master and the workers are forked from it,
+so models, blueprints, the chatbot's knowledge base and the compiled
+templates are shared copy-on-write instead of rebuilt per worker. Database
+connections are opened per call and the services reset their pools and
+locks in forked children; the scheduler thread is started in each worker.
+Worker count comes from WEB_CONCURRENCY (gunicorn's default).
+"""
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    from app import app, preload_shared_state
+    preload_shared_state(app)
+
+
+def post_fork(server, worker):
+    from app import app, start_worker_services
+    start_worker_services(app)
@@ -11,7 +11,15 @@ from .database import (
     UnansweredQuestionsModel,
     ContactModel,
     SubscriptionModel,
-    ComplaintModel
+    ComplaintModel,
+    ImageVariantModel,
+    BlobModel,
+    ChunkedUploadModel,
+    SchedulerLeaseModel,
+    BackupJobModel,
+    JobRunModel,
+    AnalyticsRollupModel,
+    WorkerLocationModel
 )
 from .rating_model import RatingModel
 from .inspection_model import InspectionRequestModel
@@ -28,5 +36,13 @@ __all__ = [
     'SubscriptionModel',
     'RatingModel',
     'ComplaintModel',
-    'InspectionRequestModel'
+    'InspectionRequestModel',
+    'ImageVariantModel',
+    'BlobModel',
+    'ChunkedUploadModel',
+    'SchedulerLeaseModel',
+    'BackupJobModel',
+    'JobRunModel',
+    'AnalyticsRollupModel',
+    'WorkerLocationModel'
 ]
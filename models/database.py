@@ -4,8 +4,15 @@ Handles all database operations using SQL for better reliability.
 """
 import sqlite3
 import os
+import math
+import time
+import threading
 from datetime import datetime
 
+from flask import g, has_request_context
+
+from .query import QueryExpression, compile_order_by
+
 class Database:
     """SQLite Database singleton class"""
     _instance = None
@@ -67,7 +74,18 @@ class Database:
             cursor.execute("SELECT chat_memory_enabled FROM users LIMIT 1")
         except sqlite3.OperationalError:
             cursor.execute("ALTER TABLE users ADD COLUMN chat_memory_enabled BOOLEAN DEFAULT 1")
-        
+
+        # Worker location settings (saved from /worker/settings/location)
+        for column, definition in [('latitude', 'REAL'), ('longitude', 'REAL'),
+                                   ('gps_active', 'BOOLEAN DEFAULT 0'),
+                                   ('available_for_inspection', 'BOOLEAN DEFAULT 1'),
+                                   ('max_inspection_distance', 'INTEGER DEFAULT 50'),
+                                   ('governorate', 'TEXT'), ('city', 'TEXT')]:
+            try:
+                cursor.execute(f"SELECT {column} FROM users LIMIT 1")
+            except sqlite3.OperationalError:
+                cursor.execute(f"ALTER TABLE users ADD COLUMN {column} {definition}")
+
         # 3. Contacts Table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS contacts (
@@ -161,6 +179,38 @@ class Database:
                 created_at TEXT
             )
         ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ratings_worker ON ratings (worker_id, created_at)")
+
+        # One rating per user and worker: keep each user's latest rating (as the upsert does) before enforcing it
+        if not cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_ratings_user_worker'").fetchone():
+            cursor.execute('''
+                DELETE FROM ratings WHERE user_id IS NOT NULL AND id NOT IN (
+                    SELECT MAX(id) FROM ratings WHERE user_id IS NOT NULL GROUP BY user_id, worker_id)
+            ''')
+            cursor.execute("CREATE UNIQUE INDEX ux_ratings_user_worker ON ratings (user_id, worker_id)")
+
+        # 9b. Worker Rating Stats (aggregates kept in step with ratings by RatingModel)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS worker_rating_stats (
+                worker_id TEXT PRIMARY KEY,
+                rating_count INTEGER NOT NULL DEFAULT 0,
+                quality_sum INTEGER NOT NULL DEFAULT 0,
+                behavior_sum INTEGER NOT NULL DEFAULT 0,
+                quality_1 INTEGER DEFAULT 0, quality_2 INTEGER DEFAULT 0, quality_3 INTEGER DEFAULT 0,
+                quality_4 INTEGER DEFAULT 0, quality_5 INTEGER DEFAULT 0,
+                behavior_1 INTEGER DEFAULT 0, behavior_2 INTEGER DEFAULT 0, behavior_3 INTEGER DEFAULT 0,
+                behavior_4 INTEGER DEFAULT 0, behavior_5 INTEGER DEFAULT 0,
+                updated_at TEXT
+            )
+        ''')
+        if not cursor.execute("SELECT 1 FROM worker_rating_stats LIMIT 1").fetchone():
+            stars = ', '.join(f"SUM({field}_rating = {n})" for field in ('quality', 'behavior') for n in range(1, 6))
+            cursor.execute(f'''
+                INSERT INTO worker_rating_stats
+                SELECT worker_id, COUNT(*), COALESCE(SUM(quality_rating), 0), COALESCE(SUM(behavior_rating), 0),
+                       {stars}, ?
+                FROM ratings WHERE worker_id IS NOT NULL GROUP BY worker_id
+            ''', (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
         
         # 10. Complaints Table
         cursor.execute('''
@@ -175,7 +225,7 @@ class Database:
             )
         ''')
 
-        # 11. Inspection Requests
+        # 11. Inspection Requests (images, inspection_report, rejected_workers hold JSON)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS inspection_requests (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -188,8 +238,172 @@ class Database:
                 created_at TEXT
             )
         ''')
-        
+
+        inspection_columns = [
+            ('user_id', 'TEXT'), ('user_latitude', 'REAL'), ('user_longitude', 'REAL'),
+            ('governorate', 'TEXT'), ('city', 'TEXT'), ('user_address', 'TEXT'),
+            ('service_type', 'TEXT'), ('description', 'TEXT'), ('images', 'TEXT'),
+            ('assigned_worker', 'TEXT'), ('inspection_by', 'TEXT'), ('inspection_report', 'TEXT'),
+            ('rejected_workers', 'TEXT'), ('admin_rejection_reason', 'TEXT'), ('response_deadline', 'TEXT'),
+            ('assigned_at', 'TEXT'), ('accepted_at', 'TEXT'), ('approved_at', 'TEXT'),
+            ('completed_at', 'TEXT'), ('cancelled_at', 'TEXT'), ('rejected_at', 'TEXT'),
+        ]
+        for column, definition in inspection_columns:
+            try:
+                cursor.execute(f"SELECT {column} FROM inspection_requests LIMIT 1")
+            except sqlite3.OperationalError:
+                cursor.execute(f"ALTER TABLE inspection_requests ADD COLUMN {column} {definition}")
+                # Carry over the owner / worker of rows written with the old schema
+                if column == 'user_id':
+                    cursor.execute("UPDATE inspection_requests SET user_id = username WHERE user_id IS NULL")
+                elif column == 'assigned_worker':
+                    cursor.execute("UPDATE inspection_requests SET assigned_worker = worker_id WHERE assigned_worker IS NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inspection_requests_status ON inspection_requests (status, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inspection_requests_user ON inspection_requests (user_id, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inspection_requests_worker ON inspection_requests (assigned_worker, created_at)")
+
+        # 12. Image Variants (thumbnails / WebP generated from uploads)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_variants (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                original_path TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                path TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                size_bytes INTEGER,
+                created_at TEXT,
+                UNIQUE (original_path, variant)
+            )
+        ''')
+
+        # 13. Upload Blobs (content-addressed by SHA-256 of the uploaded bytes)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size_bytes INTEGER,
+                ref_count INTEGER DEFAULT 0,
+                created_at TEXT
+            )
+        ''')
+
+        # 14. Blob References (one row per record pointing at a blob)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blob_refs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sha256 TEXT NOT NULL,
+                ref_table TEXT NOT NULL,
+                ref_key TEXT NOT NULL,
+                created_at TEXT,
+                UNIQUE (sha256, ref_table, ref_key)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_blob_refs_owner ON blob_refs (ref_table, ref_key)")
+
+        # 15. Chunked Upload Sessions (resumable uploads for large media)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chunked_uploads (
+                upload_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                filename TEXT,
+                total_size INTEGER NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                total_chunks INTEGER NOT NULL,
+                sha256 TEXT,
+                status TEXT DEFAULT 'pending',
+                blob_path TEXT,
+                created_at TEXT,
+                updated_at TEXT
+            )
+        ''')
+
+        # 16. Received Chunks (one row per verified chunk)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS upload_chunks (
+                upload_id TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                PRIMARY KEY (upload_id, chunk_index)
+            )
+        ''')
+
+        # 17. Scheduler Leases (single leader across worker processes)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scheduler_leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                acquired_at TEXT
+            )
+        ''')
+
+        # 18. Job Runs (history of scheduled maintenance jobs)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job TEXT NOT NULL,
+                owner TEXT,
+                trigger TEXT DEFAULT 'schedule',
+                status TEXT DEFAULT 'running',
+                started_at TEXT,
+                finished_at TEXT,
+                duration_ms INTEGER,
+                result TEXT,
+                error TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs (job, started_at)")
+
+        # 19. Analytics Rollups (daily counters kept after raw logs expire)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_daily (
+                day TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, metric, key)
+            )
+        ''')
+
+        # 20. Worker Locations (grid index of workers that can take inspections)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS worker_locations (
+                username TEXT PRIMARY KEY,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                cell_lat INTEGER NOT NULL,
+                cell_lon INTEGER NOT NULL,
+                specialization TEXT,
+                gps_active INTEGER DEFAULT 0,
+                available INTEGER DEFAULT 1,
+                max_distance REAL DEFAULT 50,
+                updated_at TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_worker_locations_cell ON worker_locations (cell_lat, cell_lon)")
+
+        # 21. Backup Jobs (progress of background backups, visible to every worker process)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backup_jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                snapshot INTEGER DEFAULT 0,
+                status TEXT DEFAULT 'queued',
+                progress REAL DEFAULT 0,
+                file TEXT,
+                error TEXT,
+                requested_by TEXT,
+                started_at TEXT,
+                finished_at TEXT
+            )
+        ''')
+
         conn.commit()
+        if conn.execute("SELECT COUNT(*) FROM worker_locations").fetchone()[0] == 0:
+            WorkerLocationModel.rebuild(conn)
         conn.close()
 
     def get_connection(self):
@@ -285,29 +499,33 @@ class GenericSQLiteModel(SQLiteModel):
         finally:
             conn.close()
 
-    def search(self, query=None):
-        # Very basic search shim for TinyDB compatibility
-        # Supports simple equality checks if query is a dictionary {col: val}
+    def search(self, query=None, order_by=None, limit=None):
+        """
+        Rows matching a query expression (see models/query.py) or a
+        {col: value} dict of equality conditions; None matches every row.
+        order_by: 'col' / '-col' (descending) or a list of them.
+        """
+        where, values = self._compile_where(query)
+        sql = f"SELECT * FROM {self.table}{where}{compile_order_by(order_by)}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            values.append(int(limit))
         conn = self.db_mgr.get_connection()
-        if isinstance(query, dict):
-            conditions = []
-            values = []
-            for k, v in query.items():
-                conditions.append(f"{k} = ?")
-                values.append(v)
-            if conditions:
-                sql = f"SELECT * FROM {self.table} WHERE {' AND '.join(conditions)}"
-                rows = conn.execute(sql, values).fetchall()
-            else:
-                rows = conn.execute(f"SELECT * FROM {self.table}").fetchall()
-        else:
-            # Fallback for complex queries (not supported) return all and let python filter if possible?
-            # Or just return all as before (unsafe but keeps existing behavior)
-            rows = conn.execute(f"SELECT * FROM {self.table}").fetchall()
-        
+        rows = conn.execute(sql, values).fetchall()
         conn.close()
         return [self._dict_from_row(r) for r in rows]
 
+    @staticmethod
+    def _compile_where(query):
+        if isinstance(query, dict):
+            query = QueryExpression.from_dict(query)
+        if query is None:
+            return '', []
+        if not isinstance(query, QueryExpression):
+            raise TypeError(f"Unsupported query: {query!r}")
+        sql, values = query.compile()
+        return f" WHERE {sql}", values
+
     def get(self, doc_id=None, **kwargs):
         conn = self.db_mgr.get_connection()
         if doc_id:
@@ -338,13 +556,10 @@ class GenericSQLiteModel(SQLiteModel):
             placeholders = ', '.join(['?'] * len(doc_ids))
             sql += f" WHERE id IN ({placeholders})"
             values.extend(doc_ids)
-        elif isinstance(query, dict):
-            conditions = []
-            for k, v in query.items():
-                conditions.append(f"{k} = ?")
-                values.append(v)
-            if conditions:
-                sql += f" WHERE {' AND '.join(conditions)}"
+        elif query:
+            where, where_values = self._compile_where(query)
+            sql += where
+            values.extend(where_values)
         
         conn = self.db_mgr.get_connection()
         conn.execute(sql, values)
@@ -360,20 +575,86 @@ class GenericSQLiteModel(SQLiteModel):
         conn.close()
 
 class UserModel(SQLiteModel):
+    """
+    Users are read on every request (Flask-Login) and often several times per
+    request, so rows are cached twice: an identity map on flask.g that lives
+    for one request, and a short-TTL map shared by the threads of a process.
+    Writes through this model invalidate both; other worker processes see a
+    change within CACHE_TTL_SECONDS. Callers always get their own copy.
+    """
+    CACHE_TTL_SECONDS = 5
+    _cache = {}
+    _cache_lock = threading.Lock()
+
     def __init__(self):
         super().__init__('users')
+
+    @staticmethod
+    def _identity_map():
+        if not has_request_context():
+            return None
+        if '_user_identity_map' not in g:
+            g._user_identity_map = {}
+        return g._user_identity_map
+
+    @classmethod
+    def _remember(cls, username, user):
+        identity_map = cls._identity_map()
+        if identity_map is not None:
+            identity_map[username] = user
+        with cls._cache_lock:
+            cls._cache[username] = (time.monotonic() + cls.CACHE_TTL_SECONDS, user)
+
+    @classmethod
+    def _after_fork(cls):
+        cls._cache = {}
+        cls._cache_lock = threading.Lock()
+
+    @classmethod
+    def invalidate(cls, username=None):
+        """Forget one cached user (or all of them)"""
+        identity_map = cls._identity_map()
+        with cls._cache_lock:
+            if username is None:
+                cls._cache.clear()
+            else:
+                cls._cache.pop(username, None)
+        if identity_map is not None:
+            if username is None:
+                identity_map.clear()
+            else:
+                identity_map.pop(username, None)
     
     def get_by_username(self, username):
+        identity_map = self._identity_map()
+        if identity_map is not None and username in identity_map:
+            user = identity_map[username]
+            return dict(user) if user else None
+        with self._cache_lock:
+            cached = self._cache.get(username)
+        if cached and cached[0] > time.monotonic():
+            user = cached[1]
+            if identity_map is not None:
+                identity_map[username] = user
+            return dict(user) if user else None
+
         conn = self.db_mgr.get_connection()
         row = conn.execute(f"SELECT * FROM {self.table} WHERE username = ?", (username,)).fetchone()
         conn.close()
-        return self._dict_from_row(row)
+        user = self._dict_from_row(row)
+        self._remember(username, user)
+        return dict(user) if user else None
     
     def get_all(self):
         conn = self.db_mgr.get_connection()
         rows = conn.execute(f"SELECT * FROM {self.table}").fetchall()
         conn.close()
-        return [self._dict_from_row(r) for r in rows]
+        users = [self._dict_from_row(r) for r in rows]
+        # Later single-user lookups in this request are served from the same rows
+        identity_map = self._identity_map()
+        if identity_map is not None:
+            identity_map.update((u['username'], dict(u)) for u in users)
+        return users
     
     def create(self, user_data):
         if 'created_at' not in user_data:
@@ -390,6 +671,7 @@ class UserModel(SQLiteModel):
             conn.commit()
         finally:
             conn.close()
+        self.invalidate(filtered_data.get('username'))
     
     def update(self, username, data):
         filtered_data = self._filter_data(data)
@@ -403,15 +685,35 @@ class UserModel(SQLiteModel):
         conn = self.db_mgr.get_connection()
         try:
             conn.execute(sql, values)
+            if WorkerLocationModel.SOURCE_COLUMNS & filtered_data.keys():
+                WorkerLocationModel.sync(conn, username)
             conn.commit()
         finally:
             conn.close()
+        self.invalidate(username)
     
     def delete(self, username):
         conn = self.db_mgr.get_connection()
         conn.execute(f"DELETE FROM {self.table} WHERE username = ?", (username,))
+        conn.execute("DELETE FROM worker_locations WHERE username = ?", (username,))
         conn.commit()
         conn.close()
+        self.invalidate(username)
+
+    def get_many(self, usernames):
+        """Users by username in one query, keyed by username."""
+        if not usernames:
+            return {}
+        placeholders = ', '.join(['?'] * len(usernames))
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"SELECT * FROM {self.table} WHERE username IN ({placeholders})", list(usernames)).fetchall()
+        conn.close()
+        return {r['username']: self._dict_from_row(r) for r in rows}
+
+
+# Forked workers start with an empty cache and an unheld lock
+os.register_at_fork(after_in_child=UserModel._after_fork)
+
 
 class ChatModel(SQLiteModel):
     def __init__(self):
@@ -519,6 +821,38 @@ class SecurityLogModel(SQLiteModel):
         conn.commit()
         conn.close()
 
+    def get_days(self, before_day):
+        """Distinct YYYY-MM-DD days that have log entries before `before_day`."""
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"SELECT DISTINCT substr(timestamp, 1, 10) AS day FROM {self.table} WHERE timestamp < ?",
+                            (before_day,)).fetchall()
+        conn.close()
+        return [r['day'] for r in rows if r['day']]
+
+    def get_by_day(self, day):
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"SELECT * FROM {self.table} WHERE timestamp >= ? AND timestamp < ?",
+                            (day, day + '~')).fetchall()
+        conn.close()
+        return [self._dict_from_row(r) for r in rows]
+
+    def get_oldest_day(self):
+        conn = self.db_mgr.get_connection()
+        row = conn.execute(f"SELECT MIN(timestamp) AS oldest FROM {self.table}").fetchone()
+        conn.close()
+        return row['oldest'][:10] if row and row['oldest'] else None
+
+    def delete_days(self, days):
+        """Delete all entries of the given days. Returns the number of rows removed."""
+        conn = self.db_mgr.get_connection()
+        removed = 0
+        for day in days:
+            removed += conn.execute(f"DELETE FROM {self.table} WHERE timestamp >= ? AND timestamp < ?",
+                                    (day, day + '~')).rowcount
+        conn.commit()
+        conn.close()
+        return removed
+
 class ContactModel(SQLiteModel):
     def __init__(self):
         super().__init__('contacts')
@@ -576,6 +910,9 @@ class ContactModel(SQLiteModel):
         conn.close()
 
 class LearnedAnswersModel(SQLiteModel):
+    # Bumped on every write in this process, so the chatbot knows its cached answers are stale
+    generation = 0
+
     def __init__(self):
         super().__init__('learned_answers')
     
@@ -595,6 +932,7 @@ class LearnedAnswersModel(SQLiteModel):
             conn.commit()
         finally:
             conn.close()
+        LearnedAnswersModel.generation += 1
 
 class UnansweredQuestionsModel(SQLiteModel):
     def __init__(self):
@@ -714,3 +1052,440 @@ class SubscriptionModel(SQLiteModel):
         conn.execute(sql, list(filtered_data.values()))
         conn.commit()
         conn.close()
+
+class ImageVariantModel(SQLiteModel):
+    def __init__(self):
+        super().__init__('image_variants')
+
+    def get_by_original(self, original_path):
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"SELECT * FROM {self.table} WHERE original_path = ?", (original_path,)).fetchall()
+        conn.close()
+        return [self._dict_from_row(r) for r in rows]
+
+    def get_variant(self, original_path, variant):
+        conn = self.db_mgr.get_connection()
+        row = conn.execute(f"SELECT * FROM {self.table} WHERE original_path = ? AND variant = ?",
+                           (original_path, variant)).fetchone()
+        conn.close()
+        return self._dict_from_row(row)
+
+    def upsert(self, original_path, variant, path, width=None, height=None, size_bytes=None):
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.db_mgr.get_connection()
+        try:
+            conn.execute(f"INSERT OR REPLACE INTO {self.table} (original_path, variant, path, width, height, size_bytes, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (original_path, variant, path, width, height, size_bytes, created_at))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete_by_original(self, original_path):
+        conn = self.db_mgr.get_connection()
+        conn.execute(f"DELETE FROM {self.table} WHERE original_path = ?", (original_path,))
+        conn.commit()
+        conn.close()
+
+class BlobModel(SQLiteModel):
+    """Rows for the content-addressed upload store and their references"""
+    def __init__(self):
+        super().__init__('blobs')
+
+    def get(self, sha256):
+        conn = self.db_mgr.get_connection()
+        row = conn.execute(f"SELECT * FROM {self.table} WHERE sha256 = ?", (sha256,)).fetchone()
+        conn.close()
+        return self._dict_from_row(row)
+
+    def get_by_path(self, path):
+        conn = self.db_mgr.get_connection()
+        row = conn.execute(f"SELECT * FROM {self.table} WHERE path = ?", (path,)).fetchone()
+        conn.close()
+        return self._dict_from_row(row)
+
+    def create(self, sha256, path, size_bytes):
+        """Insert the blob row if new. Returns True when this call created it."""
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.db_mgr.get_connection()
+        try:
+            cursor = conn.execute(f"INSERT OR IGNORE INTO {self.table} (sha256, path, size_bytes, ref_count, created_at) VALUES (?, ?, ?, 0, ?)",
+                                  (sha256, path, size_bytes, created_at))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def add_ref(self, sha256, ref_table, ref_key):
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.db_mgr.get_connection()
+        try:
+            cursor = conn.execute("INSERT OR IGNORE INTO blob_refs (sha256, ref_table, ref_key, created_at) VALUES (?, ?, ?, ?)",
+                                  (sha256, ref_table, str(ref_key), created_at))
+            if cursor.rowcount == 1:
+                conn.execute(f"UPDATE {self.table} SET ref_count = ref_count + 1 WHERE sha256 = ?", (sha256,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def release_refs(self, ref_table, ref_key, sha256=None):
+        """Drop references held by a record (optionally only to one blob)"""
+        conn = self.db_mgr.get_connection()
+        try:
+            if sha256:
+                rows = conn.execute("SELECT sha256 FROM blob_refs WHERE ref_table = ? AND ref_key = ? AND sha256 = ?",
+                                    (ref_table, str(ref_key), sha256)).fetchall()
+            else:
+                rows = conn.execute("SELECT sha256 FROM blob_refs WHERE ref_table = ? AND ref_key = ?",
+                                    (ref_table, str(ref_key))).fetchall()
+            for row in rows:
+                conn.execute("DELETE FROM blob_refs WHERE sha256 = ? AND ref_table = ? AND ref_key = ?",
+                             (row['sha256'], ref_table, str(ref_key)))
+                conn.execute(f"UPDATE {self.table} SET ref_count = MAX(ref_count - 1, 0) WHERE sha256 = ?", (row['sha256'],))
+            conn.commit()
+            return len(rows)
+        finally:
+            conn.close()
+
+    def prune_dangling_refs(self, owners):
+        """Delete references whose owning row no longer exists. owners: {table: key_column}"""
+        conn = self.db_mgr.get_connection()
+        try:
+            removed = 0
+            for ref_table, key_column in owners.items():
+                cursor = conn.execute(f"DELETE FROM blob_refs WHERE ref_table = ? AND ref_key NOT IN (SELECT CAST({key_column} AS TEXT) FROM {ref_table})",
+                                      (ref_table,))
+                removed += cursor.rowcount
+            # Re-derive counters from the reference rows so drift can't keep a blob alive
+            conn.execute(f"UPDATE {self.table} SET ref_count = (SELECT COUNT(*) FROM blob_refs r WHERE r.sha256 = {self.table}.sha256)")
+            conn.commit()
+            return removed
+        finally:
+            conn.close()
+
+    def get_unreferenced(self, older_than):
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"SELECT * FROM {self.table} WHERE ref_count = 0 AND created_at < ?", (older_than,)).fetchall()
+        conn.close()
+        return [self._dict_from_row(r) for r in rows]
+
+    def delete(self, sha256):
+        conn = self.db_mgr.get_connection()
+        conn.execute(f"DELETE FROM {self.table} WHERE sha256 = ? AND ref_count = 0", (sha256,))
+        conn.commit()
+        conn.close()
+
+    def get_stats(self):
+        conn = self.db_mgr.get_connection()
+        row = conn.execute(f"SELECT COUNT(*) AS blobs, COALESCE(SUM(size_bytes), 0) AS stored_bytes, "
+                           f"COALESCE(SUM(size_bytes * MAX(ref_count, 1)), 0) AS logical_bytes FROM {self.table}").fetchone()
+        conn.close()
+        return dict(row)
+
+class ChunkedUploadModel(SQLiteModel):
+    """Resumable upload sessions and their received chunks"""
+    def __init__(self):
+        super().__init__('chunked_uploads')
+
+    def create(self, upload_id, owner, kind, filename, total_size, chunk_size, total_chunks, sha256=None):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.db_mgr.get_connection()
+        try:
+            conn.execute(f"INSERT INTO {self.table} (upload_id, owner, kind, filename, total_size, chunk_size, total_chunks, sha256, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?)",
+                         (upload_id, owner, kind, filename, total_size, chunk_size, total_chunks, sha256, now, now))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, upload_id):
+        conn = self.db_mgr.get_connection()
+        row = conn.execute(f"SELECT * FROM {self.table} WHERE upload_id = ?", (upload_id,)).fetchone()
+        conn.close()
+        return self._dict_from_row(row)
+
+    def get_received(self, upload_id):
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute("SELECT chunk_index FROM upload_chunks WHERE upload_id = ? ORDER BY chunk_index", (upload_id,)).fetchall()
+        conn.close()
+        return [r['chunk_index'] for r in rows]
+
+    def mark_chunk(self, upload_id, chunk_index, sha256, size_bytes):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.db_mgr.get_connection()
+        try:
+            conn.execute("INSERT OR REPLACE INTO upload_chunks (upload_id, chunk_index, sha256, size_bytes) VALUES (?, ?, ?, ?)",
+                         (upload_id, chunk_index, sha256, size_bytes))
+            conn.execute(f"UPDATE {self.table} SET updated_at = ? WHERE upload_id = ?", (now, upload_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def claim_completion(self, upload_id, stale_before):
+        """Move a pending session (or one stuck completing since before stale_before) to 'completing'; True if this call won."""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.db_mgr.get_connection()
+        try:
+            cursor = conn.execute(f"""UPDATE {self.table} SET status = 'completing', updated_at = ?
+                                      WHERE upload_id = ? AND (status = 'pending'
+                                            OR (status = 'completing' AND updated_at < ?))""",
+                                  (now, upload_id, stale_before))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def release_completion(self, upload_id):
+        """Back to 'pending' after a failed completion so the client can fix and retry"""
+        conn = self.db_mgr.get_connection()
+        conn.execute(f"UPDATE {self.table} SET status = 'pending' WHERE upload_id = ? AND status = 'completing'", (upload_id,))
+        conn.commit()
+        conn.close()
+
+    def complete(self, upload_id, blob_path):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.db_mgr.get_connection()
+        try:
+            conn.execute(f"UPDATE {self.table} SET status = 'complete', blob_path = ?, updated_at = ? WHERE upload_id = ?",
+                         (blob_path, now, upload_id))
+            conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_stale(self, older_than):
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"SELECT * FROM {self.table} WHERE updated_at < ?", (older_than,)).fetchall()
+        conn.close()
+        return [self._dict_from_row(r) for r in rows]
+
+    def delete(self, upload_id):
+        conn = self.db_mgr.get_connection()
+        conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+        conn.execute(f"DELETE FROM {self.table} WHERE upload_id = ?", (upload_id,))
+        conn.commit()
+        conn.close()
+
+
+class SchedulerLeaseModel(SQLiteModel):
+    """Time-limited leases used to elect one scheduler leader across processes"""
+    def __init__(self):
+        super().__init__('scheduler_leases')
+
+    def try_acquire(self, name, owner, ttl_seconds):
+        """Take or renew the lease; True if `owner` holds it afterwards."""
+        now = time.time()
+        conn = self.db_mgr.get_connection()
+        try:
+            conn.execute(f"INSERT OR IGNORE INTO {self.table} (name, owner, expires_at, acquired_at) VALUES (?, ?, 0, NULL)",
+                         (name, owner))
+            cursor = conn.execute(f"""UPDATE {self.table}
+                                      SET acquired_at = CASE WHEN owner = ? THEN acquired_at ELSE ? END,
+                                          owner = ?, expires_at = ?
+                                      WHERE name = ? AND (owner = ? OR expires_at < ?)""",
+                                  (owner, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), owner, now + ttl_seconds,
+                                   name, owner, now))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def release(self, name, owner):
+        conn = self.db_mgr.get_connection()
+        conn.execute(f"UPDATE {self.table} SET expires_at = 0 WHERE name = ? AND owner = ?", (name, owner))
+        conn.commit()
+        conn.close()
+
+    def get(self, name):
+        conn = self.db_mgr.get_connection()
+        row = conn.execute(f"SELECT * FROM {self.table} WHERE name = ?", (name,)).fetchone()
+        conn.close()
+        return self._dict_from_row(row)
+
+
+class BackupJobModel(SQLiteModel):
+    """Background backup jobs; the backup lease in scheduler_leases is held by the running job's id"""
+    def __init__(self):
+        super().__init__('backup_jobs')
+
+    def create(self, job_id, kind, snapshot, requested_by=None):
+        conn = self.db_mgr.get_connection()
+        try:
+            conn.execute(f"INSERT INTO {self.table} (id, kind, snapshot, status, progress, requested_by, started_at) VALUES (?, ?, ?, 'queued', 0, ?, ?)",
+                         (job_id, kind, 1 if snapshot else 0, requested_by, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        conn = self.db_mgr.get_connection()
+        row = conn.execute(f"SELECT * FROM {self.table} WHERE id = ?", (job_id,)).fetchone()
+        conn.close()
+        return self._dict_from_row(row)
+
+    def update(self, job_id, **fields):
+        if fields.get('status') in ('complete', 'failed'):
+            fields['finished_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        columns = ', '.join(f"{column} = ?" for column in fields)
+        conn = self.db_mgr.get_connection()
+        conn.execute(f"UPDATE {self.table} SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+        conn.close()
+
+
+class JobRunModel(SQLiteModel):
+    """History of scheduled job executions"""
+    def __init__(self):
+        super().__init__('job_runs')
+
+    def start(self, job, owner, trigger='schedule'):
+        conn = self.db_mgr.get_connection()
+        try:
+            cursor = conn.execute(f"INSERT INTO {self.table} (job, owner, trigger, status, started_at) VALUES (?, ?, ?, 'running', ?)",
+                                  (job, owner, trigger, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def finish(self, run_id, status, duration_ms, result=None, error=None):
+        conn = self.db_mgr.get_connection()
+        conn.execute(f"UPDATE {self.table} SET status = ?, finished_at = ?, duration_ms = ?, result = ?, error = ? WHERE id = ?",
+                     (status, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), duration_ms, result, error, run_id))
+        conn.commit()
+        conn.close()
+
+    def get_last_runs(self):
+        """Latest run of every job, keyed by job name."""
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"""SELECT r.* FROM {self.table} r
+                                JOIN (SELECT job, MAX(id) AS id FROM {self.table} GROUP BY job) last ON last.id = r.id""").fetchall()
+        conn.close()
+        return {r['job']: self._dict_from_row(r) for r in rows}
+
+    def get_recent(self, limit=50):
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"SELECT * FROM {self.table} ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        conn.close()
+        return [self._dict_from_row(r) for r in rows]
+
+    def purge(self, older_than):
+        conn = self.db_mgr.get_connection()
+        cursor = conn.execute(f"DELETE FROM {self.table} WHERE started_at < ? AND status != 'running'", (older_than,))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount
+
+
+class AnalyticsRollupModel(SQLiteModel):
+    """Per-day analytics counters rolled up from the security audit log"""
+    def __init__(self):
+        super().__init__('analytics_daily')
+
+    def get_rolled_days(self):
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"SELECT DISTINCT day FROM {self.table}").fetchall()
+        conn.close()
+        return {r['day'] for r in rows}
+
+    def save_day(self, day, counters):
+        """Replace one day's counters. counters: {metric: {key: count}}"""
+        conn = self.db_mgr.get_connection()
+        try:
+            conn.execute(f"DELETE FROM {self.table} WHERE day = ?", (day,))
+            conn.executemany(f"INSERT INTO {self.table} (day, metric, key, count) VALUES (?, ?, ?, ?)",
+                             [(day, metric, key, count) for metric, keys in counters.items() for key, count in keys.items()])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_counters(self, before_day=None):
+        """Summed counters {metric: Counter} over all days (or days before `before_day`)."""
+        from collections import Counter
+        query = f"SELECT metric, key, SUM(count) AS total FROM {self.table}"
+        params = ()
+        if before_day:
+            query += " WHERE day < ?"
+            params = (before_day,)
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(query + " GROUP BY metric, key", params).fetchall()
+        conn.close()
+        counters = {}
+        for r in rows:
+            counters.setdefault(r['metric'], Counter())[r['key']] = r['total']
+        return counters
+
+
+class WorkerLocationModel(SQLiteModel):
+    """
+    Grid index over worker locations for nearest-worker searches.
+    Rows mirror the location settings in users and are kept in sync by
+    UserModel.update/delete; a search only reads the grid cells covering
+    the bounding box of the search radius.
+    """
+    CELL_DEGREES = 0.1  # ~11km cells
+    SOURCE_COLUMNS = {'role', 'latitude', 'longitude', 'specialization', 'gps_active',
+                      'available_for_inspection', 'max_inspection_distance'}
+
+    def __init__(self):
+        super().__init__('worker_locations')
+
+    @classmethod
+    def cell(cls, value):
+        return int(math.floor(float(value) / cls.CELL_DEGREES))
+
+    @classmethod
+    def _row_for(cls, user):
+        """worker_locations row for a user, or None if they cannot be located."""
+        if user['role'] != 'worker' or user['latitude'] is None or user['longitude'] is None:
+            return None
+        try:
+            lat, lon = float(user['latitude']), float(user['longitude'])
+        except (TypeError, ValueError):
+            return None
+        max_distance = user['max_inspection_distance']
+        return (user['username'], lat, lon, cls.cell(lat), cls.cell(lon), user['specialization'],
+                1 if user['gps_active'] else 0, 1 if user['available_for_inspection'] else 0,
+                float(max_distance) if max_distance is not None else 50.0,
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    @classmethod
+    def sync(cls, conn, username):
+        """Refresh one worker's row from users inside the caller's transaction."""
+        user = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        row = cls._row_for(user) if user else None
+        if row:
+            conn.execute("INSERT OR REPLACE INTO worker_locations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+        else:
+            conn.execute("DELETE FROM worker_locations WHERE username = ?", (username,))
+
+    @classmethod
+    def rebuild(cls, conn):
+        """Rebuild the whole index from users (first run after upgrading)."""
+        users = conn.execute("SELECT * FROM users WHERE role = 'worker' AND latitude IS NOT NULL").fetchall()
+        rows = [row for row in map(cls._row_for, users) if row]
+        conn.execute("DELETE FROM worker_locations")
+        conn.executemany("INSERT INTO worker_locations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        return len(rows)
+
+    def get_available(self):
+        """Every GPS-active, available worker (input of bulk dispatch planning)."""
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(f"SELECT * FROM {self.table} WHERE gps_active = 1 AND available = 1").fetchall()
+        conn.close()
+        return [self._dict_from_row(r) for r in rows]
+
+    def find_in_box(self, min_lat, max_lat, min_lon, max_lon, specialization=None):
+        """Available, GPS-active workers inside a lat/lon box (candidates for an exact distance check)."""
+        query = f"""SELECT * FROM {self.table}
+                    WHERE cell_lat BETWEEN ? AND ? AND cell_lon BETWEEN ? AND ?
+                    AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?
+                    AND gps_active = 1 AND available = 1"""
+        params = [self.cell(min_lat), self.cell(max_lat), self.cell(min_lon), self.cell(max_lon),
+                  min_lat, max_lat, min_lon, max_lon]
+        if specialization:
+            query += " AND specialization = ?"
+            params.append(specialization)
+        conn = self.db_mgr.get_connection()
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+        return [self._dict_from_row(r) for r in rows]
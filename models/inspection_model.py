@@ -1,14 +1,17 @@
 """
 Inspection Request Model - handles inspection requests
 """
-# from tinydb import Query - Removed for SQLite migration
-class Query:
-    pass
-
+import json
 from datetime import datetime, timedelta
 from .database import Database
+from .query import Query
 import math
 
+KM_PER_DEGREE = 111.32  # Length of one degree of latitude
+EARTH_RADIUS_KM = 6371
+OPEN_STATUSES = ('new_request',)
+JSON_FIELDS = ('images', 'inspection_report', 'rejected_workers')
+
 
 class InspectionRequestModel:
     """Inspection Request Model - handles inspection request operations"""
@@ -17,7 +20,32 @@ class InspectionRequestModel:
         self.db = Database()
         self.table = self.db.table('inspection_requests')
         self.query = Query()
-    
+
+    def _encode(self, data):
+        """Serialize the JSON columns of a row about to be written"""
+        data = dict(data)
+        for field in JSON_FIELDS:
+            if data.get(field) is not None:
+                data[field] = json.dumps(data[field], ensure_ascii=False)
+        return data
+
+    def _decode(self, row):
+        if row is None:
+            return None
+        for field in JSON_FIELDS:
+            if isinstance(row.get(field), str):
+                try:
+                    row[field] = json.loads(row[field])
+                except ValueError:
+                    row[field] = None
+        return row
+
+    def _search(self, query=None):
+        """Matching requests (indexed lookups), newest first"""
+        return [self._decode(r) for r in self.table.search(query, order_by='-created_at')]
+
+    def _update(self, request_id, data):
+        self.table.update(self._encode(data), doc_ids=[request_id])
     
     def create_request(self, user_id, user_location, service_type, description='', images=None):
         """Create a new inspection request"""
@@ -39,44 +67,44 @@ class InspectionRequestModel:
             'response_deadline': (datetime.now() + timedelta(minutes=10)).strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        doc_id = self.table.insert(request_data)
+        doc_id = self.table.insert(self._encode(request_data))
         return {'success': True, 'request_id': doc_id, 'data': request_data}
     
     def get_request_by_id(self, request_id):
         """Get request by ID"""
-        return self.table.get(doc_id=request_id)
+        return self._decode(self.table.get(doc_id=request_id))
     
     def update_status(self, request_id, status, extra_data=None):
         """Update request status and optional extra data"""
         data = {'status': status}
         if extra_data:
             data.update(extra_data)
-        self.table.update(data, doc_ids=[request_id])
+        self._update(request_id, data)
     
     def assign_worker(self, request_id, worker_id):
         """Assign a worker to a request"""
-        self.table.update({
+        self._update(request_id, {
             'assigned_worker': worker_id,
             'status': 'assigned_to_worker',
             'inspection_by': 'worker',
             'assigned_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, doc_ids=[request_id])
+        })
 
     def assign_admin_visit(self, request_id):
         """Assign admin for visit"""
-        self.table.update({
+        self._update(request_id, {
             'status': 'admin_visit',
             'inspection_by': 'admin',
             'assigned_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, doc_ids=[request_id])
+        })
     
     def accept_request(self, request_id, worker_id):
         """Worker accepts the request"""
-        self.table.update({
+        self._update(request_id, {
             'status': 'accepted',
             'assigned_worker': worker_id,
             'accepted_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, doc_ids=[request_id])
+        })
         return {'success': True, 'message': 'تم قبول طلب المعاينة'}
     
     def reject_request(self, request_id, worker_id, reason=''):
@@ -87,16 +115,16 @@ class InspectionRequestModel:
             return {'success': False, 'message': 'الطلب غير موجود'}
         
         # Add to rejected workers list
-        rejected_workers = request.get('rejected_workers', [])
+        rejected_workers = request.get('rejected_workers') or []
         rejected_workers.append({
             'worker_id': worker_id,
             'reason': reason,
             'rejected_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         })
         
-        self.table.update({
+        self._update(request_id, {
             'rejected_workers': rejected_workers
-        }, doc_ids=[request_id])
+        })
         
         return {'success': True, 'message': 'تم رفض الطلب'}
     
@@ -105,31 +133,31 @@ class InspectionRequestModel:
         if not reason:
             reason = "تم الرفض لاسباب خاصة"
         
-        self.table.update({
+        self._update(request_id, {
             'status': 'rejected',
             'admin_rejection_reason': reason,
             'rejected_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, doc_ids=[request_id])
+        })
         
         return {'success': True, 'message': 'تم رفض طلب المعاينة'}
     
     def complete_request(self, request_id):
         """Mark request as completed"""
-        self.table.update({
+        self._update(request_id, {
             'status': 'completed',
             'completed_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, doc_ids=[request_id])
+        })
     
     def cancel_request(self, request_id):
         """Cancel a request"""
-        self.table.update({
+        self._update(request_id, {
             'status': 'cancelled',
             'cancelled_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, doc_ids=[request_id])
+        })
 
     def submit_report(self, request_id, report_data):
         """Submit inspection report"""
-        self.table.update({
+        self._update(request_id, {
             'status': 'inspection_done',
             'inspection_report': {
                 'photos': report_data.get('photos', []),
@@ -139,27 +167,27 @@ class InspectionRequestModel:
                 'job_size': report_data.get('job_size'),
                 'submitted_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
-        }, doc_ids=[request_id])
+        })
         return {'success': True, 'message': 'تم حفظ تقرير المعاينة'}
 
     def approve_report(self, request_id):
         """Admin approves the report and reveals worker"""
-        self.table.update({
+        self._update(request_id, {
             'status': 'approved_for_user',
             'approved_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, doc_ids=[request_id])
+        })
     
     def get_user_requests(self, user_id):
         """Get all requests for a user"""
-        return self.table.search(self.query.user_id == user_id)
+        return self._search(self.query.user_id == user_id)
     
     def get_worker_requests(self, worker_id):
         """Get all requests assigned to a worker"""
-        return self.table.search(self.query.assigned_worker == worker_id)
+        return self._search(self.query.assigned_worker == worker_id)
     
     def get_pending_requests(self):
-        """Get all pending requests"""
-        return self.table.search(self.query.status == 'pending')
+        """Get all requests still waiting for a worker"""
+        return self._search(self.query.status.one_of(OPEN_STATUSES))
     
     def calculate_distance(self, lat1, lon1, lat2, lon2):
         """Calculate distance between two points using Haversine formula"""
@@ -181,53 +209,136 @@ class InspectionRequestModel:
     
     def find_nearest_workers(self, user_lat, user_lon, service_type, max_distance=50, limit=3):
         """Find nearest available workers"""
-        from .database import UserModel
-        user_model = UserModel()
-        
-        # Get all workers
-        all_users = user_model.get_all()
-        workers = [u for u in all_users if u.get('role') == 'worker']
-        
-        # Filter workers
+        from .database import UserModel, WorkerLocationModel
+        user_lat, user_lon = float(user_lat), float(user_lon)
+
+        # Bounding box of the search radius; the grid index prunes everything outside it
+        lat_delta = max_distance / KM_PER_DEGREE
+        lon_delta = max_distance / (KM_PER_DEGREE * max(math.cos(math.radians(user_lat)), 0.01))
+        candidates = WorkerLocationModel().find_in_box(
+            user_lat - lat_delta, user_lat + lat_delta,
+            user_lon - lon_delta, user_lon + lon_delta,
+            specialization=service_type or None
+        )
+
+        # Exact distance only for the workers inside the box
         available_workers = []
-        for worker in workers:
-            # Check if worker has GPS enabled and location data
-            if not worker.get('gps_active', False):
-                continue
-            
-            if not worker.get('latitude') or not worker.get('longitude'):
-                continue
-            
-            # Check if worker is available
-            if not worker.get('available_for_inspection', True):
-                continue
-            
-            # Check service type match (if specified)
-            if service_type and worker.get('specialization') != service_type:
-                continue
-            
-            # Calculate distance
-            distance = self.calculate_distance(
-                user_lat, user_lon,
-                float(worker['latitude']), float(worker['longitude'])
-            )
-            
+        for candidate in candidates:
+            distance = self.calculate_distance(user_lat, user_lon, candidate['latitude'], candidate['longitude'])
+
             # Check max distance preference
-            worker_max_distance = worker.get('max_inspection_distance', 50)
-            if distance > worker_max_distance or distance > max_distance:
+            if distance > candidate['max_distance'] or distance > max_distance:
                 continue
-            
-            available_workers.append({
-                'worker': worker,
-                'distance': distance
-            })
-        
+            available_workers.append({'username': candidate['username'], 'distance': distance})
+
         # Sort by distance
         available_workers.sort(key=lambda x: x['distance'])
-        
-        # Return top N workers
-        return available_workers[:limit]
+        nearest = available_workers[:limit]
+
+        # Load full profiles for the top N workers only
+        users = UserModel().get_many([w['username'] for w in nearest])
+        return [{'worker': users[w['username']], 'distance': w['distance']}
+                for w in nearest if w['username'] in users]
     
+    def plan_dispatch(self, requests=None, limit=3, max_distance=50, assignment=None):
+        """
+        Rank the nearest workers for many open requests at once.
+        Distances for every request x worker pair are computed as one NumPy
+        matrix; the specialization, rejection and max-distance rules are
+        applied as masks over it.
+
+        assignment: None, 'greedy' (closest pairs first) or 'hungarian'
+        (least total distance; uses SciPy when installed, greedy otherwise).
+        Returns {'candidates': {request_id: [{'username', 'distance'}]},
+                 'assignment': {request_id: {'username', 'distance'}} or None}
+        """
+        import numpy as np
+        from .database import WorkerLocationModel
+
+        if requests is None:
+            requests = self.get_pending_requests()
+        requests = [r for r in requests if r.get('user_latitude') is not None and r.get('user_longitude') is not None]
+        workers = WorkerLocationModel().get_available()
+        plan = {'candidates': {r['id']: [] for r in requests}, 'assignment': {} if assignment else None}
+        if not requests or not workers:
+            return plan
+
+        # Haversine for the whole matrix (same formula and rounding as calculate_distance)
+        req_lat = np.radians([float(r['user_latitude']) for r in requests])[:, None]
+        req_lon = np.radians([float(r['user_longitude']) for r in requests])[:, None]
+        worker_lat = np.radians([w['latitude'] for w in workers])[None, :]
+        worker_lon = np.radians([w['longitude'] for w in workers])[None, :]
+        a = np.sin((worker_lat - req_lat) / 2) ** 2 + \
+            np.cos(req_lat) * np.cos(worker_lat) * np.sin((worker_lon - req_lon) / 2) ** 2
+        distances = np.round(2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a)), 2)
+
+        # Specialization as integer codes; a request without a service type accepts anyone
+        codes = {}
+        worker_spec = np.array([codes.setdefault(w['specialization'], len(codes)) for w in workers])
+        req_spec = np.array([codes.setdefault(r['service_type'], len(codes)) if r.get('service_type') else -1
+                             for r in requests])
+        valid = (req_spec[:, None] == -1) | (req_spec[:, None] == worker_spec[None, :])
+
+        # Both the search radius and each worker's own preference
+        worker_max = np.minimum([w['max_distance'] for w in workers], max_distance)
+        valid &= distances <= worker_max[None, :]
+
+        # Workers who already turned a request down are not offered it again
+        column = {w['username']: j for j, w in enumerate(workers)}
+        for i, req in enumerate(requests):
+            for rejection in req.get('rejected_workers') or []:
+                j = column.get(rejection.get('worker_id'))
+                if j is not None:
+                    valid[i, j] = False
+
+        cost = np.where(valid, distances, np.inf)
+        k = min(max(int(limit), 1), len(workers))
+        nearest = np.argpartition(cost, k - 1, axis=1)[:, :k]
+        nearest = np.take_along_axis(nearest, np.argsort(np.take_along_axis(cost, nearest, axis=1), axis=1), axis=1)
+        for i, req in enumerate(requests):
+            plan['candidates'][req['id']] = [{'username': workers[j]['username'], 'distance': float(distances[i, j])}
+                                             for j in nearest[i] if valid[i, j]]
+
+        if assignment:
+            for i, j in self._assign(cost, valid, assignment):
+                plan['assignment'][requests[i]['id']] = {'username': workers[j]['username'],
+                                                         'distance': float(distances[i, j])}
+        return plan
+
+    @staticmethod
+    def _assign(cost, valid, method):
+        """One worker per request and one request per worker; returns (row, column) pairs."""
+        import numpy as np
+        if method not in ('greedy', 'hungarian'):
+            raise ValueError(f"Unknown assignment method: {method}")
+
+        if method == 'hungarian':
+            try:
+                from scipy.optimize import linear_sum_assignment
+            except ImportError:
+                linear_sum_assignment = None
+            if linear_sum_assignment is not None:
+                # Forbidden pairs cost more than any full valid assignment, so they are only used as filler
+                penalty = (float(cost[valid].sum()) if valid.any() else 0.0) + 1.0
+                rows, cols = linear_sum_assignment(np.where(valid, cost, penalty))
+                return [(i, j) for i, j in zip(rows, cols) if valid[i, j]]
+
+        pairs = []
+        taken_rows, taken_cols = set(), set()
+        for flat in np.argsort(cost, axis=None, kind='stable')[:int(valid.sum())]:
+            i, j = divmod(int(flat), cost.shape[1])
+            if i not in taken_rows and j not in taken_cols:
+                taken_rows.add(i)
+                taken_cols.add(j)
+                pairs.append((i, j))
+        return pairs
+
     def get_all(self):
         """Get all requests"""
-        return self.table.all()
+        return self._search()
+
+    def count(self):
+        conn = self.db.get_connection()
+        total = conn.execute("SELECT COUNT(*) FROM inspection_requests").fetchone()[0]
+        conn.close()
+        return total
@@ -0,0 +1,120 @@
+"""
+Query Expressions
+A small TinyDB-style query builder for the SQLite models:
+
+    Query().worker_id == 'ali'
+    Query().status.one_of(['new_request', 'accepted']) & (Query().created_at >= '2025-01-01')
+
+Expressions compile to a parameterized WHERE clause, so lookups run as
+indexed SQL queries instead of loading the whole table.
+"""
+import re
+
+IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def check_identifier(name):
+    """Column names are interpolated into SQL, so only plain identifiers are allowed"""
+    if not isinstance(name, str) or not IDENTIFIER_RE.match(name):
+        raise ValueError(f"Invalid column name: {name!r}")
+    return name
+
+
+class QueryExpression:
+    """A compiled condition; combine with & (AND), | (OR) and ~ (NOT)"""
+
+    def __init__(self, sql, params=()):
+        self.sql = sql
+        self.params = tuple(params)
+
+    def __and__(self, other):
+        return QueryExpression(f"({self.sql}) AND ({other.sql})", self.params + other.params)
+
+    def __or__(self, other):
+        return QueryExpression(f"({self.sql}) OR ({other.sql})", self.params + other.params)
+
+    def __invert__(self):
+        return QueryExpression(f"NOT ({self.sql})", self.params)
+
+    def compile(self):
+        return self.sql, list(self.params)
+
+    def __repr__(self):
+        return f"QueryExpression({self.sql!r}, {self.params!r})"
+
+    @classmethod
+    def from_dict(cls, conditions):
+        """{col: value} equality conditions joined with AND (the older search() form)"""
+        expression = None
+        for column, value in conditions.items():
+            term = Field(column) == value
+            expression = term if expression is None else expression & term
+        return expression
+
+
+class Field:
+    def __init__(self, name):
+        self.name = check_identifier(name)
+
+    def _compare(self, operator, value):
+        return QueryExpression(f"{self.name} {operator} ?", (value,))
+
+    def __eq__(self, value):
+        if value is None:
+            return QueryExpression(f"{self.name} IS NULL")
+        return self._compare('=', value)
+
+    def __ne__(self, value):
+        if value is None:
+            return QueryExpression(f"{self.name} IS NOT NULL")
+        return self._compare('!=', value)
+
+    def __lt__(self, value):
+        return self._compare('<', value)
+
+    def __le__(self, value):
+        return self._compare('<=', value)
+
+    def __gt__(self, value):
+        return self._compare('>', value)
+
+    def __ge__(self, value):
+        return self._compare('>=', value)
+
+    __hash__ = None
+
+    def one_of(self, values):
+        values = list(values)
+        if not values:
+            return QueryExpression("0")
+        placeholders = ', '.join(['?'] * len(values))
+        return QueryExpression(f"{self.name} IN ({placeholders})", values)
+
+    def between(self, low, high):
+        """Inclusive range"""
+        return QueryExpression(f"{self.name} BETWEEN ? AND ?", (low, high))
+
+
+class Query:
+    """Entry point: Query().column (or Query()['column']) gives a field to compare"""
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Field(name)
+
+    def __getitem__(self, name):
+        return Field(name)
+
+
+def compile_order_by(order_by):
+    """'created_at' / '-created_at' (descending) or a list of them -> ORDER BY clause"""
+    if not order_by:
+        return ''
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    terms = []
+    for term in order_by:
+        descending = term.startswith('-')
+        terms.append(f"{check_identifier(term.lstrip('-'))} {'DESC' if descending else 'ASC'}")
+    return ' ORDER BY ' + ', '.join(terms)
@@ -1,12 +1,12 @@
 """
 Rating Model - handles worker ratings
 """
-# from tinydb import Query - Removed for SQLite migration
-class Query:
-    pass
-
+import sqlite3
 from datetime import datetime
 from .database import Database
+from .query import Query
+
+STARS = range(1, 6)
 
 
 class RatingModel:
@@ -17,17 +17,39 @@ class RatingModel:
         self.table = self.db.ratings
         self.query = Query()
     
+    def _insert_rating(self, rating_data):
+        """
+        Insert a rating and fold it into worker_rating_stats in one transaction.
+        False if this user already rated this worker (UNIQUE user_id, worker_id).
+        """
+        quality, behavior = rating_data['quality_rating'], rating_data['behavior_rating']
+        histogram = [int(quality == n) for n in STARS] + [int(behavior == n) for n in STARS]
+        columns = [f"{field}_{n}" for field in ('quality', 'behavior') for n in STARS]
+        conn = self.db.get_connection()
+        try:
+            conn.execute("INSERT INTO ratings (user_id, worker_id, quality_rating, behavior_rating, comment, created_at) "
+                         "VALUES (:user_id, :worker_id, :quality_rating, :behavior_rating, :comment, :created_at)",
+                         rating_data)
+            conn.execute(f"""INSERT INTO worker_rating_stats (worker_id, rating_count, quality_sum, behavior_sum,
+                                                              {', '.join(columns)}, updated_at)
+                             VALUES (?, 1, ?, ?, {', '.join(['?'] * len(columns))}, ?)
+                             ON CONFLICT (worker_id) DO UPDATE SET
+                                 rating_count = rating_count + 1,
+                                 quality_sum = quality_sum + excluded.quality_sum,
+                                 behavior_sum = behavior_sum + excluded.behavior_sum,
+                                 {', '.join(f"{c} = {c} + excluded.{c}" for c in columns)},
+                                 updated_at = excluded.updated_at""",
+                         [rating_data['worker_id'], quality, behavior, *histogram, rating_data['created_at']])
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+
     def add_rating(self, user_id, worker_id, quality_rating, behavior_rating, comment=""):
         """Add a new rating"""
-        # Check if user already rated this worker
-        existing = self.table.search({
-            'user_id': user_id,
-            'worker_id': worker_id
-        })
-        
-        if existing:
-            return {'success': False, 'message': 'لقد قمت بتقييم هذا الصنايعي من قبل'}
-        
         rating_data = {
             'user_id': user_id,
             'worker_id': worker_id,
@@ -37,56 +59,51 @@ class RatingModel:
             'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        self.table.insert(rating_data)
+        if not self._insert_rating(rating_data):
+            return {'success': False, 'message': 'لقد قمت بتقييم هذا الصنايعي من قبل'}
         return {'success': True, 'message': 'تم إضافة التقييم بنجاح'}
     
-    def get_worker_ratings(self, worker_id):
-        """Get all ratings for a specific worker"""
-        return self.table.search(self.query.worker_id == worker_id)
+    def get_worker_ratings(self, worker_id, limit=None):
+        """Get ratings for a specific worker, newest first"""
+        return self.table.search(self.query.worker_id == worker_id, order_by='-created_at', limit=limit)
     
     def get_worker_stats(self, worker_id):
-        """Get rating statistics for a worker"""
-        ratings = self.get_worker_ratings(worker_id)
+        """Get rating statistics for a worker (one row read from worker_rating_stats)"""
+        conn = self.db.get_connection()
+        row = conn.execute("SELECT * FROM worker_rating_stats WHERE worker_id = ?", (worker_id,)).fetchone()
+        conn.close()
         
-        if not ratings:
+        if not row or not row['rating_count']:
             return {
                 'avg_quality': 0,
                 'avg_behavior': 0,
-                'total_ratings': 0
+                'total_ratings': 0,
+                'histogram': {'quality': {n: 0 for n in STARS}, 'behavior': {n: 0 for n in STARS}}
             }
         
-        total_quality = sum([r['quality_rating'] for r in ratings])
-        total_behavior = sum([r['behavior_rating'] for r in ratings])
-        count = len(ratings)
-        
+        count = row['rating_count']
         return {
-            'avg_quality': round(total_quality / count, 1),
-            'avg_behavior': round(total_behavior / count, 1),
-            'total_ratings': count
+            'avg_quality': round(row['quality_sum'] / count, 1),
+            'avg_behavior': round(row['behavior_sum'] / count, 1),
+            'total_ratings': count,
+            'histogram': {
+                'quality': {n: row[f'quality_{n}'] for n in STARS},
+                'behavior': {n: row[f'behavior_{n}'] for n in STARS}
+            }
         }
     
     def user_has_rated(self, user_id, worker_id):
         """Check if user has already rated this worker"""
-        result = self.table.search({
-            'user_id': user_id,
-            'worker_id': worker_id
-        })
+        result = self.table.search((self.query.user_id == user_id) & (self.query.worker_id == worker_id), limit=1)
         return len(result) > 0
     
     def get_user_project_rating(self, user_id):
         """Get project rating by a specific user"""
-        result = self.table.search({
-            'user_id': user_id,
-            'worker_id': 'PROJECT'
-        })
+        result = self.table.search((self.query.user_id == user_id) & (self.query.worker_id == 'PROJECT'), limit=1)
         return result[0] if result else None
 
     def add_project_rating(self, user_id, rating, comment=""):
         """Add a rating for the project itself"""
-        # Check if already rated
-        if self.get_user_project_rating(user_id):
-            return {'success': False, 'message': 'لقد قمت بتقييم المشروع بالفعل'}
-            
         rating_data = {
             'user_id': user_id,
             'worker_id': 'PROJECT',
@@ -96,7 +113,8 @@ class RatingModel:
             'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        self.table.insert(rating_data)
+        if not self._insert_rating(rating_data):
+            return {'success': False, 'message': 'لقد قمت بتقييم المشروع بالفعل'}
         return {'success': True, 'message': 'تم إضافة تقييمك للمشروع بنجاح'}
     
     def get_all(self):
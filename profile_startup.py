@@ -0,0 +1,92 @@
+"""
+Startup Profiler
+Imports the app in a fresh interpreter (as a gunicorn worker would) with
+`python -X importtime` and reports where boot time goes: the slowest modules,
+the cost per top-level package and the cost of each of our own modules.
+
+    python profile_startup.py                # table, best of 3 boots
+    python profile_startup.py --top 40 --runs 5
+    python profile_startup.py --json > startup.json
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+PROJECT_PACKAGES = ('app', 'config', 'controllers', 'models', 'services', 'utils', 'websockets')
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+BOOT_SCRIPT = ("import time; started = time.perf_counter(); import app; "
+               "print('BOOT', time.perf_counter() - started)")
+
+
+def run_once():
+    """One boot in a child process -> (wall seconds, [(module, self_us, cumulative_us, depth)])"""
+    env = dict(os.environ, SCHEDULER_ENABLED='0', PYTHONDONTWRITEBYTECODE='')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+                            capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"App import failed:\n{result.stderr[-2000:]}")
+    boot = float(next(line.split()[1] for line in result.stdout.splitlines() if line.startswith('BOOT ')))
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return boot, modules
+
+
+def profile(runs=3):
+    """Best (fastest) of `runs` boots, so one-off disk or bytecode-compile noise is dropped"""
+    return min((run_once() for _ in range(runs)), key=lambda result: result[0])
+
+
+def summarize(boot, modules, top=25):
+    packages = defaultdict(lambda: {'self_ms': 0.0, 'modules': 0})
+    for name, self_us, _, _ in modules:
+        package = packages[name.split('.')[0]]
+        package['self_ms'] += self_us / 1000
+        package['modules'] += 1
+    slowest = sorted(modules, key=lambda m: m[1], reverse=True)[:top]
+    own = [m for m in modules if m[0].split('.')[0] in PROJECT_PACKAGES]
+    return {
+        'boot_ms': round(boot * 1000, 1),
+        'modules': len(modules),
+        'slowest_modules': [{'module': name, 'self_ms': round(s / 1000, 2), 'cumulative_ms': round(c / 1000, 2)}
+                            for name, s, c, _ in slowest],
+        'packages': sorted(({'package': name, 'self_ms': round(p['self_ms'], 2), 'modules': p['modules']}
+                            for name, p in packages.items()), key=lambda p: p['self_ms'], reverse=True)[:top],
+        'project_modules': sorted(({'module': name, 'self_ms': round(s / 1000, 2), 'cumulative_ms': round(c / 1000, 2)}
+                                   for name, s, c, _ in own), key=lambda m: m['cumulative_ms'], reverse=True),
+    }
+
+
+def print_report(report):
+    print(f"App boot: {report['boot_ms']} ms ({report['modules']} modules imported)\n")
+    print("Slowest modules (own import time, excluding children):")
+    for row in report['slowest_modules']:
+        print(f"  {row['self_ms']:8.2f} ms  {row['cumulative_ms']:8.2f} ms total  {row['module']}")
+    print("\nBy top-level package:")
+    for row in report['packages']:
+        print(f"  {row['self_ms']:8.2f} ms  {row['modules']:4d} modules  {row['package']}")
+    print("\nProject modules (including what they import; module-level work such as DB setup counts here):")
+    for row in report['project_modules']:
+        print(f"  {row['cumulative_ms']:8.2f} ms  {row['module']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-module import cost of the app at worker boot')
+    parser.add_argument('--runs', type=int, default=3, help='boots to run; the fastest is reported')
+    parser.add_argument('--top', type=int, default=25, help='rows in the module and package tables')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = summarize(*profile(args.runs), top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
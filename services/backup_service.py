@@ -0,0 +1,256 @@
+"""
+Backup Service
+Consistent, non-blocking database backups: the live database is copied with
+the sqlite3 online backup API in small steps on a background thread, the
+copy is verified with PRAGMA integrity_check and then either compressed into
+a single downloadable file or added to the incremental snapshot store.
+"""
+import os
+import gzip
+import uuid
+import shutil
+import time
+import sqlite3
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from models import Database, SecurityLogModel, SchedulerLeaseModel, BackupJobModel
+from services.snapshot_store import snapshot_store
+
+try:
+    import zstandard
+except ImportError:  # Optional: gzip is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BACKUP_EXTENSIONS = ('.sqlite', '.sqlite.gz', '.sqlite.zst')
+COPY_BLOCK = 1024 * 1024
+BACKUP_LEASE = 'backup'  # Held by the id of the running job
+PROGRESS_STEP = 0.02  # Progress file is rewritten in steps of 2%
+
+
+class BackupService:
+    """
+    Service class for database backups.
+    Jobs run on a background thread. Their status lives in the
+    `backup_jobs` table so a status poll can land on any worker, and only
+    one job runs at a time across processes: starting one takes a lease
+    (scheduler_leases) owned by the job's id.
+
+    Both are written only when a job starts and finishes. The online backup
+    restarts whenever another connection writes to the database, so the
+    copied fraction goes to a small file next to the backups instead.
+    """
+
+    def __init__(self, backup_dir=None, db_path=None):
+        self.backup_dir = backup_dir or Config.BACKUP_DIR
+        self.db_path = db_path or Database.DB_NAME
+        self.pages_per_step = Config.BACKUP_PAGES_PER_STEP
+        self.step_sleep = Config.BACKUP_STEP_SLEEP
+        self.security_log_model = SecurityLogModel()
+        self.lease_model = SchedulerLeaseModel()
+        self.job_model = BackupJobModel()
+        self._executor = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked child has none of the parent's threads
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='backup-worker')
+        return self._executor
+
+    @property
+    def compression(self):
+        if Config.BACKUP_COMPRESSION == 'zstd' and zstandard is not None:
+            return 'zstd'
+        return 'gzip'
+
+    def start_backup(self, kind='manual', requested_by=None, snapshot=False):
+        """Queue a backup (a full file, or an incremental snapshot) and return its job id immediately."""
+        job_id, claimed = self._claim(kind, requested_by, snapshot)
+        if claimed:
+            self.executor.submit(self._run_job, job_id, kind, requested_by, snapshot)
+        return job_id
+
+    def run_exclusive(self, kind='auto', snapshot=True):
+        """Run a backup job synchronously (scheduled jobs, backup_manager.py); raises if another backup is running."""
+        job_id, claimed = self._claim(kind, None, snapshot)
+        if not claimed:
+            raise RuntimeError(f"Backup job {job_id} is already running")
+        return self._run_job(job_id, kind, None, snapshot, raise_errors=True)
+
+    def _claim(self, kind, requested_by, snapshot):
+        """(job_id, True) for a new job holding the backup lease, or (running job's id, False)"""
+        job_id = uuid.uuid4().hex[:12]
+        if self.lease_model.try_acquire(BACKUP_LEASE, job_id, Config.BACKUP_LOCK_SECONDS):
+            self.job_model.create(job_id, kind, snapshot, requested_by)
+            return job_id, True
+        return self._running_job_id(), False
+
+    def _running_job_id(self):
+        lease = self.lease_model.get(BACKUP_LEASE)
+        return lease['owner'] if lease and lease['expires_at'] > time.time() else None
+
+    def is_running(self):
+        return self._running_job_id() is not None
+
+    def get_job(self, job_id):
+        job = self.job_model.get(job_id)
+        if job and job['status'] in ('queued', 'running'):
+            if self._running_job_id() != job_id:
+                # Its worker died (or the lease expired) before the job finished
+                job.update(status='failed', error='interrupted')
+            else:
+                job['progress'] = self._read_progress(job_id)
+        if job:
+            job['snapshot'] = bool(job['snapshot'])
+        return job
+
+    def _progress_path(self, job_id):
+        return os.path.join(self.backup_dir, '.progress', job_id)
+
+    def _write_progress(self, job_id, done):
+        path = self._progress_path(job_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            f.write(f"{done:.3f}")
+        os.replace(path + '.tmp', path)
+
+    def _read_progress(self, job_id):
+        try:
+            with open(self._progress_path(job_id)) as f:
+                return float(f.read() or 0)
+        except (OSError, ValueError):
+            return 0.0
+
+    def _run_job(self, job_id, kind, requested_by, snapshot, raise_errors=False):
+        self.job_model.update(job_id, status='running')
+        reported = [0.0]
+
+        def progress(done):
+            if done - reported[0] >= PROGRESS_STEP:
+                reported[0] = done
+                self._write_progress(job_id, done)
+
+        try:
+            if snapshot:
+                result = self.run_snapshot(kind, progress=progress)
+                name = result['id']
+            else:
+                result = self.run_backup(kind, progress=progress)
+                name = os.path.basename(result)
+            self.job_model.update(job_id, status='complete', progress=1.0, file=name)
+            who = f"Admin {requested_by}" if requested_by else "System"
+            self.security_log_model.create(f"{kind.capitalize()} Backup",
+                                           f"{who} created backup {name}",
+                                           severity="low" if requested_by else "info")
+            return result
+        except Exception as e:
+            logger.error(f"Backup failed: {e}")
+            self.job_model.update(job_id, status='failed', error=str(e))
+            if raise_errors:
+                raise
+        finally:
+            self.lease_model.release(BACKUP_LEASE, job_id)
+            if os.path.exists(self._progress_path(job_id)):
+                os.remove(self._progress_path(job_id))
+
+    def run_backup(self, kind='manual', progress=None):
+        """
+        Create a backup synchronously and return its path.
+        progress: optional callable receiving the copied fraction (0..1).
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        snapshot = os.path.join(self.backup_dir, f".{kind}_backup_{timestamp}.sqlite.tmp")
+
+        try:
+            self._online_copy(snapshot, progress)
+            self._verify(snapshot)
+            final = self._compress(snapshot, os.path.join(self.backup_dir, f"{kind}_backup_{timestamp}.sqlite"))
+        finally:
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+        logger.info(f"Backup created: {final}")
+        return final
+
+    def run_snapshot(self, kind='auto', progress=None):
+        """Add an incremental snapshot and apply the retention policy. Returns its manifest."""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        copy = os.path.join(self.backup_dir, f".snapshot_{uuid.uuid4().hex}.sqlite.tmp")
+        try:
+            self._online_copy(copy, progress)
+            self._verify(copy)
+            manifest = snapshot_store.create(copy, kind)
+        finally:
+            if os.path.exists(copy):
+                os.remove(copy)
+        snapshot_store.prune()
+        return manifest
+
+    def _online_copy(self, target, progress=None):
+        """Copy the live database page by page; writers are only blocked for one step."""
+        def on_step(status, remaining, total):
+            if progress and total:
+                progress((total - remaining) / total)
+
+        source = sqlite3.connect(self.db_path)
+        dest = sqlite3.connect(target)
+        try:
+            source.backup(dest, pages=self.pages_per_step, progress=on_step, sleep=self.step_sleep)
+        finally:
+            dest.close()
+            source.close()
+
+    def _verify(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            result = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+        finally:
+            conn.close()
+        if result != ['ok']:
+            raise RuntimeError(f"Integrity check failed: {'; '.join(result[:5])}")
+
+    def _compress(self, source, base_path):
+        if self.compression == 'zstd':
+            target = base_path + '.zst'
+            with open(source, 'rb') as src, open(target + '.tmp', 'wb') as dst:
+                zstandard.ZstdCompressor(level=10, threads=-1).copy_stream(src, dst)
+        else:
+            target = base_path + '.gz'
+            with open(source, 'rb') as src, gzip.open(target + '.tmp', 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, COPY_BLOCK)
+        os.replace(target + '.tmp', target)
+        return target
+
+    def list_backups(self):
+        """Backup files for the admin page, newest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        backups = []
+        for name in os.listdir(self.backup_dir):
+            if not name.endswith(BACKUP_EXTENSIONS):
+                continue
+            stat = os.stat(os.path.join(self.backup_dir, name))
+            backups.append({
+                'name': name,
+                'size': f"{stat.st_size / (1024*1024):.2f} MB",
+                'date': datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+            })
+        backups.sort(key=lambda x: x['date'], reverse=True)
+        return backups
+
+
+backup_service = BackupService()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    backup_service.run_backup()
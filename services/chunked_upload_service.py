@@ -0,0 +1,189 @@
+"""
+Chunked Upload Service
+Resumable uploads for large inspection media: each chunk is checksummed and
+written straight into a staging file inside the upload store, which is then
+adopted as a content-addressed blob once every chunk has arrived.
+"""
+import os
+import re
+import uuid
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from config import Config
+from models import ChunkedUploadModel
+from services.upload_store import upload_store
+
+logger = logging.getLogger(__name__)
+
+STREAM_BLOCK = 64 * 1024
+COMPLETING_TIMEOUT_SECONDS = 600  # A completion that crashed can be retried after this long
+
+
+class ChunkedUploadService:
+    """
+    Service class for resumable uploads.
+    Methods return {'success': bool, 'message': str, ...} like the models do.
+    """
+
+    def __init__(self):
+        self.upload_model = ChunkedUploadModel()
+        self.policies = Config.UPLOAD_POLICIES
+        self.chunk_size = Config.UPLOAD_CHUNK_SIZE
+
+    def _staging_path(self, upload_id):
+        return os.path.join(upload_store.tmp_root, f"{upload_id}.part")
+
+    def start(self, owner, kind, filename, total_size, sha256=None):
+        """Open a new upload session after checking the per-type policy."""
+        policy = self.policies.get(kind)
+        if not policy:
+            return {'success': False, 'message': 'نوع الملف غير مدعوم'}
+        ext = upload_store.extension(filename)
+        if ext not in policy['extensions']:
+            return {'success': False, 'message': 'امتداد الملف غير مسموح'}
+        try:
+            total_size = int(total_size)
+        except (TypeError, ValueError):
+            return {'success': False, 'message': 'حجم الملف غير صحيح'}
+        if total_size <= 0 or total_size > policy['max_bytes']:
+            return {'success': False, 'message': f"الحد الأقصى لهذا النوع {policy['max_bytes'] // (1024 * 1024)} ميجابايت"}
+        if sha256 and not re.fullmatch(r'[0-9a-f]{64}', sha256):
+            return {'success': False, 'message': 'بصمة الملف غير صحيحة'}
+
+        upload_id = uuid.uuid4().hex
+        total_chunks = (total_size + self.chunk_size - 1) // self.chunk_size
+        self.upload_model.create(upload_id, owner, kind, filename, total_size,
+                                 self.chunk_size, total_chunks, sha256)
+
+        # Reserve the full size up front so chunks can land at any offset
+        os.makedirs(upload_store.tmp_root, exist_ok=True)
+        with open(self._staging_path(upload_id), 'wb') as f:
+            f.truncate(total_size)
+
+        return {'success': True, 'upload_id': upload_id,
+                'chunk_size': self.chunk_size, 'total_chunks': total_chunks}
+
+    def get_session(self, upload_id, owner):
+        session = self.upload_model.get(upload_id)
+        if not session or session['owner'] != owner:
+            return None
+        return session
+
+    def status(self, upload_id, owner):
+        session = self.get_session(upload_id, owner)
+        if not session:
+            return {'success': False, 'message': 'جلسة الرفع غير موجودة'}
+        return {'success': True, 'status': session['status'], 'path': session['blob_path'],
+                'total_chunks': session['total_chunks'], 'chunk_size': session['chunk_size'],
+                'received': self.upload_model.get_received(upload_id)}
+
+    def write_chunk(self, upload_id, owner, index, stream, expected_sha256):
+        """Stream one chunk from the request body to its offset, verifying its checksum."""
+        session = self.get_session(upload_id, owner)
+        if not session:
+            return {'success': False, 'message': 'جلسة الرفع غير موجودة'}
+        if session['status'] != 'pending':
+            return {'success': False, 'message': 'تم إنهاء هذا الرفع بالفعل'}
+        if not 0 <= index < session['total_chunks']:
+            return {'success': False, 'message': 'رقم الجزء غير صحيح'}
+        if not expected_sha256:
+            return {'success': False, 'message': 'بصمة الجزء مطلوبة'}
+
+        offset = index * session['chunk_size']
+        expected_len = min(session['chunk_size'], session['total_size'] - offset)
+        digest = hashlib.sha256()
+        written = 0
+
+        fd = os.open(self._staging_path(upload_id), os.O_WRONLY)
+        try:
+            while written <= expected_len:
+                block = stream.read(min(STREAM_BLOCK, expected_len + 1 - written))
+                if not block:
+                    break
+                if written + len(block) > expected_len:
+                    return {'success': False, 'message': 'حجم الجزء أكبر من المتوقع'}
+                os.pwrite(fd, block, offset + written)
+                digest.update(block)
+                written += len(block)
+        finally:
+            os.close(fd)
+
+        if written != expected_len:
+            return {'success': False, 'message': 'الجزء غير مكتمل'}
+        if digest.hexdigest() != expected_sha256.lower():
+            # Not marked as received; the client re-sends and overwrites the same range
+            return {'success': False, 'message': 'بصمة الجزء غير مطابقة'}
+
+        self.upload_model.mark_chunk(upload_id, index, expected_sha256.lower(), written)
+        return {'success': True, 'index': index}
+
+    def complete(self, upload_id, owner):
+        """Verify the assembled file and move it into the content-addressed store."""
+        session = self.get_session(upload_id, owner)
+        if not session:
+            return {'success': False, 'message': 'جلسة الرفع غير موجودة'}
+        if session['status'] == 'complete':
+            return {'success': True, 'path': session['blob_path']}
+
+        received = self.upload_model.get_received(upload_id)
+        if len(received) != session['total_chunks']:
+            missing = sorted(set(range(session['total_chunks'])) - set(received))
+            return {'success': False, 'message': 'لم تكتمل جميع الأجزاء', 'missing': missing}
+
+        # Only one request (a retry or double submit may race this one) hashes and adopts the staging file
+        stale_before = (datetime.now() - timedelta(seconds=COMPLETING_TIMEOUT_SECONDS)).strftime("%Y-%m-%d %H:%M:%S")
+        if not self.upload_model.claim_completion(upload_id, stale_before):
+            session = self.upload_model.get(upload_id)
+            if session and session['status'] == 'complete':
+                return {'success': True, 'path': session['blob_path']}
+            return {'success': False, 'message': 'جاري إنهاء الرفع، حاول مرة أخرى بعد لحظات'}
+
+        try:
+            staging = self._staging_path(upload_id)
+            digest = hashlib.sha256()
+            with open(staging, 'rb') as f:
+                for block in iter(lambda: f.read(STREAM_BLOCK * 16), b''):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+            if session['sha256'] and session['sha256'] != sha256:
+                self.upload_model.release_completion(upload_id)
+                return {'success': False, 'message': 'بصمة الملف غير مطابقة'}
+
+            stored = upload_store.adopt(staging, sha256, session['total_size'],
+                                        upload_store.extension(session['filename']))
+        except Exception:
+            self.upload_model.release_completion(upload_id)
+            raise
+        self.upload_model.complete(upload_id, stored.path)
+        return {'success': True, 'path': stored.path}
+
+    def resolve(self, upload_id, owner, kinds=None):
+        """Return the stored path of a completed upload owned by `owner`, else None."""
+        if not upload_id:
+            return None
+        session = self.get_session(upload_id, owner)
+        if not session or session['status'] != 'complete':
+            return None
+        if kinds and session['kind'] not in kinds:
+            return None
+        return session['blob_path']
+
+    def expire_stale(self, ttl_seconds=None):
+        """Drop sessions (and staging files) that have not progressed within the TTL."""
+        if ttl_seconds is None:
+            ttl_seconds = Config.UPLOAD_SESSION_TTL_SECONDS
+        cutoff = (datetime.now() - timedelta(seconds=ttl_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+        expired = 0
+        for session in self.upload_model.get_stale(cutoff):
+            try:
+                os.remove(self._staging_path(session['upload_id']))
+            except FileNotFoundError:
+                pass
+            self.upload_model.delete(session['upload_id'])
+            expired += 1
+        return expired
+
+
+chunked_upload_service = ChunkedUploadService()
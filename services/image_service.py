@@ -0,0 +1,152 @@
+"""
+Image Processing Service
+Builds EXIF-free, resized WebP variants of uploaded photos in a background
+worker pool so controllers only have to save the raw upload. Originals are
+content-addressed blobs and are never modified; a metadata-free full-size
+copy is written as the 'full' variant instead.
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from models import ImageVariantModel
+
+logger = logging.getLogger(__name__)
+
+STATIC_ROOT = 'static'
+FULL_VARIANT = 'full'  # Metadata-free copy at the original size and format
+
+
+class ImageService:
+    """
+    Service class for upload post-processing.
+    A metadata-free copy of the original and each configured WebP variant are
+    written under IMAGE_VARIANT_FOLDER; variant paths are recorded in the
+    `image_variants` table so templates can serve them. The original blob is
+    left untouched so it still matches its SHA-256 address and recorded size.
+    """
+
+    def __init__(self, max_workers=None):
+        self.variant_model = ImageVariantModel()
+        self.variants = Config.IMAGE_VARIANTS
+        self.quality = Config.IMAGE_WEBP_QUALITY
+        self.variant_folder = Config.IMAGE_VARIANT_FOLDER
+        self.max_workers = max_workers or Config.IMAGE_WORKERS
+        self._executor = None
+        # Variants never change once written, so resolved lookups are kept per process
+        self._resolved = {}
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The parent's pool threads do not exist in a forked child
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='image-worker')
+        return self._executor
+
+    def enqueue(self, relative_path):
+        """Schedule processing of an uploaded image (path relative to static/)."""
+        if not relative_path:
+            return None
+        # Deduplicated uploads may already have been processed
+        if self.variant_model.get_by_original(relative_path):
+            return None
+        return self.executor.submit(self.process, relative_path)
+
+    def enqueue_many(self, relative_paths):
+        return [self.enqueue(p) for p in relative_paths or [] if p]
+
+    def process(self, relative_path):
+        """Write a metadata-free copy of the original and all variants. Runs in the pool."""
+        # Pillow is only needed by the workers, not to boot the app and serve variant paths
+        from PIL import Image, ImageOps, UnidentifiedImageError
+
+        source = os.path.join(STATIC_ROOT, relative_path)
+        try:
+            with Image.open(source) as img:
+                img_format = img.format
+                # Apply the EXIF orientation before the metadata is dropped
+                clean = ImageOps.exif_transpose(img)
+                if clean.mode not in ('RGB', 'RGBA', 'L'):
+                    clean = clean.convert('RGBA' if 'A' in clean.getbands() else 'RGB')
+
+                created = {}
+                full = self._write_full(clean, relative_path, img_format)
+                if full:
+                    created[FULL_VARIANT] = full
+                for name, size in self.variants.items():
+                    created[name] = self._write_variant(clean, relative_path, name, size)
+                return created
+        except (FileNotFoundError, UnidentifiedImageError, OSError) as e:
+            logger.warning(f"Image processing skipped for {relative_path}: {e}")
+            return {}
+
+    def _variant_target(self, relative_path, name, ext):
+        stem, _ = os.path.splitext(relative_path)
+        variant_rel = os.path.join(os.path.basename(self.variant_folder), f"{stem}.{name}.{ext}").replace(os.sep, '/')
+        variant_abs = os.path.join(STATIC_ROOT, variant_rel)
+        os.makedirs(os.path.dirname(variant_abs), exist_ok=True)
+        return variant_rel, variant_abs
+
+    def _record(self, relative_path, name, variant_rel, variant_abs, img):
+        self.variant_model.upsert(relative_path, name, variant_rel,
+                                  width=img.width, height=img.height,
+                                  size_bytes=os.path.getsize(variant_abs))
+        self._resolved[(relative_path, name)] = variant_rel
+        return variant_rel
+
+    def _write_full(self, img, relative_path, img_format):
+        """Re-encode the original without EXIF/GPS metadata as the 'full' variant."""
+        if img_format not in ('JPEG', 'PNG', 'WEBP'):
+            return None
+        variant_rel, variant_abs = self._variant_target(relative_path, FULL_VARIANT,
+                                                        os.path.splitext(relative_path)[1].lstrip('.').lower())
+        save_kwargs = {'format': img_format}
+        if img_format == 'JPEG':
+            save_kwargs.update(quality=90, optimize=True)
+            if img.mode == 'RGBA':
+                img = img.convert('RGB')
+        tmp_path = f"{variant_abs}.tmp"
+        img.save(tmp_path, **save_kwargs)
+        os.replace(tmp_path, variant_abs)
+        return self._record(relative_path, FULL_VARIANT, variant_rel, variant_abs, img)
+
+    def _write_variant(self, img, relative_path, name, size):
+        from PIL import Image
+
+        variant_rel, variant_abs = self._variant_target(relative_path, name, 'webp')
+        resized = img.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        resized.save(variant_abs, format='WEBP', quality=self.quality, method=4)
+        return self._record(relative_path, name, variant_rel, variant_abs, resized)
+
+    def variant_path(self, relative_path, variant='thumb'):
+        """Return the variant path for templates, falling back to the original."""
+        if not relative_path:
+            return relative_path
+        key = (relative_path, variant)
+        if key in self._resolved:
+            return self._resolved[key]
+        record = self.variant_model.get_variant(relative_path, variant)
+        if record:
+            self._resolved[key] = record['path']
+            return record['path']
+        return relative_path
+
+    def delete_variants(self, relative_path):
+        """Remove generated files and rows for an original."""
+        for record in self.variant_model.get_by_original(relative_path):
+            try:
+                os.remove(os.path.join(STATIC_ROOT, record['path']))
+            except FileNotFoundError:
+                pass
+            self._resolved.pop((relative_path, record['variant']), None)
+        self.variant_model.delete_by_original(relative_path)
+
+
+image_service = ImageService()
@@ -0,0 +1,147 @@
+"""
+Knowledge Base
+The chatbot's static answers live in a versioned data file
+(Config.KNOWLEDGE_BASE_PATH) instead of code:
+
+    {"version": 3, "entries": [{"keywords_ar": [...], "keywords_en": [...],
+                                "response_ar": "...", "response_en": "..."}]}
+
+The file is compiled once into an immutable snapshot: keywords are
+normalized up front, short keywords become word sets and longer ones one
+regex per entry, so matching a message is a few C-level scans. The loader
+checks the file's mtime every few seconds and swaps in a freshly compiled
+snapshot in one assignment; requests already holding the old snapshot
+finish with it, and a broken file keeps the previous snapshot.
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from types import MappingProxyType
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ('keywords_ar', 'keywords_en', 'response_ar', 'response_en')
+SHORT_KEYWORD = 3  # Keywords shorter than this must match a whole word ('1' must not match '010...')
+
+
+def _substring_pattern(keywords):
+    """One regex that finds any of the keywords anywhere in a string (None if there are none)"""
+    if not keywords:
+        return None
+    return re.compile('|'.join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True)))
+
+
+class CompiledEntry:
+    __slots__ = ('entry', 'short_ar', 'long_ar', 'short_en', 'long_en', 'long_en_words')
+
+    def __init__(self, entry, normalize):
+        self.entry = MappingProxyType(dict(entry))
+        keywords_ar = {normalize(kw) for kw in entry['keywords_ar']} - {''}
+        keywords_en = {kw.lower() for kw in entry['keywords_en']} - {''}
+        self.short_ar = frozenset(kw for kw in keywords_ar if len(kw) < SHORT_KEYWORD)
+        self.long_ar = _substring_pattern([kw for kw in keywords_ar if len(kw) >= SHORT_KEYWORD])
+        self.short_en = frozenset(kw for kw in keywords_en if len(kw) < SHORT_KEYWORD)
+        self.long_en_words = frozenset(kw for kw in keywords_en if len(kw) >= SHORT_KEYWORD)
+        self.long_en = _substring_pattern(self.long_en_words)
+
+    def matches(self, msg_norm, msg_words, msg_keywords, msg_lower, msg_lower_words):
+        # Arabic keywords against the normalized message (a keyword that is one of the
+        # message's keywords is also a substring of it, so the regex covers both)
+        if not self.short_ar.isdisjoint(msg_words):
+            return True
+        if self.long_ar is not None and self.long_ar.search(msg_norm):
+            return True
+        # English keywords against the raw lowercased message
+        if not self.short_en.isdisjoint(msg_lower_words):
+            return True
+        if self.long_en is not None and self.long_en.search(msg_lower):
+            return True
+        return not self.long_en_words.isdisjoint(msg_keywords)
+
+
+class KnowledgeSnapshot:
+    """An immutable, compiled version of the knowledge-base file"""
+
+    def __init__(self, data, normalize, source_mtime=None):
+        if not isinstance(data, dict) or not isinstance(data.get('entries'), list):
+            raise ValueError("Knowledge base must be an object with an 'entries' list")
+        for index, entry in enumerate(data['entries']):
+            missing = [field for field in REQUIRED_FIELDS if field not in entry]
+            if missing:
+                raise ValueError(f"Knowledge base entry {index} is missing {', '.join(missing)}")
+        self.version = data.get('version')
+        self.source_mtime = source_mtime
+        self.compiled = tuple(CompiledEntry(entry, normalize) for entry in data['entries'])
+        self.entries = tuple(compiled.entry for compiled in self.compiled)
+
+    def match(self, message, msg_norm, msg_keywords, language):
+        """Response of the first entry whose keywords appear in the message, or None"""
+        msg_words = set(msg_norm.split())
+        msg_lower = message.lower()
+        msg_lower_words = set(msg_lower.split())
+        for compiled in self.compiled:
+            if compiled.matches(msg_norm, msg_words, msg_keywords, msg_lower, msg_lower_words):
+                return compiled.entry['response_ar' if language == 'ar' else 'response_en']
+        return None
+
+
+class KnowledgeBase:
+    """
+    Loader for the knowledge-base file. `snapshot` is always a complete
+    compiled snapshot; `generation` increases with every swap so caches of
+    answers computed from an older snapshot can be dropped.
+    """
+
+    def __init__(self, normalize, path=None, check_seconds=None):
+        self.normalize = normalize
+        self.path = path or Config.KNOWLEDGE_BASE_PATH
+        self.check_seconds = Config.KNOWLEDGE_BASE_CHECK_SECONDS if check_seconds is None else check_seconds
+        self.generation = 0
+        self._snapshot = None
+        self._failed_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload(force=True)
+
+    @property
+    def snapshot(self):
+        self.check()
+        return self._snapshot
+
+    def check(self):
+        """Reload the file if it changed, at most once per check interval"""
+        if time.monotonic() >= self._next_check:
+            self.reload()
+
+    def reload(self, force=False):
+        """Compile and swap in the file if it changed; returns True if a new snapshot was installed"""
+        # Only one thread compiles; the others keep answering from the current snapshot
+        if not self._lock.acquire(blocking=force):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.check_seconds
+            mtime = None
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if not force and mtime in (self._snapshot.source_mtime, self._failed_mtime):
+                    return False
+                with open(self.path, encoding='utf-8') as f:
+                    snapshot = KnowledgeSnapshot(json.load(f), self.normalize, source_mtime=mtime)
+            except (OSError, ValueError) as e:  # json.JSONDecodeError is a ValueError
+                if self._snapshot is None:
+                    raise
+                # Logged once per broken version of the file
+                self._failed_mtime = mtime
+                logger.error(f"Knowledge base not reloaded, keeping version {self._snapshot.version}: {e}")
+                return False
+            self._snapshot = snapshot
+            self.generation += 1
+        finally:
+            self._lock.release()
+        logger.info(f"Knowledge base version {snapshot.version} loaded ({len(snapshot.entries)} entries)")
+        return True
@@ -0,0 +1,124 @@
+"""
+Location Service
+Governorate / city lookups for the location pickers. Everything is derived
+once from utils.egypt_locations at startup: JSON bodies with their ETags,
+folded (normalized) name keys and a prefix trie for typeahead, so each
+keystroke is a dictionary walk and most responses are a 304.
+"""
+import json
+import hashlib
+from functools import lru_cache
+
+from flask import Response, request
+
+from utils.egypt_locations import EGYPT_LOCATIONS
+from utils.text import fold_arabic
+
+SEARCH_LIMIT = 10
+CACHE_MAX_AGE = 3600
+ARTICLE = 'ال'
+
+
+class JSONBody:
+    """A serialized response body and its strong ETag"""
+
+    def __init__(self, data):
+        self.body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()[:16]
+
+    def response(self):
+        """Response for the current request; 304 when the client's copy is current"""
+        response = Response(self.body, mimetype='application/json')
+        response.set_etag(self.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = CACHE_MAX_AGE
+        return response.make_conditional(request)
+
+
+class LocationService:
+    """
+    Service class for location lookups.
+    Governorates and cities are matched by their folded names, so
+    'الاسكندريه' finds 'الإسكندرية' exactly as the chatbot would match it.
+    """
+
+    def __init__(self, locations=None):
+        self.locations = locations = locations or EGYPT_LOCATIONS
+        self.governorates = sorted(locations.keys())
+        self._by_key = {self.key(name): name for name in self.governorates}
+
+        self._governorates_body = JSONBody(self.governorates)
+        self._city_bodies = {name: JSONBody(list(cities)) for name, cities in locations.items()}
+        self._empty_body = JSONBody([])
+
+        # Every governorate and city, indexed under each word of its folded name
+        # (with and without the article, so 'اسك' finds 'الإسكندرية')
+        self.entries = [{'type': 'governorate', 'name': name, 'governorate': name} for name in self.governorates]
+        for governorate in self.governorates:
+            self.entries.extend({'type': 'city', 'name': city, 'governorate': governorate}
+                                for city in locations[governorate])
+        self._trie = {}
+        for index, entry in enumerate(self.entries):
+            folded = self.key(entry['name'])
+            words = folded.split()
+            for start in range(len(words)):
+                suffix = ' '.join(words[start:])
+                self._insert(suffix, index)
+                if suffix.startswith(ARTICLE) and len(suffix) > len(ARTICLE) + 1:
+                    self._insert(suffix[len(ARTICLE):], index)
+
+    @staticmethod
+    def key(text):
+        """Search key of a name or query (chatbot folding + collapsed spaces)"""
+        return ' '.join(fold_arabic(text).split())
+
+    def _insert(self, key, index):
+        node = self._trie
+        for char in key:
+            node = node.setdefault(char, {})
+            # Each node keeps the (ordered) entries under it, so a lookup never walks the subtree
+            matches = node.setdefault(None, [])
+            if index not in matches:
+                matches.append(index)
+
+    # Lookups ---------------------------------------------------------------
+
+    def resolve_governorate(self, name):
+        """Canonical governorate name for any spelling that folds to the same key"""
+        if name in self._city_bodies:
+            return name
+        return self._by_key.get(self.key(name))
+
+    def get_cities(self, governorate):
+        governorate = self.resolve_governorate(governorate)
+        return list(self.locations[governorate]) if governorate else []
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Governorates first, then cities, whose name (or a word of it) starts with the query"""
+        node = self._trie
+        for char in self.key(query):
+            node = node.get(char)
+            if node is None:
+                return []
+        matches = node.get(None, []) if node is not self._trie else []
+        ranked = sorted(matches, key=lambda i: (self.entries[i]['type'] != 'governorate', i))
+        return [self.entries[i] for i in ranked[:limit]]
+
+    # HTTP responses ----------------------------------------------------------
+
+    def governorates_response(self):
+        return self._governorates_body.response()
+
+    def cities_response(self, governorate):
+        governorate = self.resolve_governorate(governorate)
+        return (self._city_bodies[governorate] if governorate else self._empty_body).response()
+
+    def search_response(self, query):
+        return self._search_body(self.key(query)).response()
+
+    @lru_cache(maxsize=2048)
+    def _search_body(self, key):
+        return JSONBody(self.search(key))
+
+
+location_service = LocationService()
@@ -0,0 +1,110 @@
+"""
+Maintenance Jobs
+Periodic work that used to run inside request handlers (or not at all),
+registered with the scheduler by register_jobs().
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+
+from config import Config
+from models import Database, SecurityLogModel, AnalyticsRollupModel, JobRunModel
+
+logger = logging.getLogger(__name__)
+
+# Tables read on every page view; scanning them keeps their pages in the OS cache
+HOT_TABLES = ['users', 'learned_answers', 'image_variants', 'blobs']
+
+
+def backup_snapshot():
+    """Daily incremental snapshot (replaces the 90-day copy done by the security page)."""
+    from services.backup_service import backup_service
+    # Through the backup lease, so it never overlaps a backup an admin started in another worker
+    manifest = backup_service.run_exclusive('auto', snapshot=True)
+    return {'snapshot': manifest['id'], 'added_bytes': manifest['added_bytes']}
+
+
+def rollup_log(log):
+    """(metric, key) pairs counted for one security log entry; mirrors analytics_dashboard."""
+    event = str(log.get('event', ''))
+    details = str(log.get('details', ''))
+    timestamp = str(log.get('timestamp', ''))
+    pairs = [('events', 'total')]
+
+    if 'Login' in event and 'Success' in event and 'User ' in details:
+        pairs.append(('login', details.split('User ')[1].split(' ')[0]))
+    if event == 'Service View' and 'User viewed service: ' in details:
+        pairs.append(('service_view', details.split('User viewed service: ')[1]))
+    if 'View' in event or 'Page' in event:
+        if 'page: ' in details.lower():
+            pairs.append(('page_view', details.lower().split('page: ')[1].strip()))
+        elif event == 'Service View':
+            pairs.append(('page_view', 'الخدمات'))
+    if ' ' in timestamp:
+        pairs.append(('hour', timestamp.split(' ')[1].split(':')[0]))
+    return pairs
+
+
+def analytics_rollup():
+    """Roll every complete day of the security log that is not rolled up yet into analytics_daily."""
+    log_model = SecurityLogModel()
+    rollup_model = AnalyticsRollupModel()
+    today = datetime.now().strftime("%Y-%m-%d")
+    rolled = rollup_model.get_rolled_days()
+
+    days = 0
+    for day in sorted(set(log_model.get_days(today)) - rolled):
+        counters = {}
+        for log in log_model.get_by_day(day):
+            for metric, key in rollup_log(log):
+                counters.setdefault(metric, Counter())[key] += 1
+        rollup_model.save_day(day, counters)
+        days += 1
+    return {'days_rolled': days}
+
+
+def log_retention():
+    """Delete raw security logs past the retention window (after they are rolled up) and old job history."""
+    analytics_rollup()
+    cutoff_day = (datetime.now() - timedelta(days=Config.SECURITY_LOG_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    log_model = SecurityLogModel()
+    rolled = AnalyticsRollupModel().get_rolled_days()
+    expired_days = [day for day in log_model.get_days(cutoff_day) if day in rolled]
+    logs_removed = log_model.delete_days(expired_days)
+
+    history_cutoff = (datetime.now() - timedelta(days=Config.JOB_HISTORY_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    runs_removed = JobRunModel().purge(history_cutoff)
+    return {'logs_removed': logs_removed, 'job_runs_removed': runs_removed}
+
+
+def cache_warmup():
+    """Refresh query-planner statistics and pull hot tables into the page cache shared by all workers."""
+    conn = Database().get_connection()
+    try:
+        conn.execute("PRAGMA optimize")
+        rows = 0
+        for table in HOT_TABLES:
+            rows += conn.execute(f"SELECT COUNT(*) FROM (SELECT * FROM {table})").fetchone()[0]
+    finally:
+        conn.close()
+    return {'rows_scanned': rows}
+
+
+def upload_gc():
+    from services.upload_store import upload_store
+    removed, freed = upload_store.collect_garbage()
+    return {'blobs_removed': removed, 'bytes_freed': freed}
+
+
+def expire_chunked_uploads():
+    from services.chunked_upload_service import chunked_upload_service
+    return {'sessions_expired': chunked_upload_service.expire_stale()}
+
+
+def register_jobs(scheduler):
+    scheduler.register('backup_snapshot', backup_snapshot, 'daily 03:00', 'نسخة احتياطية تزايدية للبيانات والملفات')
+    scheduler.register('analytics_rollup', analytics_rollup, 'daily 00:15', 'تجميع الإحصائيات اليومية من سجلات الأمان')
+    scheduler.register('log_retention', log_retention, 'daily 04:00', 'حذف السجلات القديمة بعد تجميعها')
+    scheduler.register('cache_warmup', cache_warmup, 'every 6h', 'تحديث إحصائيات قاعدة البيانات وتسخين الذاكرة')
+    scheduler.register('upload_gc', upload_gc, 'daily 04:30', 'حذف الملفات المرفوعة غير المستخدمة')
+    scheduler.register('chunked_upload_expiry', expire_chunked_uploads, 'hourly', 'إلغاء جلسات الرفع المنتهية')
@@ -0,0 +1,180 @@
+"""
+Password Service
+One place for bcrypt hashing. The work factor comes from the config, hash
+checks run on a small bounded thread pool (the login request still waits
+for its check; the pool only caps how many hashes burn CPU at once at
+PASSWORD_HASH_WORKERS, and a login that cannot get a slot in time is told
+to retry instead of queueing forever), hashes made with an older cost are
+upgraded on the next successful login, and the security page's
+"is the admin still using the default password" check is computed once per
+stored hash instead of on every visit.
+
+    python -m services.password_service 10 12 14   # time one hash per cost
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+from config import Config
+from models import UserModel
+
+logger = logging.getLogger(__name__)
+
+# bcrypt only looks at the first 72 bytes; older versions truncated silently, 5.x raises
+MAX_PASSWORD_BYTES = 72
+TIMING_SAMPLES = 500
+
+
+class PasswordServiceBusy(Exception):
+    """The check did not finish within PASSWORD_VERIFY_TIMEOUT (the pool is backed up)"""
+
+
+class PasswordService:
+    """
+    Service class for password hashing and verification.
+    Hashes are the usual `$2b$<cost>$...` strings stored in users.password,
+    so hashes written by Flask-Bcrypt keep working unchanged.
+    """
+
+    def __init__(self, rounds=None, max_workers=None):
+        self.rounds = rounds or Config.PASSWORD_BCRYPT_ROUNDS
+        self.max_workers = max_workers or Config.PASSWORD_HASH_WORKERS
+        self.timeout = Config.PASSWORD_VERIFY_TIMEOUT
+        self.user_model = UserModel()
+        self._executor = None
+        self._lock = threading.Lock()
+        # (stored hash, candidate) -> bool; a password change produces a new hash
+        self._known_checks = {}
+        self._timings = deque(maxlen=TIMING_SAMPLES)
+        self._counts = {'verified': 0, 'failed': 0, 'busy': 0, 'rehashed': 0, 'hashed': 0}
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-worker')
+        return self._executor
+
+    @staticmethod
+    def _encode(password):
+        return (password or '').encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+    @staticmethod
+    def cost_of(password_hash):
+        """Work factor of a stored hash, or None if it is not a bcrypt hash"""
+        try:
+            return int(password_hash.split('$')[2])
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    def needs_rehash(self, password_hash):
+        return self.cost_of(password_hash) != self.rounds
+
+    # Hashing -----------------------------------------------------------------
+
+    def hash(self, password):
+        """New hash at the configured cost (str, ready to store)"""
+        hashed = bcrypt.hashpw(self._encode(password), bcrypt.gensalt(rounds=self.rounds))
+        self._count('hashed')
+        return hashed.decode('utf-8')
+
+    def _check(self, password_hash, password):
+        started = time.perf_counter()
+        try:
+            return bcrypt.checkpw(self._encode(password), password_hash.encode('utf-8'))
+        except (AttributeError, ValueError):  # Empty or malformed stored hash
+            return False
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._timings.append(elapsed)
+
+    def verify(self, password_hash, password):
+        """
+        Check a password on the bounded pool, blocking the calling thread until
+        it is done. Raises PasswordServiceBusy if the check has not finished
+        within PASSWORD_VERIFY_TIMEOUT; a check still waiting for a slot is
+        cancelled so it does not burn CPU for a request that already gave up.
+        """
+        future = self.executor.submit(self._check, password_hash, password)
+        try:
+            ok = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._count('busy')
+            raise PasswordServiceBusy()
+        self._count('verified' if ok else 'failed')
+        return ok
+
+    def verify_user(self, user_data, password):
+        """
+        Check a login attempt against a user row. On success a hash made with
+        a different cost is replaced, so changing PASSWORD_BCRYPT_ROUNDS
+        migrates users as they log in. Raises PasswordServiceBusy (see verify).
+        """
+        password_hash = (user_data or {}).get('password') or ''
+        if not self.verify(password_hash, password):
+            return False
+        if self.needs_rehash(password_hash):
+            try:
+                self.user_model.update(user_data['username'], {'password': self.hash(password)})
+                self._count('rehashed')
+            except Exception as e:  # The login itself already succeeded
+                logger.warning(f"Password rehash failed for {user_data.get('username')}: {e}")
+        return True
+
+    def matches_known(self, password_hash, candidate):
+        """Cached check of a stored hash against a known (e.g. default) password"""
+        key = (password_hash, candidate)
+        if key not in self._known_checks:
+            self._known_checks[key] = bool(password_hash) and self._check(password_hash, candidate)
+        return self._known_checks[key]
+
+    # Metrics -------------------------------------------------------------------
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def get_stats(self):
+        with self._lock:
+            timings = sorted(self._timings)
+            stats = dict(self._counts)
+        stats.update({
+            'rounds': self.rounds,
+            'workers': self.max_workers,
+            'avg_ms': round(sum(timings) / len(timings), 1) if timings else None,
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 1) if timings else None,
+        })
+        return stats
+
+    def benchmark(self, rounds_list=(10, 11, 12, 13, 14), samples=3):
+        """Median seconds per hash at each cost, to pick PASSWORD_BCRYPT_ROUNDS for this hardware"""
+        results = {}
+        for rounds in rounds_list:
+            durations = []
+            for _ in range(samples):
+                started = time.perf_counter()
+                bcrypt.hashpw(b'benchmark-password', bcrypt.gensalt(rounds=rounds))
+                durations.append(time.perf_counter() - started)
+            results[rounds] = sorted(durations)[len(durations) // 2]
+        return results
+
+
+password_service = PasswordService()
+
+
+if __name__ == "__main__":
+    costs = [int(arg) for arg in sys.argv[1:]] or [10, 11, 12, 13, 14]
+    for cost, seconds in password_service.benchmark(costs).items():
+        print(f"cost {cost}: {seconds * 1000:.1f} ms/hash, ~{1 / seconds:.1f} logins/s per core")
@@ -0,0 +1,59 @@
+"""
+Response Cache
+Bounded LRU map with a TTL for the chatbot's answers. Entries are tagged
+with the generation of the data they were computed from (learned answers,
+knowledge base); a lookup under a newer generation is a miss, so an answer
+computed while an admin was teaching a new one is never served afterwards.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL cache with hit-rate counters"""
+
+    def __init__(self, max_entries=2048, ttl_seconds=60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, generation, value)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+
+    def get(self, key, generation=None):
+        """Cached value, or None (expired and out-of-generation entries are dropped)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            expires_at, entry_generation, value = entry
+            if expires_at <= now or entry_generation != generation:
+                del self._entries[key]
+                self._stats['stale'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), max_entries=self.max_entries,
+                         ttl_seconds=self.ttl_seconds)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
@@ -0,0 +1,239 @@
+"""
+Job Scheduler
+Runs maintenance jobs on cron-like schedules in a background thread. Every
+worker process runs the loop, but only the holder of a SQLite lease (the
+leader) executes jobs, so gunicorn workers never duplicate work. Each run is
+recorded in the job_runs table for the admin jobs page.
+
+Schedules:
+    'every 30s' / 'every 15m' / 'every 6h' / 'every 1d'
+    'hourly'                  at minute 00
+    'daily 03:00'             every day at 03:00
+    'weekly sun 03:00'        once a week
+"""
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from config import Config
+from models import SchedulerLeaseModel, JobRunModel
+
+logger = logging.getLogger(__name__)
+
+LEADER_LEASE = 'scheduler-leader'
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class Schedule:
+    """A parsed schedule spec; answers when a job is next due after its last run."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        parts = spec.lower().split()
+        self.interval = None
+        self.weekday = None
+        self.at = (0, 0)
+
+        if parts[0] == 'every' and len(parts) == 2 and re.fullmatch(r'\d+[smhd]', parts[1]):
+            self.interval = timedelta(seconds=int(parts[1][:-1]) * UNITS[parts[1][-1]])
+        elif parts == ['hourly']:
+            self.interval = timedelta(hours=1)
+        elif parts[0] == 'daily' and len(parts) <= 2:
+            self.at = self._parse_time(parts[1] if len(parts) == 2 else '00:00')
+        elif parts[0] == 'weekly' and len(parts) == 3 and parts[1][:3] in WEEKDAYS:
+            self.weekday = WEEKDAYS.index(parts[1][:3])
+            self.at = self._parse_time(parts[2])
+        else:
+            raise ValueError(f"Invalid schedule: {spec!r}")
+        self.kind = parts[0]
+
+    @staticmethod
+    def _parse_time(value):
+        match = re.fullmatch(r'(\d{1,2}):(\d{2})', value)
+        if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+            raise ValueError(f"Invalid time of day: {value!r}")
+        return int(match.group(1)), int(match.group(2))
+
+    def next_after(self, last):
+        """Next due time after `last` (a datetime: the last run, or when the scheduler started)."""
+        if self.kind == 'every':
+            return last + self.interval
+        if self.kind == 'hourly':
+            return last.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        candidate = last.replace(hour=self.at[0], minute=self.at[1], second=0, microsecond=0)
+        if self.kind == 'weekly':
+            candidate += timedelta(days=(self.weekday - candidate.weekday()) % 7)
+            step = timedelta(days=7)
+        else:
+            step = timedelta(days=1)
+        while candidate <= last:
+            candidate += step
+        return candidate
+
+
+class Job:
+    def __init__(self, name, func, schedule, description=''):
+        self.name = name
+        self.func = func
+        self.schedule = Schedule(schedule)
+        self.description = description
+
+
+class JobScheduler:
+    """
+    Service class for scheduled maintenance.
+    Jobs are plain callables; whatever they return is stored as the run's result.
+    """
+
+    def __init__(self):
+        self.lease_model = SchedulerLeaseModel()
+        self.run_model = JobRunModel()
+        self.tick_seconds = Config.SCHEDULER_TICK_SECONDS
+        self.lease_seconds = Config.SCHEDULER_LEASE_SECONDS
+        self.jobs = {}
+        self.owner = self._make_owner()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Each process is its own lease owner; start() must be called again in the child
+        self.owner = self._make_owner()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+
+    @staticmethod
+    def _make_owner():
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    def register(self, name, func, schedule, description=''):
+        # Config.SCHEDULED_JOBS can override (or disable with None) any default schedule
+        schedule = Config.SCHEDULED_JOBS.get(name, schedule)
+        if schedule:
+            self.jobs[name] = Job(name, func, schedule, description)
+
+    # Loop ----------------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._started_at = datetime.now().replace(microsecond=0)
+        self._thread = threading.Thread(target=self._loop, name='job-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"Scheduler started ({self.owner}, {len(self.jobs)} jobs)")
+
+    def stop(self):
+        self._stop.set()
+        self.lease_model.release(LEADER_LEASE, self.owner)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self.lease_model.try_acquire(LEADER_LEASE, self.owner, self.lease_seconds):
+                    for job in self.due_jobs():
+                        if self._stop.is_set():
+                            break
+                        self.run_job(job.name)
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {e}")
+            self._stop.wait(self.tick_seconds)
+
+    def due_jobs(self, now=None):
+        now = now or datetime.now()
+        last_runs = self.run_model.get_last_runs()
+        due = []
+        for job in self.jobs.values():
+            last = last_runs.get(job.name)
+            if last and last['status'] == 'running' and \
+                    now - self._parse(last['started_at']) < timedelta(seconds=Config.SCHEDULER_JOB_TIMEOUT_SECONDS):
+                continue
+            if self._next_run(job, last, now) <= now:
+                due.append(job)
+        return due
+
+    def _next_run(self, job, last, now):
+        # A job that never ran waits for its first slot after the scheduler started, not "now"
+        return job.schedule.next_after(self._parse(last['started_at']) if last else self._started_at or now)
+
+    @staticmethod
+    def _parse(value):
+        return datetime.strptime(value, TIME_FORMAT) if value else None
+
+    # Execution -------------------------------------------------------------
+
+    def run_job(self, name, trigger='schedule'):
+        """Run one job now in the calling thread. Returns the stored result or None if skipped."""
+        job = self.jobs.get(name)
+        if not job:
+            raise KeyError(name)
+        with self._lock:
+            if name in self._running:
+                return None
+            self._running.add(name)
+        job_lease = f"job:{name}"
+        try:
+            # A manual trigger in another process may already be running it
+            if not self.lease_model.try_acquire(job_lease, self.owner, Config.SCHEDULER_JOB_TIMEOUT_SECONDS):
+                return None
+            run_id = self.run_model.start(name, self.owner, trigger)
+            started = time.perf_counter()
+            try:
+                result = job.func()
+                if result is not None and not isinstance(result, str):
+                    result = json.dumps(result, ensure_ascii=False, default=str)
+                self.run_model.finish(run_id, 'success', int((time.perf_counter() - started) * 1000), result=result)
+                return result
+            except Exception as e:
+                logger.exception(f"Job {name} failed")
+                self.run_model.finish(run_id, 'failed', int((time.perf_counter() - started) * 1000), error=str(e))
+                return None
+            finally:
+                self.lease_model.release(job_lease, self.owner)
+        finally:
+            with self._lock:
+                self._running.discard(name)
+
+    def trigger(self, name):
+        """Run a job in the background on behalf of an admin. False if the job is unknown."""
+        if name not in self.jobs:
+            return False
+        threading.Thread(target=self.run_job, args=(name, 'manual'), name=f"job-{name}", daemon=True).start()
+        return True
+
+    # Admin view ------------------------------------------------------------
+
+    def get_status(self):
+        last_runs = self.run_model.get_last_runs()
+        jobs = []
+        for job in self.jobs.values():
+            last = last_runs.get(job.name)
+            next_run = self._next_run(job, last, datetime.now())
+            jobs.append({
+                'name': job.name,
+                'description': job.description,
+                'schedule': job.schedule.spec,
+                'last_run': last,
+                'next_run': next_run.strftime(TIME_FORMAT),
+            })
+        lease = self.lease_model.get(LEADER_LEASE)
+        leader = lease if lease and lease['expires_at'] > time.time() else None
+        return {'jobs': jobs, 'leader': leader, 'owner': self.owner,
+                'enabled': bool(self._thread and self._thread.is_alive())}
+
+
+scheduler = JobScheduler()
@@ -0,0 +1,411 @@
+"""
+Snapshot Store
+Incremental, deduplicated backups. A database snapshot is split into
+fixed-size groups of pages and each group is stored once by its SHA-256, so
+a new snapshot only adds the pages that changed since any earlier one.
+Upload folders are recorded as a content-addressed manifest in the same way.
+Old snapshots are thinned with a grandfather-father-son policy.
+
+Creating and pruning snapshots hold a SQLite lease (the scheduler's lease
+table), so the scheduled snapshot job, admin-triggered backups in any
+worker and the backup_manager.py CLI never work on the store at the same
+time.
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import uuid
+import time
+import socket
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import Config
+from models import SchedulerLeaseModel
+
+try:
+    import zstandard
+except ImportError:  # Optional: gzip is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ID_RE = re.compile(r'^\d{8}_\d{6}(_[a-z]+)?(_[0-9a-f]{6})?$')
+STORE_LEASE = 'snapshot_store'
+CHUNK_SIZE = 1024 * 1024  # Read size when storing upload files
+
+
+class SnapshotStore:
+    """
+    Layout under <root>:
+        objects/<ab>/<sha256>   compressed page groups and upload files
+        snapshots/<id>.json     one manifest per point in time
+        stats.json              running totals for get_stats()
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(Config.BACKUP_DIR, 'snapshots')
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.manifests_dir = os.path.join(self.root, 'snapshots')
+        self.chunk_pages = Config.BACKUP_CHUNK_PAGES
+        self.file_roots = Config.BACKUP_FILE_ROOTS
+        self.stats_path = os.path.join(self.root, 'stats.json')
+        self.lease_model = SchedulerLeaseModel()
+
+    @contextmanager
+    def locked(self):
+        """Exclusive use of the store across processes; waits up to BACKUP_LOCK_WAIT_SECONDS"""
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        deadline = time.monotonic() + Config.BACKUP_LOCK_WAIT_SECONDS
+        while not self.lease_model.try_acquire(STORE_LEASE, owner, Config.BACKUP_LOCK_SECONDS):
+            if time.monotonic() >= deadline:
+                raise RuntimeError("Snapshot store is busy (another snapshot or prune is running)")
+            time.sleep(1)
+        try:
+            yield
+        finally:
+            self.lease_model.release(STORE_LEASE, owner)
+
+    # Objects -------------------------------------------------------------
+
+    def _object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def _codec(self):
+        return 'zstd' if Config.BACKUP_COMPRESSION == 'zstd' and zstandard is not None else 'gzip'
+
+    def _put(self, data):
+        """Store bytes once; returns (sha256, stored_bytes_added)."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self._object_path(sha256)
+        if os.path.exists(path):
+            return sha256, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self._codec() == 'zstd':
+            payload = b'Z' + zstandard.ZstdCompressor(level=10).compress(data)
+        else:
+            payload = b'G' + gzip.compress(data, compresslevel=6, mtime=0)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(payload)
+        os.replace(path + '.tmp', path)
+        return sha256, len(payload)
+
+    def _put_file(self, source_path):
+        """
+        Store a file once without reading it into memory: hashed and
+        compressed in CHUNK_SIZE pieces into a temp object, then renamed to
+        its SHA-256. Returns (sha256, stored_bytes_added, size).
+        """
+        os.makedirs(self.objects_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, suffix='.tmp')
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as out, open(source_path, 'rb') as source:
+                if self._codec() == 'zstd':
+                    out.write(b'Z')
+                    compressor = zstandard.ZstdCompressor(level=10).compressobj()
+                    def write(chunk):
+                        out.write(compressor.compress(chunk))
+                    def finish():
+                        out.write(compressor.flush())
+                else:
+                    out.write(b'G')
+                    compressor = gzip.GzipFile(filename='', mode='wb', fileobj=out, compresslevel=6, mtime=0)
+                    write, finish = compressor.write, compressor.close
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    write(chunk)
+                    size += len(chunk)
+                finish()
+            sha256 = digest.hexdigest()
+            path = self._object_path(sha256)
+            if os.path.exists(path):
+                return sha256, 0, size
+            stored = os.path.getsize(tmp_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            return sha256, stored, size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _get(self, sha256):
+        with open(self._object_path(sha256), 'rb') as f:
+            payload = f.read()
+        codec, body = payload[:1], payload[1:]
+        if codec == b'Z':
+            if zstandard is None:
+                raise RuntimeError('zstandard is required to restore this snapshot')
+            # Streamed objects carry no content size in the frame header
+            data = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        else:
+            data = gzip.decompress(body)
+        if hashlib.sha256(data).hexdigest() != sha256:
+            raise RuntimeError(f"Corrupt backup object {sha256}")
+        return data
+
+    # Snapshots -----------------------------------------------------------
+
+    def _manifest_path(self, snapshot_id):
+        return os.path.join(self.manifests_dir, f"{snapshot_id}.json")
+
+    def list_snapshots(self):
+        """Manifests newest first."""
+        if not os.path.isdir(self.manifests_dir):
+            return []
+        snapshots = []
+        for name in os.listdir(self.manifests_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(self.manifests_dir, name), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+        snapshots.sort(key=lambda s: s['created_at'], reverse=True)
+        return snapshots
+
+    def get_snapshot(self, snapshot_id):
+        if not SNAPSHOT_ID_RE.match(snapshot_id or ''):
+            return None
+        try:
+            with open(self._manifest_path(snapshot_id), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def create(self, db_snapshot_path, kind='auto'):
+        """
+        Record a point in time from a consistent database copy (see
+        BackupService) plus the current upload folders. Returns the manifest.
+        """
+        with self.locked():
+            return self._create(db_snapshot_path, kind)
+
+    def _create(self, db_snapshot_path, kind):
+        now = datetime.now()
+        # Suffix: two snapshots of the same kind within one second must not share a manifest
+        snapshot_id = f"{now.strftime('%Y%m%d_%H%M%S')}_{kind}_{uuid.uuid4().hex[:6]}"
+        added = 0
+
+        conn = sqlite3.connect(db_snapshot_path)
+        try:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            conn.close()
+        chunk_bytes = page_size * self.chunk_pages
+        chunks = []
+        db_size = 0
+        with open(db_snapshot_path, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_bytes), b''):
+                sha256, stored = self._put(block)
+                chunks.append(sha256)
+                added += stored
+                db_size += len(block)
+
+        files, files_added, files_size = self._snapshot_files()
+        added += files_added
+
+        manifest = {
+            'id': snapshot_id,
+            'kind': kind,
+            'created_at': now.strftime("%Y-%m-%d %H:%M:%S"),
+            'db': {'page_size': page_size, 'chunk_bytes': chunk_bytes, 'size': db_size, 'chunks': chunks},
+            'files': files,
+            'logical_bytes': db_size + files_size,
+            'added_bytes': added,
+        }
+        stats = self._load_stats()
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        path = self._manifest_path(snapshot_id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+        if stats is None:
+            self._save_stats(self._scan_stats())
+        else:
+            self._save_stats({'snapshots': stats['snapshots'] + 1,
+                              'logical_bytes': stats['logical_bytes'] + manifest['logical_bytes'],
+                              'stored_bytes': stats['stored_bytes'] + added,
+                              'latest': manifest['created_at']})
+        logger.info(f"Snapshot {snapshot_id}: {db_size + files_size} bytes logical, {added} bytes new")
+        return manifest
+
+    def _snapshot_files(self):
+        """Content-addressed manifest of upload files; unchanged files are not re-read."""
+        previous = self.list_snapshots()
+        known = previous[0]['files'] if previous else {}
+        files, added, total = {}, 0, 0
+        for root in self.file_roots:
+            if not os.path.isdir(root):
+                continue
+            for dirpath, dirnames, filenames in os.walk(root):
+                # Staging areas of in-flight uploads are not worth keeping
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    rel = os.path.relpath(path).replace(os.sep, '/')
+                    stat = os.stat(path)
+                    entry = known.get(rel)
+                    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns \
+                            and os.path.exists(self._object_path(entry['sha256'])):
+                        files[rel] = entry
+                    else:
+                        sha256, stored, size = self._put_file(path)
+                        added += stored
+                        files[rel] = {'sha256': sha256, 'size': size, 'mtime_ns': stat.st_mtime_ns}
+                    total += files[rel]['size']
+        return files, added, total
+
+    # Restore ---------------------------------------------------------------
+
+    def restore(self, snapshot_id, db_path, files_root=None):
+        """
+        Rebuild the database of a snapshot at db_path and, if files_root is
+        given, its upload files under that directory. Returns the manifest.
+        """
+        manifest = self.get_snapshot(snapshot_id)
+        if not manifest:
+            raise ValueError(f"Unknown snapshot {snapshot_id}")
+
+        tmp_path = db_path + '.restore'
+        with open(tmp_path, 'wb') as f:
+            for sha256 in manifest['db']['chunks']:
+                f.write(self._get(sha256))
+        conn = sqlite3.connect(tmp_path)
+        try:
+            result = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+            if result == ['ok']:
+                # Leases were held by processes of the live database, not of the restored copy
+                try:
+                    conn.execute("UPDATE scheduler_leases SET expires_at = 0")
+                    conn.commit()
+                except sqlite3.OperationalError:  # Snapshot taken before the table existed
+                    pass
+        finally:
+            conn.close()
+        if result != ['ok']:
+            os.remove(tmp_path)
+            raise RuntimeError(f"Restored database failed integrity check: {'; '.join(result[:5])}")
+        os.replace(tmp_path, db_path)
+
+        if files_root:
+            for rel, entry in manifest['files'].items():
+                target = os.path.join(files_root, rel)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(self._get(entry['sha256']))
+        return manifest
+
+    # Retention -------------------------------------------------------------
+
+    def select_retained(self, snapshots, policy=None):
+        """Grandfather-father-son: the latest few, then newest per hour, day, ISO week and month."""
+        policy = policy or Config.BACKUP_RETENTION
+        keep = {snap['id'] for snap in snapshots[:max(policy.get('latest', 1), 1)]}
+        buckets = {
+            'hourly': lambda d: d.strftime('%Y-%m-%d %H'),
+            'daily': lambda d: d.strftime('%Y-%m-%d'),
+            'weekly': lambda d: '%d-W%02d' % d.isocalendar()[:2],
+            'monthly': lambda d: d.strftime('%Y-%m'),
+        }
+        for period, bucket_of in buckets.items():
+            seen = []
+            for snap in snapshots:  # newest first
+                bucket = bucket_of(datetime.strptime(snap['created_at'], "%Y-%m-%d %H:%M:%S"))
+                if bucket in seen:
+                    continue
+                if len(seen) >= policy.get(period, 0):
+                    break
+                seen.append(bucket)
+                keep.add(snap['id'])
+        return keep
+
+    def prune(self, policy=None):
+        """
+        Apply retention and delete objects no remaining snapshot uses. Returns (snapshots, bytes) removed.
+        Unreferenced objects and leftover *.tmp files younger than BACKUP_OBJECT_GRACE_SECONDS are kept.
+        """
+        with self.locked():
+            snapshots = self.list_snapshots()
+            keep = self.select_retained(snapshots, policy)
+            removed = 0
+            for snap in snapshots:
+                if snap['id'] not in keep:
+                    os.remove(self._manifest_path(snap['id']))
+                    removed += 1
+
+            remaining = self.list_snapshots()
+            live = set()
+            for snap in remaining:
+                live.update(snap['db']['chunks'])
+                live.update(entry['sha256'] for entry in snap['files'].values())
+            cutoff = time.time() - Config.BACKUP_OBJECT_GRACE_SECONDS
+            freed, stored = 0, 0
+            if os.path.isdir(self.objects_dir):
+                for dirpath, _, filenames in os.walk(self.objects_dir):
+                    for name in filenames:
+                        path = os.path.join(dirpath, name)
+                        stat = os.stat(path)
+                        if name not in live and stat.st_mtime < cutoff:
+                            os.remove(path)
+                            freed += stat.st_size
+                        else:
+                            stored += stat.st_size
+            self._save_stats(self._totals(remaining, stored))
+        logger.info(f"Snapshot retention removed {removed} snapshots ({freed} bytes)")
+        return removed, freed
+
+    # Stats -------------------------------------------------------------------
+
+    @staticmethod
+    def _totals(snapshots, stored_bytes):
+        return {
+            'snapshots': len(snapshots),
+            'logical_bytes': sum(s['logical_bytes'] for s in snapshots),
+            'stored_bytes': stored_bytes,
+            'latest': snapshots[0]['created_at'] if snapshots else None,
+        }
+
+    def _scan_stats(self):
+        """Totals from every manifest and object on disk (only when stats.json is missing)"""
+        stored = 0
+        if os.path.isdir(self.objects_dir):
+            for dirpath, _, filenames in os.walk(self.objects_dir):
+                stored += sum(os.path.getsize(os.path.join(dirpath, n)) for n in filenames)
+        return self._totals(self.list_snapshots(), stored)
+
+    def _load_stats(self):
+        try:
+            with open(self.stats_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_stats(self, stats):
+        # Only written while holding the store lease
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.stats_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(stats, f)
+        os.replace(self.stats_path + '.tmp', self.stats_path)
+
+    def get_stats(self):
+        """Logical size of all snapshots vs. bytes actually on disk (kept up to date by create/prune)."""
+        stats = self._load_stats() or self._scan_stats()
+        logical, stored = stats['logical_bytes'], stats['stored_bytes']
+        return {
+            'snapshots': stats['snapshots'],
+            'logical_bytes': logical,
+            'stored_bytes': stored,
+            'saved_bytes': max(logical - stored, 0),
+            'saved_percent': round(100 * (1 - stored / logical), 1) if logical else 0.0,
+            'latest': stats['latest'],
+        }
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,146 @@
+"""
+Content-Addressed Upload Store
+Saves uploads once per unique content (SHA-256) in sharded directories,
+tracks which records reference each blob and sweeps unreferenced blobs.
+"""
+import os
+import re
+import hashlib
+import logging
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from werkzeug.utils import secure_filename
+
+from config import Config
+from models import BlobModel
+
+logger = logging.getLogger(__name__)
+
+STATIC_ROOT = 'static'
+CHUNK_SIZE = 64 * 1024
+
+StoredUpload = namedtuple('StoredUpload', ['path', 'sha256', 'size', 'created'])
+
+# Tables whose rows own blob references, and the column used as ref_key
+REF_OWNERS = {
+    'users': 'username',
+    'inspection_requests': 'id',
+    'complaints': 'id',
+}
+
+
+class UploadStore:
+    """
+    Service class for storing uploaded files.
+    A blob lives at <root>/<ab>/<cd>/<sha256>.<ext>; the path returned is
+    relative to static/ so it can be stored in rows and passed to url_for.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or Config.UPLOAD_BLOB_FOLDER
+        self.tmp_root = os.path.join(self.root, '.tmp')
+        self.blob_model = BlobModel()
+
+    def extension(self, filename):
+        filename = secure_filename(filename or '')
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+        return ext if re.fullmatch(r'[a-z0-9]{1,8}', ext) else 'bin'
+
+    def blob_path(self, sha256, ext):
+        """On-disk path for a digest (sharded two levels deep)."""
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}.{ext}")
+
+    def _relative(self, disk_path):
+        return os.path.relpath(disk_path, STATIC_ROOT).replace(os.sep, '/')
+
+    def save(self, file, ref=None):
+        """
+        Stream a FileStorage into the store.
+        ref: optional (table, key) tuple recorded as a reference to the blob.
+        """
+        if not file or not file.filename:
+            return None
+        os.makedirs(self.tmp_root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_root)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = file.stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            return self.adopt(tmp_path, digest.hexdigest(), size, self.extension(file.filename), ref=ref)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, tmp_path, sha256, size, ext, ref=None):
+        """Move an already-hashed temp file into place (or drop it if the blob exists)."""
+        existing = self.blob_model.get(sha256)
+        if existing and os.path.exists(os.path.join(STATIC_ROOT, existing['path'])):
+            relative = existing['path']
+            os.remove(tmp_path)
+        else:
+            # A row whose file went missing is restored at its recorded location
+            relative = existing['path'] if existing else self._relative(self.blob_path(sha256, ext))
+            target = os.path.join(STATIC_ROOT, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+        created = self.blob_model.create(sha256, relative, size)
+        if ref:
+            self.blob_model.add_ref(sha256, *ref)
+        return StoredUpload(relative, sha256, size, created)
+
+    def add_ref(self, stored, ref_table, ref_key):
+        """Record that a row points at a stored upload (StoredUpload or path)."""
+        sha256 = self._digest_for(stored)
+        if sha256:
+            self.blob_model.add_ref(sha256, ref_table, ref_key)
+
+    def release(self, ref_table, ref_key, stored=None):
+        """Drop the references a row holds; blobs are only deleted by collect_garbage."""
+        sha256 = self._digest_for(stored) if stored else None
+        return self.blob_model.release_refs(ref_table, ref_key, sha256)
+
+    def _digest_for(self, stored):
+        if isinstance(stored, StoredUpload):
+            return stored.sha256
+        record = self.blob_model.get_by_path(stored) if stored else None
+        return record['sha256'] if record else None
+
+    def collect_garbage(self, grace_seconds=None):
+        """Delete blobs no row references anymore. Returns (blobs_removed, bytes_freed)."""
+        if grace_seconds is None:
+            grace_seconds = Config.UPLOAD_GC_GRACE_SECONDS
+        self.blob_model.prune_dangling_refs(REF_OWNERS)
+        cutoff = (datetime.now() - timedelta(seconds=grace_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+        # Imported here to avoid a hard Pillow dependency for non-image callers
+        from services.image_service import image_service
+
+        removed, freed = 0, 0
+        for blob in self.blob_model.get_unreferenced(cutoff):
+            try:
+                os.remove(os.path.join(STATIC_ROOT, blob['path']))
+            except FileNotFoundError:
+                pass
+            image_service.delete_variants(blob['path'])
+            self.blob_model.delete(blob['sha256'])
+            removed += 1
+            freed += blob.get('size_bytes') or 0
+        logger.info(f"Upload GC removed {removed} blobs ({freed} bytes)")
+        return removed, freed
+
+
+upload_store = UploadStore()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    upload_store.collect_garbage()
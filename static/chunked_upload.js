@@ -0,0 +1,81 @@
+// Resumable chunked uploads (see controllers/upload_controller.py)
+// Usage: ChunkedUpload.upload(fileOrBlob, 'voice', filename, onProgress).then(({uploadId, path}) => ...)
+const ChunkedUpload = (() => {
+    const csrfMeta = document.querySelector('meta[name="csrf-token"]');
+    const csrfToken = csrfMeta ? csrfMeta.content : '';
+    const MAX_RETRIES = 5;
+
+    async function sha256Hex(buffer) {
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function api(url, options = {}) {
+        const headers = Object.assign({ 'X-CSRFToken': csrfToken }, options.headers || {});
+        const response = await fetch(url, Object.assign({}, options, { headers, credentials: 'same-origin' }));
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            throw new Error(data.message || 'Upload failed');
+        }
+        return data;
+    }
+
+    function resumeKey(file, name, kind) {
+        return `chunked-upload:${kind}:${name}:${file.size}:${file.lastModified || 0}`;
+    }
+
+    async function openSession(file, kind, name) {
+        const key = resumeKey(file, name, kind);
+        const saved = localStorage.getItem(key);
+        if (saved) {
+            try {
+                const status = await api(`/api/uploads/${saved}`);
+                if (status.status === 'pending') {
+                    return { uploadId: saved, chunkSize: status.chunk_size, total: status.total_chunks, received: new Set(status.received), key };
+                }
+            } catch (e) { /* Session expired, start a fresh one */ }
+        }
+        const session = await api('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: name, size: file.size, kind })
+        });
+        localStorage.setItem(key, session.upload_id);
+        return { uploadId: session.upload_id, chunkSize: session.chunk_size, total: session.total_chunks, received: new Set(), key };
+    }
+
+    async function sendChunk(session, file, index) {
+        const start = index * session.chunkSize;
+        const buffer = await file.slice(start, start + session.chunkSize).arrayBuffer();
+        const checksum = await sha256Hex(buffer);
+        for (let attempt = 1; ; attempt++) {
+            try {
+                return await api(`/api/uploads/${session.uploadId}/chunks/${index}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': checksum },
+                    body: buffer
+                });
+            } catch (err) {
+                if (attempt >= MAX_RETRIES) throw err;
+                await new Promise(r => setTimeout(r, 1000 * attempt));
+            }
+        }
+    }
+
+    async function upload(file, kind, filename, onProgress) {
+        const name = filename || file.name || `${kind}.bin`;
+        const session = await openSession(file, kind, name);
+        let done = session.received.size;
+        for (let index = 0; index < session.total; index++) {
+            if (session.received.has(index)) continue;
+            await sendChunk(session, file, index);
+            done++;
+            if (onProgress) onProgress(done / session.total);
+        }
+        const result = await api(`/api/uploads/${session.uploadId}/complete`, { method: 'POST' });
+        localStorage.removeItem(session.key);
+        return { uploadId: session.uploadId, path: result.path };
+    }
+
+    return { upload };
+})();
@@ -1,40 +1,85 @@
-const CACHE_NAME = 'rmg-cache-v7'; // Bumped version to v7
-const urlsToCache = [
-    '/',
-    '/static/style.css',
-    '/static/script.js',
-    '/static/logo.png'
-];
+// Precache list generated by build_assets.py / freeze.py (see utils/assets.py).
+// Its version is a hash of the entries, so caches roll over on every deploy
+// that changes an asset or a public page - no manual version bump needed.
+try {
+    importScripts('/precache-manifest.js');
+} catch (e) {
+    self.__PRECACHE_MANIFEST = { version: 'dev', entries: [] };
+}
+
+const MANIFEST = self.__PRECACHE_MANIFEST || { version: 'dev', entries: [] };
+const ASSET_CACHE = `rmg-assets-${MANIFEST.version}`;
+const PAGE_CACHE = `rmg-pages-${MANIFEST.version}`;
+const PAGE_URLS = MANIFEST.entries.filter(e => !e.url.startsWith('/assets/')).map(e => e.url);
+const ASSET_URLS = MANIFEST.entries.filter(e => e.url.startsWith('/assets/')).map(e => e.url);
+
+// Private or dynamic routes are always fetched from the network
+const NETWORK_ONLY = ['/api/', '/admin', '/login', '/logout', '/register', '/dashboard', '/worker', '/socket.io/'];
 
 self.addEventListener('install', event => {
     // Force the waiting service worker to become the active service worker.
     self.skipWaiting();
-    event.waitUntil(
-        caches.open(CACHE_NAME)
-            .then(cache => cache.addAll(urlsToCache))
-    );
+    event.waitUntil(Promise.all([
+        caches.open(ASSET_CACHE).then(cache => cache.addAll(ASSET_URLS)),
+        caches.open(PAGE_CACHE).then(cache => cache.addAll(PAGE_URLS))
+    ]));
 });
 
 self.addEventListener('activate', event => {
-    // Claim any clients immediately, so they use the new version faster
-    event.waitUntil(self.clients.claim());
-
-    // Remove old caches
+    // Remove caches from previous manifest versions, then take over open tabs
     event.waitUntil(
-        caches.keys().then(cacheNames => {
-            return Promise.all(
-                cacheNames.map(cacheName => {
-                    if (cacheName !== CACHE_NAME) {
-                        return caches.delete(cacheName);
-                    }
-                })
-            );
-        })
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => name !== ASSET_CACHE && name !== PAGE_CACHE)
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
     );
 });
 
+// Fingerprinted assets never change under the same URL
+function cacheFirst(request) {
+    return caches.match(request).then(cached => cached || fetch(request).then(response => {
+        if (response.ok) {
+            const copy = response.clone();
+            caches.open(ASSET_CACHE).then(cache => cache.put(request, copy));
+        }
+        return response;
+    }));
+}
+
+// Pages carry per-session state (CSRF token, logged-in navbar), so they always
+// come from the network; the cached copy is only an offline fallback
+function networkFirst(request, cacheKey) {
+    return fetch(request).then(response => {
+        if (response.ok && cacheKey) {
+            const copy = response.clone();
+            caches.open(PAGE_CACHE).then(cache => cache.put(cacheKey, copy));
+        }
+        return response;
+    }).catch(() => caches.match(cacheKey || '/').then(cached => cached || caches.match('/')));
+}
+
 self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+    if (NETWORK_ONLY.some(prefix => url.pathname.startsWith(prefix))) return;
+
+    if (url.pathname.startsWith('/assets/')) {
+        event.respondWith(cacheFirst(request));
+        return;
+    }
+
+    if (request.mode === 'navigate') {
+        const path = url.pathname.replace(/\/$/, '') || '/';
+        event.respondWith(networkFirst(request, PAGE_URLS.includes(path) ? path : null));
+        return;
+    }
+
     event.respondWith(
-        fetch(event.request).catch(() => caches.match(event.request))
+        fetch(request).catch(() => caches.match(request))
     );
 });
@@ -0,0 +1,208 @@
+"""
+Static Asset Pipeline
+Fingerprints static files into static/dist, precompresses text assets
+(gzip, and Brotli when the `brotli` package is installed) and serves them
+with immutable far-future cache headers.
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import shutil
+import mimetypes
+
+from flask import Blueprint, current_app, request, send_from_directory, url_for as flask_url_for
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip alone is still served
+    brotli = None
+
+STATIC_ROOT = 'static'
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'asset-manifest.json'
+
+# Only site assets are fingerprinted; user content and PWA entry points keep stable URLs
+FINGERPRINT_EXTENSIONS = {'.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.ico', '.woff', '.woff2'}
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json'}
+EXCLUDED_DIRS = {DIST_DIR, 'uploads', 'user_images', 'variants'}
+EXCLUDED_FILES = {'sw.js', 'manifest.json'}
+
+CSS_URL_RE = re.compile(r"""url\((['"]?)(?!data:|https?:|//|/)([^'")]+)\1\)""")
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+# Public pages precached by the service worker as an offline fallback; online
+# navigations always hit the network (pages embed the CSRF token and session navbar)
+PRECACHE_PAGES = ['/', '/about', '/services', '/projects', '/contact']
+PRECACHE_MANIFEST_NAME = 'precache-manifest.js'
+
+assets_bp = Blueprint('assets', __name__)
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _hashed_name(relative_path, data):
+    stem, ext = os.path.splitext(relative_path)
+    return f"{stem}.{_digest(data)}{ext}"
+
+
+def _collect(static_root):
+    """Yield static-relative paths of files that should be fingerprinted."""
+    for root, dirs, files in os.walk(static_root):
+        rel_root = os.path.relpath(root, static_root)
+        if rel_root == '.':
+            dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+        for name in files:
+            ext = os.path.splitext(name)[1].lower()
+            if name in EXCLUDED_FILES or ext not in FINGERPRINT_EXTENSIONS:
+                continue
+            yield os.path.normpath(os.path.join(rel_root, name)).replace(os.sep, '/')
+
+
+def _rewrite_css(css_path, css_text, manifest):
+    """Point relative url(...) references inside CSS at their fingerprinted names."""
+    base = os.path.dirname(css_path)
+
+    def replace(match):
+        quote, target = match.group(1), match.group(2)
+        resolved = os.path.normpath(os.path.join(base, target)).replace(os.sep, '/')
+        hashed = manifest.get(resolved)
+        if not hashed:
+            return match.group(0)
+        return f"url({quote}{os.path.relpath(hashed, base or '.').replace(os.sep, '/')}{quote})"
+
+    return CSS_URL_RE.sub(replace, css_text)
+
+
+def _write_compressed(path, data):
+    with gzip.GzipFile(path + '.gz', 'wb', compresslevel=9, mtime=0) as f:
+        f.write(data)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build(static_root=STATIC_ROOT):
+    """Build static/dist and its manifest. Returns the manifest dict."""
+    dist_root = os.path.join(static_root, DIST_DIR)
+    if os.path.exists(dist_root):
+        shutil.rmtree(dist_root)
+    os.makedirs(dist_root)
+
+    paths = sorted(_collect(static_root))
+    # Binary assets first so stylesheets can reference their hashed names
+    paths.sort(key=lambda p: os.path.splitext(p)[1].lower() == '.css')
+
+    manifest = {}
+    for rel in paths:
+        with open(os.path.join(static_root, rel), 'rb') as f:
+            data = f.read()
+        if rel.lower().endswith('.css'):
+            data = _rewrite_css(rel, data.decode('utf-8'), manifest).encode('utf-8')
+
+        hashed = _hashed_name(rel, data)
+        out_path = os.path.join(dist_root, hashed)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, 'wb') as f:
+            f.write(data)
+        if os.path.splitext(rel)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            _write_compressed(out_path, data)
+        manifest[rel] = hashed
+
+    with open(os.path.join(dist_root, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _frozen_page_file(pages_root, url):
+    """Map a page URL to the file Frozen-Flask wrote for it."""
+    name = 'index.html' if url == '/' else url.strip('/')
+    path = os.path.join(pages_root, name)
+    if os.path.isdir(path):
+        path = os.path.join(path, 'index.html')
+    return path
+
+
+def build_precache_manifest(manifest, pages_root=None, outputs=None, static_root=STATIC_ROOT):
+    """
+    Write precache-manifest.js for sw.js: every fingerprinted asset plus the
+    public pages (with a content hash when a frozen copy exists). The cache
+    version is derived from the entries, so it changes exactly when they do.
+    """
+    entries = [{'url': f"/assets/{hashed}", 'revision': None}
+               for rel, hashed in sorted(manifest.items())]
+    for url in PRECACHE_PAGES:
+        revision = None
+        page_file = _frozen_page_file(pages_root, url) if pages_root else None
+        if page_file and os.path.isfile(page_file):
+            with open(page_file, 'rb') as f:
+                revision = _digest(f.read())
+        entries.append({'url': url, 'revision': revision})
+
+    version = _digest(json.dumps(entries, sort_keys=True).encode('utf-8'))
+    body = f"self.__PRECACHE_MANIFEST = {json.dumps({'version': version, 'entries': entries}, indent=2)};\n"
+    for out in outputs or [os.path.join(static_root, PRECACHE_MANIFEST_NAME)]:
+        os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+        if os.path.exists(out):
+            with open(out, encoding='utf-8') as f:
+                if f.read() == body:
+                    continue  # Keep the mtime so incremental freezes skip the copy
+        with open(out, 'w', encoding='utf-8') as f:
+            f.write(body)
+    return version
+
+
+def load_manifest(static_root=STATIC_ROOT):
+    path = os.path.join(static_root, DIST_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def asset_url_for(endpoint, **values):
+    """Drop-in url_for: static files with a fingerprinted copy resolve to /assets/<hashed>."""
+    if endpoint == 'static':
+        manifest = current_app.extensions.get('asset_manifest', {})
+        hashed = manifest.get(values.get('filename', ''))
+        if hashed:
+            values = dict(values, filename=hashed)
+            return flask_url_for('assets.serve_asset', **values)
+    return flask_url_for(endpoint, **values)
+
+
+def asset_url(filename):
+    return asset_url_for('static', filename=filename)
+
+
+@assets_bp.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve a fingerprinted asset, preferring a precompressed variant."""
+    dist_root = os.path.join(current_app.static_folder, DIST_DIR)
+    accepted = request.headers.get('Accept-Encoding', '')
+    encoding = None
+    served = filename
+    for token, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if token in accepted and os.path.isfile(os.path.join(dist_root, filename + suffix)):
+            encoding, served = token, filename + suffix
+            break
+
+    response = send_from_directory(dist_root, served, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def init_assets(app):
+    """Register the asset route and make template url_for() fingerprint-aware."""
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    app.register_blueprint(assets_bp)
+    app.jinja_env.globals['url_for'] = asset_url_for
+    app.jinja_env.globals['asset_url'] = asset_url
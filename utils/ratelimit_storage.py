@@ -0,0 +1,107 @@
+"""
+SQLite Rate-Limit Storage
+A `limits` storage backend that keeps Flask-Limiter's window counters in a
+small SQLite file, so every gunicorn worker (and every thread) counts
+against the same limits without running Redis or memcached.
+
+    Limiter(storage_uri="sqlite:///ratelimit.db")      # relative path
+    Limiter(storage_uri="sqlite:////var/lib/app/rl.db") # absolute path
+
+Supports the fixed-window strategy (Flask-Limiter's default). Expired
+counters are swept periodically by whichever process notices first.
+"""
+import os
+import time
+import sqlite3
+import threading
+
+from limits.storage import Storage
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS ratelimit_counters (
+        key TEXT PRIMARY KEY,
+        count INTEGER NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+'''
+
+
+class SQLiteStorage(Storage):
+    """Window counters in SQLite; each increment is one atomic upsert."""
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri, wrap_exceptions=False, sweep_interval=300, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = uri.split('://', 1)[1]
+        # sqlite:///relative.db and sqlite:////absolute.db, as in SQLAlchemy URLs
+        self.path = path[1:] if path.startswith('/') else path
+        self.sweep_interval = float(sweep_interval)
+        self._local = threading.local()
+        self._next_sweep = 0.0
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        # One connection per thread, reopened in a forked child
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front, so read-after-upsert sees our own write only
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute('''INSERT INTO ratelimit_counters (key, count, expires_at) VALUES (?, ?, ?)
+                            ON CONFLICT (key) DO UPDATE SET
+                                count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END,
+                                expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END''',
+                         (key, amount, now + expiry, now, now))
+            count = conn.execute("SELECT count FROM ratelimit_counters WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if now >= self._next_sweep:
+            self.sweep(now)
+        return count
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT count FROM ratelimit_counters WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT expires_at FROM ratelimit_counters WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection().execute("DELETE FROM ratelimit_counters").rowcount
+
+    def clear(self, key):
+        self._connection().execute("DELETE FROM ratelimit_counters WHERE key = ?", (key,))
+
+    def sweep(self, now=None):
+        """Delete expired counters; returns how many were removed."""
+        now = now or time.time()
+        self._next_sweep = now + self.sweep_interval
+        return self._connection().execute("DELETE FROM ratelimit_counters WHERE expires_at <= ?", (now,)).rowcount
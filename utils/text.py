@@ -0,0 +1,29 @@
+"""
+Text Folding
+Arabic/English normalization shared by the chatbot (AIService.normalize_text)
+and the location search keys, so both match text the same way.
+
+All folding is one `str.translate` pass over a table built at import, and
+results are memoized: the chatbot folds the same knowledge-base keywords
+for every message.
+"""
+from functools import lru_cache
+
+PUNCTUATION = '?؟!.،,'
+HARAKAT = ''.join(chr(code) for code in range(0x064B, 0x0653))  # Fathatan .. Sukun
+LETTER_FOLDS = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا',  # Alif with hamza / madda
+    'ة': 'ه',                      # Ta-Marbuta
+    'ى': 'ي',                      # Alif Maqsura
+    'ؤ': 'و', 'ئ': 'ي',            # Hamza seats
+}
+FOLD_TABLE = str.maketrans({**LETTER_FOLDS, **dict.fromkeys(PUNCTUATION + HARAKAT)})
+FOLD_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=FOLD_CACHE_SIZE)
+def fold_arabic(text):
+    """Lowercase, drop punctuation and harakat, unify Alif / Ta-Marbuta / Ya / Hamza seats."""
+    if not text:
+        return ""
+    return text.lower().strip().translate(FOLD_TABLE)